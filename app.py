@@ -1,12 +1,32 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, abort
+from flask import Flask, Response, render_template, stream_template, request, redirect, url_for, session, jsonify, abort, g, current_app, has_app_context, has_request_context
 import requests
-import os
+import assets
+import async_client
+import cache
+import catalog
+import circuit_breaker
+import http_client
+import rate_limiter
+import ranking
+import deadline
+import metrics
+import pagination
+import sessions
+import upstream_snapshot
+import trailer_store
+import watchmode_index
+from config import config as configs, get_config
+from trailer_store import SEARCH_COST as YOUTUBE_SEARCH_COST
+from search_index import SearchIndex
+from personality import PersonalityEngine
 import logging
 from dotenv import load_dotenv
-import json
 import time
+from contextlib import nullcontext
 from functools import wraps
-import random
+from concurrent.futures import Future
+import asyncio
+import inspect
 
 # Load environment variables
 load_dotenv()
@@ -15,49 +35,212 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-change-this-in-production')
+class StreamedPage:
+    """A template to render as chunked HTML, flushing each part as it renders.
 
-# API Keys
-TRAKT_CLIENT_ID = os.getenv('TRAKT_CLIENT_ID')
-TRAKT_CLIENT_SECRET = os.getenv('TRAKT_CLIENT_SECRET')
-NEWS_API_KEY = os.getenv('NEWS_API_KEY')
-WATCHMODE_API_KEY = os.getenv('WATCHMODE_API_KEY')
-YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY')
+    Async views return this instead of a response: streaming needs the
+    request context, which only the thread serving the request can attach.
+    """
+    
+    def __init__(self, template_name, **context):
+        self.template_name = template_name
+        self.context = context
+    
+    def response(self):
+        response = Response(stream_template(self.template_name, **self.context), mimetype='text/html')
+        # Keep nginx from buffering the stream back into one response
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+async def render_template_async(template_name, **context):
+    """``render_template`` in a worker thread, keeping template work off the shared upstream loop"""
+    return await asyncio.to_thread(render_template, template_name, **context)
+
+class CinematicFlask(Flask):
+    """Flask app whose async views run on the shared upstream event loop"""
+    
+    def async_to_sync(self, func):
+        @wraps(func)
+        def run_view(*args, **kwargs):
+            rv = async_client.run(func(*args, **kwargs))
+            return rv.response() if isinstance(rv, StreamedPage) else rv
+        return run_view
+    
+    def send_static_file(self, filename):
+        # Fingerprinted builds (see assets.py) go out precompressed and immutable
+        if assets.is_fingerprinted(filename):
+            return assets.send_asset(self.static_folder, filename)
+        return super().send_static_file(filename)
+
+class RouteTable:
+    """Routes and request hooks declared at import, added to each app ``create_app`` builds.
+
+    Views keep their function names as endpoints, so ``url_for`` names are
+    the same as with ``@app.route``.
+    """
+    
+    def __init__(self):
+        self._registrations = []
+    
+    def _defer(self, register):
+        self._registrations.append(register)
+    
+    def route(self, rule, **options):
+        def decorator(view):
+            self._defer(lambda app: app.add_url_rule(rule, view_func=view, **options))
+            return view
+        return decorator
+    
+    def before_request(self, f):
+        self._defer(lambda app: app.before_request(f))
+        return f
+    
+    def after_request(self, f):
+        self._defer(lambda app: app.after_request(f))
+        return f
+    
+    def errorhandler(self, code):
+        def decorator(f):
+            self._defer(lambda app: app.register_error_handler(code, f))
+            return f
+        return decorator
+    
+    def register(self, app):
+        """Add every route and hook, in declaration order, to ``app``"""
+        for register in self._registrations:
+            register(app)
+
+routes = RouteTable()
+
+class Settings:
+    """Attribute access to the configuration of the app handling the current request.
+
+    ``create_app`` copies its configuration class into ``app.config``, so two
+    apps built in one process keep their own settings. Outside an app context
+    (imports, scripts) the environment's class from config.py is read.
+    """
+    
+    def __getattr__(self, name):
+        if not has_app_context():
+            return getattr(get_config(), name)
+        try:
+            return current_app.config[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+settings = Settings()
 
-# Rate limiting
-RATE_LIMIT = {}
-RATE_LIMIT_WINDOW = 60  # seconds
-RATE_LIMIT_MAX_REQUESTS = 100
+# Trakt movie lists shared by recommendations and new releases
+TRAKT_LIST_NAMES = ('trending', 'popular', 'releases')
 
-def rate_limit(f):
+def trakt_list_url(name):
+    return f'{settings.TRAKT_API_URL}/movies/{name}'
+
+def rate_limit(f=None, cost=1):
+    """Reject requests over the configured per-client limit with a 429.
+
+    Use as ``@rate_limit`` or ``@rate_limit(cost=...)``, where ``cost`` is
+    the units of work a call counts as: a number, or a function of the
+    current request (batch endpoints count one unit per item).
+    """
+    if f is None:
+        return lambda view: rate_limit(view, cost)
+    
+    def hit_args():
+        return request.remote_addr or 'unknown', cost() if callable(cost) else cost
+    
+    def rejection(allowed, retry_after):
+        if allowed:
+            return None
+        metrics.RATE_LIMITED.inc(request.endpoint)
+        response = jsonify({'error': 'Rate limit exceeded'})
+        response.headers['Retry-After'] = str(int(retry_after) + 1)
+        return response, 429
+    
+    if inspect.iscoroutinefunction(f):
+        @wraps(f)
+        async def decorated_coroutine(*args, **kwargs):
+            verdict = await app_state().limiter.hit_async(*hit_args())
+            return rejection(*verdict) or await f(*args, **kwargs)
+        return decorated_coroutine
+    
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        client_ip = request.remote_addr
-        current_time = time.time()
-        
-        if client_ip not in RATE_LIMIT:
-            RATE_LIMIT[client_ip] = {'requests': [], 'blocked_until': 0}
-        
-        # Clean old requests
-        RATE_LIMIT[client_ip]['requests'] = [
-            req_time for req_time in RATE_LIMIT[client_ip]['requests']
-            if current_time - req_time < RATE_LIMIT_WINDOW
-        ]
-        
-        # Check if blocked
-        if current_time < RATE_LIMIT[client_ip]['blocked_until']:
-            return jsonify({'error': 'Rate limit exceeded'}), 429
-        
-        # Check rate limit
-        if len(RATE_LIMIT[client_ip]['requests']) >= RATE_LIMIT_MAX_REQUESTS:
-            RATE_LIMIT[client_ip]['blocked_until'] = current_time + 60
-            return jsonify({'error': 'Rate limit exceeded'}), 429
-        
-        RATE_LIMIT[client_ip]['requests'].append(current_time)
-        return f(*args, **kwargs)
+        return rejection(*app_state().limiter.hit(*hit_args())) or f(*args, **kwargs)
+    return decorated_function
+
+def request_deadline(f):
+    """Give the route its latency budget from the app's ROUTE_DEADLINES"""
+    def route_budget():
+        # Looked up per call, so each app's configuration decides
+        seconds = settings.ROUTE_DEADLINES.get(f.__name__)
+        return nullcontext() if seconds is None else deadline.budget(seconds)
+    
+    if inspect.iscoroutinefunction(f):
+        @wraps(f)
+        async def decorated_coroutine(*args, **kwargs):
+            with route_budget():
+                return await f(*args, **kwargs)
+        return decorated_coroutine
+    
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with route_budget():
+            return f(*args, **kwargs)
     return decorated_function
 
+@routes.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@routes.after_request
+def record_request_metrics(response):
+    """Record render time and status per route (time to first byte when streamed)"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.endpoint or 'unmatched'
+        metrics.ROUTE_SECONDS.observe(time.perf_counter() - started, route)
+        metrics.ROUTE_RESPONSES.inc(route, str(response.status_code))
+    return response
+
+@routes.after_request
+def apply_cache_policy(response):
+    """Cache-Control for cacheable routes, plus a strong ETag and 304 when unchanged.
+
+    Registered after the metrics hook so it runs first and the 304 is counted.
+    Responses built from fallback data (see ``mark_degraded``) are marked
+    no-store. Pages that read the session are per visitor and left uncached.
+    Cacheable pages are never streamed (see ``stream_rendering``), so the
+    ``is_streamed`` check only guards against a route added without that.
+    """
+    policy = settings.HTTP_CACHE_POLICIES.get(request.endpoint)
+    if policy is None or request.method not in ('GET', 'HEAD') or response.status_code != 200:
+        return response
+    if g.get('degraded'):
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    if session.accessed or response.is_streamed:
+        return response
+    max_age, stale_while_revalidate = policy
+    response.headers['Cache-Control'] = (
+        f'public, max-age={max_age}, stale-while-revalidate={stale_while_revalidate}'
+    )
+    response.add_etag()
+    return response.make_conditional(request)
+
+def stream_rendering():
+    """Whether the current page renders as a stream.
+
+    Pages with a cache policy are buffered instead: a streamed page may
+    still fall back after its headers are sent, and has no body to hash.
+    """
+    return settings.STREAM_RENDERING and request.endpoint not in settings.HTTP_CACHE_POLICIES
+
+def mark_degraded():
+    """Flag the current response as built from mock or default data, so it is not cached"""
+    if has_request_context():
+        g.degraded = True
+
 # Personality mapping system
 PERSONALITY_MAPPING = {
     'quiet_night': ['drama', 'romance', 'indie'],
@@ -82,7 +265,43 @@ PERSONALITY_MAPPING = {
     'netflix': ['romance', 'drama', 'comedy']
 }
 
-@app.route('/')
+# Personality profiles, matched against the dominant traits
+PERSONALITY_PROFILES = {
+    'The Intrepid Explorer': {
+        'genres': ['adventure', 'action', 'fantasy'],
+        'description': 'You crave excitement and discovery. Your adventurous spirit draws you to epic journeys, thrilling action sequences, and fantastical worlds that push the boundaries of imagination.'
+    },
+    'The Thoughtful Analyst': {
+        'genres': ['mystery', 'thriller', 'sci-fi'],
+        'description': 'Your sharp mind loves to solve puzzles and explore complex narratives. You appreciate films that challenge your intellect and keep you guessing until the very end.'
+    },
+    'The Romantic Dreamer': {
+        'genres': ['romance', 'drama', 'indie'],
+        'description': 'You have a deep appreciation for human connection and emotional storytelling. Your heart is drawn to films that explore love, relationships, and the beautiful complexity of human nature.'
+    },
+    'The Social Butterfly': {
+        'genres': ['comedy', 'romance', 'drama'],
+        'description': 'You love to laugh and connect with others. Your vibrant personality enjoys films that bring people together, whether through humor, romance, or compelling character dynamics.'
+    },
+    'The Creative Artist': {
+        'genres': ['drama', 'indie', 'biography'],
+        'description': 'You have an artistic soul that appreciates beautiful storytelling and authentic performances. You are drawn to films that showcase human creativity and the power of artistic expression.'
+    },
+    'The Tech Enthusiast': {
+        'genres': ['sci-fi', 'thriller', 'action'],
+        'description': 'You are fascinated by innovation and the future. Your forward-thinking nature loves films that explore technology, artificial intelligence, and the possibilities of tomorrow.'
+    }
+}
+
+# Default to Thoughtful Analyst if no clear match
+DEFAULT_PERSONALITY_PROFILE = 'The Thoughtful Analyst'
+
+# Answers, genres and profiles compiled once into scoring matrices
+personality_engine = PersonalityEngine(
+    PERSONALITY_MAPPING, PERSONALITY_PROFILES, DEFAULT_PERSONALITY_PROFILE
+)
+
+@routes.route('/')
 @rate_limit
 def index():
     """Landing page with cinematic design"""
@@ -92,7 +311,7 @@ def index():
         logger.error(f"Error rendering index: {e}")
         return render_template('error.html', error="Something went wrong"), 500
 
-@app.route('/quiz')
+@routes.route('/quiz')
 @rate_limit
 def quiz():
     """Personality quiz page"""
@@ -102,7 +321,7 @@ def quiz():
         logger.error(f"Error rendering quiz: {e}")
         return render_template('error.html', error="Something went wrong"), 500
 
-@app.route('/process_quiz', methods=['POST'])
+@routes.route('/process_quiz', methods=['POST'])
 @rate_limit
 def process_quiz():
     """Process quiz answers and calculate personality profile"""
@@ -112,30 +331,15 @@ def process_quiz():
         if not answers:
             return redirect(url_for('quiz'))
         
-        # Calculate personality traits based on answers
-        personality_traits = []
-        for question, answer in answers.items():
-            if answer in PERSONALITY_MAPPING:
-                personality_traits.extend(PERSONALITY_MAPPING[answer])
+        # Score the top 3 dominant traits and the best matching profile
+        result = personality_engine.score(answers)
+        dominant_genres = result['traits']
+        personality_profile = personality_engine.profile(result['profile_id'])
         
-        # Count most common traits
-        trait_counts = {}
-        for trait in personality_traits:
-            trait_counts[trait] = trait_counts.get(trait, 0) + 1
-        
-        # Get top 3 dominant traits
-        dominant_traits = sorted(trait_counts.items(), key=lambda x: x[1], reverse=True)[:3]
-        dominant_genres = [trait[0] for trait in dominant_traits]
-        
-        # Determine personality profile name and description
-        personality_profile = get_personality_profile(dominant_genres, answers)
-        
-        # Store in session for recommendations
+        # Store in session for recommendations; the profile text is looked up by id
         session['personality_profile'] = {
             'traits': dominant_genres,
-            'answers': answers,
-            'profile_name': personality_profile['name'],
-            'profile_description': personality_profile['description']
+            'profile_id': result['profile_id']
         }
         
         logger.info(f"Quiz completed - Profile: {personality_profile['name']}")
@@ -145,293 +349,755 @@ def process_quiz():
         logger.error(f"Error processing quiz: {e}")
         return render_template('error.html', error="Failed to process quiz"), 500
 
-@app.route('/recommendations')
+@routes.route('/api/profile/batch', methods=['POST'])
+@rate_limit
+def api_profile_batch():
+    """API endpoint scoring many quiz answer sets in one call"""
+    try:
+        payload = request.get_json(silent=True)
+        answer_sets = payload.get('answers') if isinstance(payload, dict) else None
+        if not isinstance(answer_sets, list) or not all(
+                isinstance(answers, (dict, list)) for answers in answer_sets):
+            return jsonify({'error': 'Expected {"answers": [...]} with one dict or list per submission'}), 400
+        if len(answer_sets) > settings.PROFILE_BATCH_MAX_SIZE:
+            return jsonify({'error': f'At most {settings.PROFILE_BATCH_MAX_SIZE} answer sets per call'}), 413
+        for position, answers in enumerate(answer_sets):
+            values = answers.values() if isinstance(answers, dict) else answers
+            if not all(isinstance(answer, str) and answer in personality_engine.answer_index
+                       for answer in values):
+                return jsonify({'error': f'Answer set {position} has an answer that is not a quiz option'}), 400
+        
+        results = personality_engine.score_batch(answer_sets)
+        profiles = [
+            {
+                'traits': result['traits'],
+                'profile_id': result['profile_id'],
+                'profile_name': personality_engine.profile_names[result['profile_id']]
+            }
+            for result in results
+        ]
+        return jsonify({'profiles': profiles})
+    except Exception as e:
+        logger.error(f"API error for profile batch: {e}")
+        return jsonify({'error': 'Failed to score profiles'}), 500
+
+@routes.route('/recommendations')
 @rate_limit
-def recommendations():
+@request_deadline
+async def recommendations():
     """Display movie recommendations based on personality"""
     try:
         if 'personality_profile' not in session:
             return redirect(url_for('quiz'))
         
-        profile = session['personality_profile']
+        profile = expand_profile(session['personality_profile'])
         traits = profile['traits']
         
         # Get movie recommendations from Trakt API
-        movies = get_movie_recommendations(traits)
+        movies = await get_movie_recommendations_async(traits)
         
         if not movies:
             # Fallback to mock data
             movies = get_mock_movies()
             logger.warning("Using mock data due to API failure")
         
+        if stream_rendering():
+            return StreamedPage('recommendations.html',
+                                movies=enrich_movie_stream(movies),
+                                personality_profile=profile)
+        
         # Enrich with streaming data and news
-        enriched_movies = enrich_movie_data(movies)
+        enriched_movies = await enrich_movie_data_async(movies)
         
-        return render_template('recommendations.html', 
-                               movies=enriched_movies, 
-                               personality_profile=profile)
+        return await render_template_async('recommendations.html', 
+                                           movies=enriched_movies, 
+                                           personality_profile=profile)
                                 
     except Exception as e:
         logger.error(f"Error rendering recommendations: {e}")
-        return render_template('error.html', error="Failed to load recommendations"), 500
+        return await render_template_async('error.html', error="Failed to load recommendations"), 500
 
-@app.route('/api/movies/<genre>')
+@routes.route('/api/movies/<genre>')
 @rate_limit
-def api_movies(genre):
-    """API endpoint for getting movies by genre"""
+@request_deadline
+async def api_movies(genre):
+    """API endpoint for getting movies by genre, a page at a time"""
+    try:
+        position, limit = pagination.page_args(request.args, settings.PAGE_DEFAULT_LIMIT, settings.PAGE_MAX_LIMIT)
+    except pagination.InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     try:
-        movies = get_movie_recommendations([genre])
-        return jsonify({'movies': movies})
+        movies, next_position = await get_genre_page_async(genre, position, limit)
+        return jsonify(pagination.page(movies, next_position))
     except Exception as e:
         logger.error(f"API error for genre {genre}: {e}")
         return jsonify({'error': 'Failed to fetch movies'}), 500
 
-@app.route('/api/streaming/<movie_title>')
+@routes.route('/api/streaming/<movie_title>')
 @rate_limit
-def api_streaming(movie_title):
+@request_deadline
+async def api_streaming(movie_title):
     """API endpoint for getting streaming info"""
     try:
-        streaming_info = get_streaming_info(movie_title)
+        streaming_info = await get_streaming_info_async(movie_title)
         return jsonify({'streaming': streaming_info})
     except Exception as e:
         logger.error(f"API error for streaming {movie_title}: {e}")
         return jsonify({'error': 'Failed to fetch streaming info'}), 500
 
-@app.route('/api/trailer/<movie_title>')
+@routes.route('/api/trailer/<movie_title>')
 @rate_limit
-def api_trailer(movie_title):
+@request_deadline
+async def api_trailer(movie_title):
     """API endpoint for getting movie trailer"""
     try:
-        trailer_info = get_movie_trailer(movie_title)
-        return jsonify({'trailer': trailer_info})
+        ids = {name: request.args[name] for name in ('trakt', 'imdb', 'tmdb') if request.args.get(name)}
+        year = request.args.get('year', type=int)
+        trailer = await get_movie_trailer_async(movie_title, ids or None, year)
+        return jsonify({'trailer': trailer})
     except Exception as e:
         logger.error(f"API error for trailer {movie_title}: {e}")
         return jsonify({'error': 'Failed to fetch trailer'}), 500
 
-@app.route('/new-movies')
+@routes.route('/api/streaming/batch', methods=['POST'])
+@rate_limit(cost=lambda: batch_request_size())
+@request_deadline
+async def api_streaming_batch():
+    """API endpoint for streaming info of many titles or Trakt ids in one call"""
+    try:
+        items = await parse_batch_request_async()
+        if isinstance(items, tuple):
+            return items
+        streaming = await resolve_batch_async(items, get_catalog_streaming_info_async)
+        return jsonify({'streaming': streaming})
+    except Exception as e:
+        logger.error(f"API error for streaming batch: {e}")
+        return jsonify({'error': 'Failed to fetch streaming info'}), 500
+
+@routes.route('/api/trailer/batch', methods=['POST'])
+@rate_limit(cost=lambda: batch_request_size())
+@request_deadline
+async def api_trailer_batch():
+    """API endpoint for trailers of many titles or Trakt ids in one call"""
+    try:
+        items = await parse_batch_request_async()
+        if isinstance(items, tuple):
+            return items
+        trailers = await resolve_batch_async(
+            items, get_movie_trailer_async
+        )
+        return jsonify({'trailers': trailers})
+    except Exception as e:
+        logger.error(f"API error for trailer batch: {e}")
+        return jsonify({'error': 'Failed to fetch trailers'}), 500
+
+@routes.route('/api/cache/stats')
+@rate_limit
+def api_cache_stats():
+    """API endpoint exposing upstream response cache hit/miss counters"""
+    return jsonify(cache.response_cache.stats())
+
+@routes.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint: upstream, route, cache and limiter metrics"""
+    if not settings.METRICS_ENABLED:
+        abort(404)
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@routes.route('/new-movies')
 @rate_limit
-def new_movies():
+@request_deadline
+async def new_movies():
     """Display latest movie releases"""
     try:
         # Get recent movies from Trakt API
-        movies = get_new_movies()
+        movies, next_position = await get_new_movies_page_async()
+        next_cursor = pagination.encode_cursor(next_position)
         
         if not movies:
             # Fallback to mock data
             movies = get_mock_new_movies()
             logger.warning("Using mock data for new movies due to API failure")
         
+        if stream_rendering():
+            return StreamedPage('new_movies.html', movies=enrich_movie_stream(movies), next_cursor=next_cursor)
+        
         # Enrich with streaming data
-        enriched_movies = enrich_movie_data(movies)
+        enriched_movies = await enrich_movie_data_async(movies)
         
-        return render_template('new_movies.html', movies=enriched_movies)
+        return await render_template_async('new_movies.html', movies=enriched_movies, next_cursor=next_cursor)
         
     except Exception as e:
         logger.error(f"Error rendering new movies: {e}")
-        return render_template('error.html', error="Failed to load new movies"), 500
+        return await render_template_async('error.html', error="Failed to load new movies"), 500
+
+@routes.route('/api/new-movies')
+@rate_limit
+@request_deadline
+async def api_new_movies():
+    """API endpoint for latest movie releases, a page at a time"""
+    try:
+        position, limit = pagination.page_args(request.args, settings.NEW_MOVIES_PAGE_SIZE, settings.PAGE_MAX_LIMIT)
+    except pagination.InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        movies, next_position = await get_new_movies_page_async(position, limit)
+        return jsonify(pagination.page(movies, next_position))
+    except Exception as e:
+        logger.error(f"API error for new movies: {e}")
+        return jsonify({'error': 'Failed to fetch new movies'}), 500
 
-@app.route('/search')
+@routes.route('/search')
 @rate_limit
-def search():
+@request_deadline
+async def search():
     """Search movies page"""
     try:
         query = request.args.get('q', '')
+        year = request.args.get('year', type=int)
         if query:
-            movies = search_movies(query)
-            return render_template('search_results.html', movies=movies, query=query)
-        return render_template('search.html')
+            movies, next_position = await search_movies_page_async(query, year)
+            return await render_template_async('search_results.html', movies=movies, query=query, year=year,
+                                               next_cursor=pagination.encode_cursor(next_position))
+        return await render_template_async('search.html')
     except Exception as e:
         logger.error(f"Error in search: {e}")
-        return render_template('error.html', error="Search failed"), 500
+        return await render_template_async('error.html', error="Search failed"), 500
 
-@app.route('/api/search/<query>')
+@routes.route('/api/search/<query>')
 @rate_limit
-def api_search(query):
-    """API endpoint for movie search"""
+@request_deadline
+async def api_search(query):
+    """API endpoint for movie search, a page at a time"""
     try:
-        movies = search_movies(query)
-        return jsonify({'movies': movies, 'query': query})
+        position, limit = pagination.page_args(request.args, settings.PAGE_DEFAULT_LIMIT, settings.PAGE_MAX_LIMIT)
+    except pagination.InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        year = request.args.get('year', type=int)
+        movies, next_position = await search_movies_page_async(query, year, position, limit)
+        return jsonify(pagination.page(movies, next_position, query=query))
     except Exception as e:
         logger.error(f"API error for search {query}: {e}")
         return jsonify({'error': 'Failed to search movies'}), 500
 
-@app.errorhandler(404)
+@routes.errorhandler(404)
 def not_found(error):
     return render_template('error.html', error="Page not found"), 404
 
-@app.errorhandler(500)
+@routes.errorhandler(500)
 def internal_error(error):
     return render_template('error.html', error="Internal server error"), 500
 
-def get_movie_recommendations(genres):
-    """Fetch movie recommendations from Trakt API"""
-    if not TRAKT_CLIENT_ID:
-        logger.warning("No Trakt API key provided, using mock data")
-        return get_mock_movies()
-    
-    headers = {
+def trakt_headers():
+    """Request headers for the Trakt API"""
+    return {
         'Content-Type': 'application/json',
         'trakt-api-version': '2',
-        'trakt-api-key': TRAKT_CLIENT_ID
+        'trakt-api-key': upstream_key('TRAKT_CLIENT_ID')
     }
-    
-    movies = []
-    
-    # Get trending movies first
+
+async def fetch_trakt_list_async(name, page=1, genres=None):
+    """Fetch one Trakt movie list ('trending', 'popular' or 'releases').
+
+    ``page`` and ``genres`` (Trakt genre slugs) select a later page or a
+    genre-filtered view. Returns normalized movie dicts, or None if the list
+    could not be fetched.
+    """
+    url = trakt_list_url(name)
     try:
-        url = 'https://api.trakt.tv/movies/trending'
-        response = requests.get(url, headers=headers, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            for movie in data[:20]:  # Get top 20 trending movies
-                movie_info = movie['movie']
-                # Assign genres based on personality traits
-                assigned_genre = genres[0] if genres else 'drama'
-                movies.append({
-                    'title': movie_info['title'],
-                    'year': movie_info['year'],
-                    'ids': movie_info['ids'],
-                    'genre': assigned_genre,
-                    'watchers': movie.get('watchers', 0)
-                })
-        else:
-            logger.warning(f"Trakt API returned status {response.status_code}")
-            # Try alternative endpoint
-            url = 'https://api.trakt.tv/movies/popular'
-            response = requests.get(url, headers=headers, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                for movie in data[:15]:
-                    movie_info = movie
-                    assigned_genre = genres[0] if genres else 'drama'
-                    movies.append({
-                        'title': movie_info['title'],
-                        'year': movie_info['year'],
-                        'ids': movie_info['ids'],
-                        'genre': assigned_genre,
-                        'watchers': 0
-                    })
-            else:
-                logger.warning(f"Trakt API popular movies returned status {response.status_code}")
+        params = {'extended': 'full', 'limit': settings.TRAKT_LIST_LIMIT}
+        if page > 1:
+            params['page'] = page
+        if genres:
+            params['genres'] = ','.join(genres)
+        response = await async_client.get(url, headers=trakt_headers(), params=params, endpoint=f'trakt.{name}')
+        if response.status_code != 200:
+            logger.warning(f"Trakt API {name} movies returned status {response.status_code}")
+            mark_degraded()
+            return None
+        
+        movies = []
+        for item in response.json():
+            # Trending and releases wrap the movie, popular returns it bare
+            movie_info = item['movie'] if 'movie' in item else item
+            movies.append({
+                'title': movie_info['title'],
+                'year': movie_info['year'],
+                'ids': movie_info['ids'],
+                'genres': movie_info.get('genres') or [],
+                'rating': movie_info.get('rating') or 0,
+                'watchers': item.get('watchers', 0),
+                'release_date': item.get('release_date', ''),
+                'country': item.get('country', 'US')
+            })
+        return movies
     except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching trending movies: {e}")
+        logger.error(f"Error fetching {name} movies: {e}")
+    except (KeyError, TypeError, ValueError) as e:
+        logger.error(f"Unexpected Trakt {name} payload: {e}")
+    mark_degraded()
+    return None
+
+def fetch_trakt_list(name, page=1, genres=None):
+    return async_client.run(fetch_trakt_list_async(name, page, genres))
+
+async def paged_slice_async(fetch_page, page_size, offset, limit):
+    """Items ``offset`` to ``offset + limit`` of a feed served in fixed-size pages.
+
+    ``fetch_page(page)`` returns page ``page`` (from 1) or None. Returns the
+    items and whether more follow them.
+    """
+    items = []
+    page, start = offset // page_size + 1, offset % page_size
+    while True:
+        page_items = await fetch_page(page)
+        if not page_items:
+            return items, False
+        end = start + limit - len(items)
+        items.extend(page_items[start:end])
+        if len(page_items) > end:
+            return items, True
+        if len(page_items) < page_size:
+            return items, False
+        if len(items) >= limit:
+            return items, True
+        page, start = page + 1, 0
+
+async def trakt_list_slice_async(name, offset, limit, genres=None):
+    """Movies ``offset`` to ``offset + limit`` of a Trakt list and whether more follow.
+
+    The first page of an unfiltered list is read from the catalog snapshot.
+    """
+    async def fetch_page(page):
+        if page == 1 and not genres:
+            return await get_trakt_list_async(name)
+        return await fetch_trakt_list_async(name, page, genres)
+    
+    return await paged_slice_async(fetch_page, settings.TRAKT_LIST_LIMIT, offset, limit)
+
+async def get_trakt_list_async(name):
+    """Read a Trakt list from the catalog snapshot, fetching inline before the first one"""
+    snapshot = await app_state().catalog_store.current_async()
+    if snapshot is not None:
+        return snapshot.movies(name)
+    return await fetch_trakt_list_async(name)
+
+def get_trakt_list(name):
+    return async_client.run(get_trakt_list_async(name))
+
+async def get_recommendation_index_async():
+    """Return the genre ranking index over the current Trakt catalog"""
+    snapshot = await app_state().catalog_store.current_async()
+    if snapshot is not None:
+        # Building the index for a new snapshot is CPU work, keep it off the shared loop
+        return await asyncio.to_thread(ranking.index_for_snapshot, snapshot, settings.RECOMMENDATION_TOP_K)
     
-    # If we still don't have enough movies, try different endpoints
+    # No snapshot yet: rank whatever lists we can fetch inline
+    movies = []
+    trending = await fetch_trakt_list_async('trending')
+    if trending:
+        movies.extend(trending)
+    else:
+        popular = await fetch_trakt_list_async('popular')
+        if popular:
+            movies.extend(dict(movie, watchers=0) for movie in popular)
+    
+    # If we still don't have enough movies, add recent releases
     if len(movies) < 10:
-        try:
-            # Try recent releases
-            url = 'https://api.trakt.tv/movies/releases'
-            response = requests.get(url, headers=headers, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                for release in data[:10]:
-                    movie_info = release['movie']
-                    assigned_genre = genres[0] if genres else 'drama'
-                    movies.append({
-                        'title': movie_info['title'],
-                        'year': movie_info['year'],
-                        'ids': movie_info['ids'],
-                        'genre': assigned_genre,
-                        'watchers': 0
-                    })
-            else:
-                logger.warning(f"Trakt API releases returned status {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching releases: {e}")
+        releases = await fetch_trakt_list_async('releases')
+        if releases:
+            movies.extend(dict(movie, watchers=0) for movie in releases)
+    
+    if not movies:
+        return None
+    return await asyncio.to_thread(ranking.GenreIndex, movies, settings.RECOMMENDATION_TOP_K)
+
+def get_recommendation_index():
+    return async_client.run(get_recommendation_index_async())
+
+async def get_movie_recommendations_async(genres):
+    """Rank catalog movies for a profile's dominant genres"""
+    if not upstream_key('TRAKT_CLIENT_ID'):
+        logger.warning("No Trakt API key provided, using mock data")
+        return get_mock_movies()
+    
+    index = await get_recommendation_index_async()
+    movies = index.recommend(genres, limit=15) if index is not None else []
     
     # If still no movies, use mock data
     if not movies:
         logger.warning("No movies fetched from Trakt API, using mock data")
         return get_mock_movies()
     
-    return movies[:15]  # Return top 15 movies
+    return [
+        {
+            'title': movie['title'],
+            'year': movie['year'],
+            'ids': movie['ids'],
+            'genre': movie['genre'],
+            'genres': movie.get('genres', []),
+            'watchers': movie['watchers']
+        }
+        for movie in movies
+    ]
+
+def get_movie_recommendations(genres):
+    return async_client.run(get_movie_recommendations_async(genres))
+
+def genre_page_movie(movie, genre):
+    return {
+        'title': movie['title'],
+        'year': movie['year'],
+        'ids': movie['ids'],
+        'genre': genre,
+        'genres': movie.get('genres', []),
+        'watchers': movie.get('watchers', 0)
+    }
+
+async def get_genre_page_async(genre, position=None, limit=None):
+    """One page of movies for a genre and the position of the next (None at the end).
+
+    Pages walk the precomputed genre ranking first, then continue through
+    Trakt's popular list filtered to the genre, skipping movies already shown.
+    """
+    position = position or {}
+    limit = limit or settings.PAGE_DEFAULT_LIMIT
+    if not upstream_key('TRAKT_CLIENT_ID'):
+        return ([] if position else get_mock_movies()), None
+    
+    index = await get_recommendation_index_async()
+    if index is None:
+        return ([] if position else get_mock_movies()), None
+    
+    # Only the genre's own ranking: recommend() would pad it with movies of other genres
+    ranked = list({catalog.movie_key(movie): movie for movie in index.top(genre)}.values())
+    offset = position.get('o', 0)
+    if 'p' not in position and offset < len(ranked):
+        next_position = {'o': offset + limit} if len(ranked) > offset + limit else {'p': 0}
+        return [genre_page_movie(movie, genre) for movie in ranked[offset:offset + limit]], next_position
+    
+    shown = {catalog.movie_key(movie) for movie in ranked}
+    offset = position.get('p', 0)
+    movies, more = await trakt_list_slice_async('popular', offset, limit, ranking.trakt_genres(genre))
+    slugs = set(ranking.trakt_genres(genre))
+    page = [
+        genre_page_movie(movie, genre) for movie in movies
+        if catalog.movie_key(movie) not in shown and slugs & set(movie.get('genres') or [])
+    ]
+    return page, ({'p': offset + len(movies)} if more else None)
+
+async def iter_enrichment_async(lookups):
+    """Run the requested lookups for each ``(movie, fields)`` pair.
+
+    ``fields`` names what to fetch for that movie: 'streaming' and/or 'news'.
+    All lookups start at once on the event loop (at most ENRICH_MAX_WORKERS
+    running at a time), so the wait is the slowest single lookup rather than
+    the sum of them. Yields one dict per pair, in input order, as soon as
+    that pair is done; a failed lookup, or one still running when the
+    request deadline expires, is left out of its dict.
+    """
+    slots = asyncio.Semaphore(settings.ENRICH_MAX_WORKERS)
+    
+    async def bounded(fn, *args):
+        async with slots:
+            return await fn(*args)
+    
+    tasks = []
+    for movie, fields in lookups:
+        pair_tasks = {}
+        if 'streaming' in fields:
+            pair_tasks['streaming'] = asyncio.ensure_future(bounded(
+                get_streaming_info_async, movie['title'], movie.get('ids'), movie.get('year')
+            ))
+        if 'news' in fields:
+            pair_tasks['news'] = asyncio.ensure_future(bounded(get_movie_news_async, movie['title']))
+        tasks.append(pair_tasks)
+    
+    try:
+        for (movie, _), pair_tasks in zip(lookups, tasks):
+            result = {}
+            if pair_tasks:
+                await asyncio.wait(pair_tasks.values(), timeout=deadline.remaining())
+            for field, task in pair_tasks.items():
+                if not task.done():
+                    logger.warning(f"Deadline reached, skipping {field} for {movie['title']}")
+                elif task.exception() is not None:
+                    logger.error(f"Error enriching movie {movie['title']}: {task.exception()}")
+                else:
+                    result[field] = task.result()
+            yield result
+    finally:
+        # Don't hold the response for lookups past the deadline
+        for pair_tasks in tasks:
+            for task in pair_tasks.values():
+                task.cancel()
+
+async def fetch_enrichment_async(lookups):
+    """Run every lookup in ``lookups``; one result dict per pair, in input order"""
+    return [result async for result in iter_enrichment_async(lookups)]
+
+def fetch_enrichment(lookups):
+    return async_client.run(fetch_enrichment_async(lookups))
+
+def apply_enrichment(movie, data, with_news):
+    """Set a movie's streaming (and news) from looked-up data, or the defaults"""
+    if 'streaming' in data:
+        # Add streaming data from WatchMode
+        movie['streaming'] = data['streaming']
+        
+        # Add news for top movies
+        if with_news:
+            movie['news'] = data.get('news', [])
+    else:
+        # Add default streaming info
+        mark_degraded()
+        movie['streaming'] = {'netflix': True, 'hulu': False, 'prime': True}
+        movie['news'] = []
+    return movie
+
+async def iter_enriched_movies_async(movies):
+    """Enrich movie data with streaming info and news.
+
+    Movies already enriched in the catalog snapshot are filled from it; the
+    rest are looked up concurrently. Movies are yielded in input order, each
+    as soon as its own lookups are done.
+    """
+    snapshot = await app_state().catalog_store.current_async()
+    known = [
+        (snapshot.enrichment_for(movie) if snapshot is not None else None) or {}
+        for movie in movies
+    ]
+    
+    # Only look up what the snapshot does not already have
+    pending = {}
+    for index, movie in enumerate(movies):
+        fields = set()
+        if 'streaming' not in known[index]:
+            fields.add('streaming')
+        if index < settings.ENRICH_NEWS_LIMIT and 'news' not in known[index]:
+            fields.add('news')
+        if fields:
+            pending[index] = fields
+    
+    looked_up = iter_enrichment_async([(movies[index], fields) for index, fields in pending.items()])
+    try:
+        for index, movie in enumerate(movies):
+            data = known[index]
+            if index in pending:
+                data = dict(data, **await anext(looked_up))
+            yield apply_enrichment(movie, data, index < settings.ENRICH_NEWS_LIMIT)
+    finally:
+        await looked_up.aclose()
+
+async def enrich_movie_data_async(movies):
+    """Enrich every movie before returning them, in input order"""
+    return [movie async for movie in iter_enriched_movies_async(movies)]
 
 def enrich_movie_data(movies):
-    """Enrich movie data with streaming info and news"""
-    enriched = []
+    return async_client.run(enrich_movie_data_async(movies))
+
+def enrich_movie_stream(movies):
+    """Start enriching ``movies`` and return an iterator over them for a streamed page.
+
+    Call from an async view: lookups start on the event loop at once, under
+    the request deadline, while the streamed response consumes the iterator
+    on the worker thread, getting each movie (in order) as soon as it is
+    enriched. If enrichment fails, the remaining movies get the defaults.
+    """
+    ready = [Future() for _ in movies]
     
-    for movie in movies:
-        try:
-            # Add streaming data from WatchMode
-            streaming_info = get_streaming_info(movie['title'])
-            movie['streaming'] = streaming_info
-            
-            # Add news for top movies
-            if len(enriched) < 3:  # Only for top 3
-                news = get_movie_news(movie['title'])
-                movie['news'] = news
-            
-            enriched.append(movie)
-        except Exception as e:
-            logger.error(f"Error enriching movie {movie['title']}: {e}")
-            # Add default streaming info
-            movie['streaming'] = {'netflix': True, 'hulu': False, 'prime': True}
-            movie['news'] = []
-            enriched.append(movie)
+    async def produce():
+        index = 0
+        async for movie in iter_enriched_movies_async(movies):
+            ready[index].set_result(movie)
+            index += 1
+    
+    def fill_defaults(task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error streaming enriched movies: {task.exception()}")
+        for index, future in enumerate(ready):
+            if not future.done():
+                future.set_result(apply_enrichment(movies[index], {}, False))
     
-    return enriched
+    asyncio.ensure_future(produce()).add_done_callback(fill_defaults)
+    return (future.result() for future in ready)
+
+def batch_request_items():
+    """Return the ``titles`` and ``trakt_ids`` lists of a batch request body"""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return None, None
+    return payload.get('titles', []), payload.get('trakt_ids', [])
+
+def batch_request_size():
+    """Rate limit cost of a batch call: one unit per title or id, at least one"""
+    titles, trakt_ids = batch_request_items()
+    if not isinstance(titles, list) or not isinstance(trakt_ids, list):
+        return 1
+    size = len(titles) + len(trakt_ids)
+    # Oversized batches are rejected without doing any work
+    return size if 0 < size <= settings.BATCH_MAX_ITEMS else 1
 
-def get_streaming_info(movie_title):
+async def parse_batch_request_async():
+    """Parse a batch body of ``{"titles": [...], "trakt_ids": [...]}``.
+
+    Returns a dict of response key -> ``(title, ids, year)`` to look up:
+    titles are keyed by themselves and ids by their catalog key
+    ('trakt:<id>'). Ids missing from the catalog snapshot are looked up on
+    Trakt, and map to None when Trakt does not know them either.
+    Returns an error response tuple for a malformed or oversized body.
+    """
+    titles, trakt_ids = batch_request_items()
+    if (not isinstance(titles, list) or not isinstance(trakt_ids, list)
+            or not all(isinstance(title, str) and title for title in titles)
+            # bool is an int subclass, but true is not a Trakt id
+            or not all(isinstance(trakt_id, int) and not isinstance(trakt_id, bool) for trakt_id in trakt_ids)
+            or not titles + trakt_ids):
+        return jsonify({'error': 'Expected {"titles": [...], "trakt_ids": [...]}'}), 400
+    if len(titles) + len(trakt_ids) > settings.BATCH_MAX_ITEMS:
+        return jsonify({'error': f'At most {settings.BATCH_MAX_ITEMS} titles and ids per call'}), 413
+    
+    items = {title: (title, None, None) for title in titles}
+    snapshot = await app_state().catalog_store.current_async()
+    unknown = []
+    for trakt_id in trakt_ids:
+        key = catalog.movie_key({'ids': {'trakt': trakt_id}})
+        movie = snapshot.movie_for_key(key) if snapshot is not None else None
+        if movie is None:
+            unknown.append((key, trakt_id))
+            continue
+        items[key] = (movie['title'], movie['ids'], movie['year'])
+    
+    movies = await asyncio.gather(*(fetch_trakt_movie_async(trakt_id) for _, trakt_id in unknown))
+    for (key, _), movie in zip(unknown, movies):
+        items[key] = (movie['title'], movie['ids'], movie['year']) if movie else None
+    return items
+
+async def get_catalog_streaming_info_async(movie_title, ids=None, year=None):
+    """Streaming info from the catalog snapshot when it has the movie, else WatchMode"""
+    snapshot = await app_state().catalog_store.current_async()
+    if snapshot is not None:
+        known = snapshot.enrichment_for({'title': movie_title, 'ids': ids, 'year': year}) or {}
+        if 'streaming' in known:
+            return known['streaming']
+    return await get_streaming_info_async(movie_title, ids, year)
+
+async def resolve_batch_async(items, lookup):
+    """Run ``lookup(title, ids, year)`` for every batch item concurrently.
+
+    At most ENRICH_MAX_WORKERS lookups run at a time; each goes through the
+    response cache like a single-title call. Returns a key -> result map.
+    """
+    slots = asyncio.Semaphore(settings.ENRICH_MAX_WORKERS)
+    
+    async def resolve(item):
+        if item is None:
+            return None
+        async with slots:
+            return await lookup(*item)
+    
+    results = await asyncio.gather(*(resolve(item) for item in items.values()))
+    return dict(zip(items, results))
+
+async def find_watchmode_id_async(movie_title, ids=None, year=None):
+    """Resolve a movie to its WatchMode id, searching WatchMode on an index miss"""
+    index = app_state().watchmode_index
+    # SQLite reads and writes can wait on the file lock, keep them off the event loop
+    movie_id = await asyncio.to_thread(index.lookup, ids=ids, title=movie_title, year=year)
+    if movie_id is not None:
+        return movie_id
+    
+    # Search by a stable id when we have one, by name otherwise
+    ids = ids or {}
+    if ids.get('imdb'):
+        search_field, search_value = 'imdb_id', ids['imdb']
+    elif ids.get('tmdb'):
+        search_field, search_value = 'tmdb_movie_id', ids['tmdb']
+    else:
+        search_field, search_value = 'name', movie_title
+    
+    url = f'{settings.WATCHMODE_API_URL}/search'
+    params = {
+        'searchField': search_field,
+        'searchValue': search_value,
+        'apiKey': upstream_key('WATCHMODE_API_KEY'),
+        'searchType': 'movie'
+    }
+    response = await async_client.get(url, params=params, endpoint='watchmode.search')
+    
+    if response.status_code != 200:
+        logger.warning(f"WatchMode search API returned status {response.status_code}")
+        return None
+    
+    results = response.json().get('title_results') or []
+    if not results:
+        logger.warning(f"No title results found for {movie_title}")
+        return None
+    
+    # Prefer the result from the right year when searching by name
+    match = results[0]
+    if search_field == 'name' and year:
+        match = next((result for result in results if result.get('year') == year), match)
+    
+    movie_id = match['id']
+    await asyncio.to_thread(index.record, movie_id, ids=ids, title=movie_title, year=year)
+    await asyncio.to_thread(
+        index.record,
+        movie_id,
+        ids={'imdb': match.get('imdb_id'), 'tmdb': match.get('tmdb_id')}
+    )
+    return movie_id
+
+def find_watchmode_id(movie_title, ids=None, year=None):
+    return async_client.run(find_watchmode_id_async(movie_title, ids, year))
+
+async def get_streaming_info_async(movie_title, ids=None, year=None):
     """Get streaming availability from WatchMode API"""
-    if not WATCHMODE_API_KEY:
+    if not upstream_key('WATCHMODE_API_KEY'):
+        mark_degraded()
         return {'netflix': True, 'hulu': False, 'prime': True}
     
     try:
-        # Search for the movie
-        url = 'https://api.watchmode.com/v1/search'
-        params = {
-            'searchField': 'name',
-            'searchValue': movie_title,
-            'apiKey': WATCHMODE_API_KEY,
-            'searchType': 'movie'
-        }
-        response = requests.get(url, params=params, timeout=10)
+        movie_id = await find_watchmode_id_async(movie_title, ids, year)
         
-        if response.status_code == 200:
-            data = response.json()
-            if data.get('title_results') and len(data['title_results']) > 0:
-                movie_id = data['title_results'][0]['id']
+        if movie_id is not None:
+            # Get streaming sources
+            sources_url = f'{settings.WATCHMODE_API_URL}/title/{movie_id}/sources'
+            sources_response = await async_client.get(sources_url, params={'apiKey': upstream_key('WATCHMODE_API_KEY')}, endpoint='watchmode.sources')
+            
+            if sources_response.status_code == 200:
+                sources = sources_response.json()
+                streaming = {}
                 
-                # Get streaming sources
-                sources_url = f'https://api.watchmode.com/v1/title/{movie_id}/sources'
-                sources_response = requests.get(sources_url, params={'apiKey': WATCHMODE_API_KEY}, timeout=10)
+                # Map common streaming services
+                service_mapping = {
+                    'netflix': 'netflix',
+                    'hulu': 'hulu',
+                    'amazon prime': 'prime',
+                    'amazon prime video': 'prime',
+                    'disney+': 'disney',
+                    'hbo max': 'hbo',
+                    'apple tv+': 'apple',
+                    'peacock': 'peacock',
+                    'paramount+': 'paramount'
+                }
                 
-                if sources_response.status_code == 200:
-                    sources = sources_response.json()
-                    streaming = {}
-                    
-                    # Map common streaming services
-                    service_mapping = {
-                        'netflix': 'netflix',
-                        'hulu': 'hulu',
-                        'amazon prime': 'prime',
-                        'amazon prime video': 'prime',
-                        'disney+': 'disney',
-                        'hbo max': 'hbo',
-                        'apple tv+': 'apple',
-                        'peacock': 'peacock',
-                        'paramount+': 'paramount'
-                    }
-                    
-                    for source in sources:
-                        if source['type'] == 'sub':
-                            service_name = source['name'].lower()
-                            for key, value in service_mapping.items():
-                                if key in service_name:
-                                    streaming[value] = True
-                                    break
-                    
-                    # If no specific services found, provide default options
-                    if not streaming:
-                        streaming = {'netflix': True, 'hulu': False, 'prime': True}
-                    
-                    return streaming
-                else:
-                    logger.warning(f"WatchMode sources API returned status {sources_response.status_code}")
+                for source in sources:
+                    if source['type'] == 'sub':
+                        service_name = source['name'].lower()
+                        for key, value in service_mapping.items():
+                            if key in service_name:
+                                streaming[value] = True
+                                break
+                
+                # If no specific services found, provide default options
+                if not streaming:
+                    streaming = {'netflix': True, 'hulu': False, 'prime': True}
+                
+                return streaming
             else:
-                logger.warning(f"No title results found for {movie_title}")
-        else:
-            logger.warning(f"WatchMode search API returned status {response.status_code}")
+                logger.warning(f"WatchMode sources API returned status {sources_response.status_code}")
             
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching streaming info for {movie_title}: {e}")
@@ -439,13 +1105,73 @@ def get_streaming_info(movie_title):
         logger.error(f"Unexpected error in get_streaming_info: {e}")
     
     # Return default streaming options
+    mark_degraded()
     return {'netflix': True, 'hulu': False, 'prime': True}
 
-def get_movie_news(movie_title):
+def get_streaming_info(movie_title, ids=None, year=None):
+    return async_client.run(get_streaming_info_async(movie_title, ids, year))
+
+async def get_movie_news_async(movie_title):
     """Get recent news about the movie from NewsAPI"""
-    if not NEWS_API_KEY:
+    if not upstream_key('NEWS_API_KEY'):
         return []
+    if settings.NEWS_LOOKUP_MODE == 'sequential':
+        return await get_movie_news_sequential_async(movie_title)
     
+    try:
+        # One boolean query covers the movie/film/cinema variants; the bare
+        # title variant is ranked below them locally instead of queried
+        url = f'{settings.NEWS_API_URL}/everything'
+        params = {
+            'q': f'"{movie_title}"',
+            'apiKey': upstream_key('NEWS_API_KEY'),
+            'language': 'en',
+            'sortBy': 'publishedAt',
+            'pageSize': settings.NEWS_CANDIDATE_ARTICLES,
+            'domains': settings.NEWS_DOMAINS
+        }
+        
+        response = await async_client.get(url, params=params, endpoint='newsapi.everything',
+                                          hedge_after=settings.NEWS_HEDGE_AFTER)
+        if response.status_code == 200:
+            articles = response.json().get('articles', [])
+            return rank_news_articles(articles, movie_title)[:settings.NEWS_MAX_ARTICLES]
+        logger.warning(f"NewsAPI returned status {response.status_code} for: {movie_title}")
+                
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error fetching news: {e}")
+    except Exception as e:
+        logger.error(f"Unexpected error in get_movie_news: {e}")
+    
+    mark_degraded()
+    return []
+
+def get_movie_news(movie_title):
+    return async_client.run(get_movie_news_async(movie_title))
+
+def rank_news_articles(articles, movie_title):
+    """Order articles by relevance to a movie, newest first within a tier.
+
+    Articles quoting the title next to a movie/film/cinema keyword come
+    first, then those naming the title in their headline, then the rest.
+    """
+    title = movie_title.lower()
+    
+    def relevance(article):
+        headline = (article.get('title') or '').lower()
+        text = f"{headline} {(article.get('description') or '').lower()}"
+        mentions_title = title in text
+        return (
+            mentions_title and any(keyword in text for keyword in settings.NEWS_KEYWORDS),
+            title in headline,
+            mentions_title
+        )
+    
+    newest_first = sorted(articles, key=lambda a: a.get('publishedAt') or '', reverse=True)
+    return sorted(newest_first, key=relevance, reverse=True)
+
+async def get_movie_news_sequential_async(movie_title):
+    """Legacy lookup: one NewsAPI query per variant until one has results"""
     try:
         # Try different search queries for better results
         search_queries = [
@@ -456,17 +1182,17 @@ def get_movie_news(movie_title):
         ]
         
         for query in search_queries:
-            url = 'https://newsapi.org/v2/everything'
+            url = f'{settings.NEWS_API_URL}/everything'
             params = {
                 'q': query,
-                'apiKey': NEWS_API_KEY,
+                'apiKey': upstream_key('NEWS_API_KEY'),
                 'language': 'en',
                 'sortBy': 'publishedAt',
-                'pageSize': 3,
-                'domains': 'variety.com,hollywoodreporter.com,indiewire.com,deadline.com,thewrap.com'
+                'pageSize': settings.NEWS_MAX_ARTICLES,
+                'domains': settings.NEWS_DOMAINS
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = await async_client.get(url, params=params, endpoint='newsapi.everything')
             if response.status_code == 200:
                 data = response.json()
                 articles = data.get('articles', [])
@@ -474,77 +1200,49 @@ def get_movie_news(movie_title):
                     return articles
             else:
                 logger.warning(f"NewsAPI returned status {response.status_code} for query: {query}")
+                mark_degraded()
                 
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching news: {e}")
+        mark_degraded()
     except Exception as e:
         logger.error(f"Unexpected error in get_movie_news: {e}")
+        mark_degraded()
     
     return []
 
+def get_movie_news_sequential(movie_title):
+    return async_client.run(get_movie_news_sequential_async(movie_title))
+
+def expand_profile(stored):
+    """Template-ready profile from the traits and profile id kept in the session"""
+    profile = personality_engine.profile(stored['profile_id'])
+    return {
+        'traits': stored['traits'],
+        'profile_name': profile['name'],
+        'profile_description': profile['description']
+    }
+
 def get_personality_profile(genres, answers):
-    """Determine personality profile based on quiz answers"""
-    profiles = {
-        'The Intrepid Explorer': {
-            'genres': ['adventure', 'action', 'fantasy'],
-            'description': 'You crave excitement and discovery. Your adventurous spirit draws you to epic journeys, thrilling action sequences, and fantastical worlds that push the boundaries of imagination.'
-        },
-        'The Thoughtful Analyst': {
-            'genres': ['mystery', 'thriller', 'sci-fi'],
-            'description': 'Your sharp mind loves to solve puzzles and explore complex narratives. You appreciate films that challenge your intellect and keep you guessing until the very end.'
-        },
-        'The Romantic Dreamer': {
-            'genres': ['romance', 'drama', 'indie'],
-            'description': 'You have a deep appreciation for human connection and emotional storytelling. Your heart is drawn to films that explore love, relationships, and the beautiful complexity of human nature.'
-        },
-        'The Social Butterfly': {
-            'genres': ['comedy', 'romance', 'drama'],
-            'description': 'You love to laugh and connect with others. Your vibrant personality enjoys films that bring people together, whether through humor, romance, or compelling character dynamics.'
-        },
-        'The Creative Artist': {
-            'genres': ['drama', 'indie', 'biography'],
-            'description': 'You have an artistic soul that appreciates beautiful storytelling and authentic performances. You are drawn to films that showcase human creativity and the power of artistic expression.'
-        },
-        'The Tech Enthusiast': {
-            'genres': ['sci-fi', 'thriller', 'action'],
-            'description': 'You are fascinated by innovation and the future. Your forward-thinking nature loves films that explore technology, artificial intelligence, and the possibilities of tomorrow.'
-        }
+    """Determine personality profile based on dominant genres"""
+    profile = personality_engine.profile(personality_engine.match_profile(genres))
+    return {
+        'name': profile['name'],
+        'description': profile['description']
     }
-    
-    # Find the best matching profile
-    best_match = None
-    highest_score = 0
-    
-    for profile_name, profile_data in profiles.items():
-        score = 0
-        for genre in genres:
-            if genre in profile_data['genres']:
-                score += 1
-        if score > highest_score:
-            highest_score = score
-            best_match = profile_name
-    
-    # Default to Thoughtful Analyst if no clear match
-    if not best_match:
-        best_match = 'The Thoughtful Analyst'
-    
+
+def trailer_info(movie_title, video_id):
+    """Trailer payload for the frontend; ``video_id`` None means unavailable"""
     return {
-        'name': best_match,
-        'description': profiles[best_match]['description']
+        'url': f"http://googleusercontent.com/youtube.com/8{video_id}" if video_id else None,
+        'title': movie_title,
+        'available': bool(video_id)
     }
 
-def get_movie_trailer(movie_title):
-    """Get movie trailer from YouTube API"""
-    api_key = os.getenv('YOUTUBE_API_KEY')
-    if not api_key:
-        logger.warning("No YouTube API key provided")
-        return {
-            'url': None,
-            'title': movie_title,
-            'available': False
-        }
+async def search_trailer_async(movie_title, api_key):
+    """Search YouTube for a trailer; returns its video id, or None if there is none"""
     query = f"{movie_title} official trailer"
-    url = "https://www.googleapis.com/youtube/v3/search"
+    url = f"{settings.YOUTUBE_API_URL}/search"
     params = {
         "part": "snippet",
         "q": query,
@@ -553,105 +1251,148 @@ def get_movie_trailer(movie_title):
         "maxResults": 1,
         "videoEmbeddable": "true"
     }
+    response = await async_client.get(url, params=params, endpoint='youtube.search')
+    if response.status_code != 200:
+        raise requests.exceptions.HTTPError(f"YouTube search returned {response.status_code}")
+    items = response.json().get("items")
+    if items:
+        return items[0]["id"]["videoId"]
+    return None
+
+async def get_movie_trailer_async(movie_title, ids=None, year=None):
+    """Get movie trailer from the trailer store, searching YouTube only on a miss"""
+    api_key = upstream_key('YOUTUBE_API_KEY')
+    if not api_key:
+        logger.warning("No YouTube API key provided")
+        mark_degraded()
+        return trailer_info(movie_title, None)
+    store = app_state().trailer_store
+    # The store is SQLite, keep its reads and quota commits off the event loop
+    stored = await asyncio.to_thread(store.lookup, ids, movie_title, year)
+    if stored is not None:
+        return trailer_info(movie_title, stored['video_id'])
+    if not await asyncio.to_thread(store.spend_quota, YOUTUBE_SEARCH_COST):
+        logger.warning(f"YouTube quota exhausted, no trailer lookup for {movie_title}")
+        mark_degraded()
+        return trailer_info(movie_title, None)
     try:
-        response = requests.get(url, params=params, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            items = data.get("items")
-            if items:
-                video_id = items[0]["id"]["videoId"]
-                return {
-                    'url': f"http://googleusercontent.com/youtube.com/8{video_id}",
-                    'title': movie_title,
-                    'available': True
-                }
-        logger.warning(f"No trailer found for {movie_title}")
-        return {
-            'url': None,
-            'title': movie_title,
-            'available': False
-        }
+        video_id = await search_trailer_async(movie_title, api_key)
     except Exception as e:
         logger.error(f"Error fetching trailer from YouTube: {e}")
-        return {
-            'url': None,
-            'title': movie_title,
-            'available': False
-        }
+        mark_degraded()
+        return trailer_info(movie_title, None)
+    await asyncio.to_thread(store.record, video_id, ids, movie_title, year)
+    if video_id is None:
+        logger.warning(f"No trailer found for {movie_title}")
+    return trailer_info(movie_title, video_id)
 
-def get_new_movies():
-    """Fetch latest movie releases from Trakt API"""
-    if not TRAKT_CLIENT_ID:
+def get_movie_trailer(movie_title, ids=None, year=None):
+    return async_client.run(get_movie_trailer_async(movie_title, ids, year))
+
+async def prefetch_trailers_async(snapshot):
+    """Fill the trailer store for trending and new releases within the prefetch quota.
+
+    Returns the number of YouTube searches made.
+    """
+    api_key = upstream_key('YOUTUBE_API_KEY')
+    if not api_key:
+        return 0
+    store = app_state().trailer_store
+    missing = {}
+    for name in settings.TRAILER_PREFETCH_LISTS:
+        for movie in snapshot.movies(name) or []:
+            stored = await asyncio.to_thread(store.lookup, movie.get('ids'), movie.get('title'), movie.get('year'))
+            if stored is None:
+                missing.setdefault(catalog.movie_key(movie), movie)
+
+    searched = 0
+    for movie in missing.values():
+        if not await asyncio.to_thread(store.spend_quota, YOUTUBE_SEARCH_COST, prefetch=True):
+            logger.info(f"Trailer prefetch stopped at its YouTube quota share, {len(missing) - searched} left")
+            break
+        searched += 1
+        try:
+            video_id = await search_trailer_async(movie['title'], api_key)
+        except Exception as e:
+            logger.error(f"Error prefetching trailer for {movie['title']}: {e}")
+            continue
+        await asyncio.to_thread(store.record, video_id, movie.get('ids'), movie['title'], movie.get('year'))
+    return searched
+
+def prefetch_trailers(snapshot):
+    return async_client.run(prefetch_trailers_async(snapshot))
+
+async def get_new_movies_page_async(position=None, limit=None):
+    """One page of new releases and the position of the next (None at the end)"""
+    position = position or {}
+    limit = limit or settings.NEW_MOVIES_PAGE_SIZE
+    if not upstream_key('TRAKT_CLIENT_ID'):
         logger.warning("No Trakt API key provided, using mock data")
-        return get_mock_new_movies()
-    
-    headers = {
-        'Content-Type': 'application/json',
-        'trakt-api-version': '2',
-        'trakt-api-key': TRAKT_CLIENT_ID
-    }
-    
-    movies = []
+        return ([] if position else get_mock_new_movies()), None
     
-    try:
-        # Try different endpoints for new movies
-        endpoints = [
-            'https://api.trakt.tv/movies/releases',
-            'https://api.trakt.tv/movies/trending',
-            'https://api.trakt.tv/movies/popular'
-        ]
-        
-        for url in endpoints:
-            try:
-                response = requests.get(url, headers=headers, timeout=10)
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    if 'releases' in url:
-                        # Handle releases endpoint
-                        for release in data[:15]:
-                            movie_info = release['movie']
-                            movies.append({
-                                'title': movie_info['title'],
-                                'year': movie_info['year'],
-                                'ids': movie_info['ids'],
-                                'genre': 'new_release',
-                                'release_date': release.get('release_date', ''),
-                                'country': release.get('country', 'US')
-                            })
-                    else:
-                        # Handle trending/popular endpoints
-                        for movie in data[:15]:
-                            movie_info = movie['movie'] if 'movie' in movie else movie
-                            movies.append({
-                                'title': movie_info['title'],
-                                'year': movie_info['year'],
-                                'ids': movie_info['ids'],
-                                'genre': 'new_release',
-                                'release_date': '',
-                                'country': 'US'
-                            })
-                    
-                    if movies:
-                        break  # If we got movies, stop trying other endpoints
-                        
-                else:
-                    logger.warning(f"Trakt API {url} returned status {response.status_code}")
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Error fetching from {url}: {e}")
-                continue
-                
-    except Exception as e:
-        logger.error(f"Error in get_new_movies: {e}")
+    # Try different lists for new movies, staying with the first that has any
+    offset = position.get('o', 0)
+    names = [position['l']] if position.get('l') in TRAKT_LIST_NAMES else ['releases', 'trending', 'popular']
+    movies, more = [], False
+    for name in names:
+        movies, more = await trakt_list_slice_async(name, offset, limit)
+        if movies:
+            break
     
     if not movies:
+        if position:
+            return [], None
         logger.warning("No new movies fetched from Trakt API, using mock data")
-        return get_mock_new_movies()
+        return get_mock_new_movies(), None
+    
+    page = [
+        {
+            'title': movie['title'],
+            'year': movie['year'],
+            'ids': movie['ids'],
+            'genre': 'new_release',
+            'release_date': movie['release_date'] if name == 'releases' else '',
+            'country': movie['country'] if name == 'releases' else 'US'
+        }
+        for movie in movies
+    ]
+    return page, ({'l': name, 'o': offset + len(movies)} if more else None)
+
+async def get_new_movies_async():
+    """Fetch latest movie releases from the Trakt catalog"""
+    movies, _ = await get_new_movies_page_async()
+    return movies
+
+def get_new_movies():
+    return async_client.run(get_new_movies_async())
+
+async def build_catalog_snapshot_async():
+    """Fetch and enrich every Trakt list into a new catalog snapshot"""
+    if not upstream_key('TRAKT_CLIENT_ID'):
+        return None
+    
+    fetched = await asyncio.gather(*(fetch_trakt_list_async(name) for name in TRAKT_LIST_NAMES))
+    lists = dict(zip(TRAKT_LIST_NAMES, fetched))
+    if not any(lists.values()):
+        return None
+    
+    # Enrich each movie once, with news for the top of every list
+    lookups = {}
+    for movies in lists.values():
+        for index, movie in enumerate(movies or []):
+            _, fields = lookups.setdefault(catalog.movie_key(movie), (movie, {'streaming'}))
+            if index < settings.ENRICH_NEWS_LIMIT:
+                fields.add('news')
+    looked_up = await fetch_enrichment_async(list(lookups.values()))
     
-    return movies[:15]  # Return top 15 movies
+    return catalog.CatalogSnapshot.build(lists, dict(zip(lookups, looked_up)))
+
+def build_catalog_snapshot():
+    return async_client.run(build_catalog_snapshot_async())
 
 def get_mock_new_movies():
     """Return mock new movie data"""
+    mark_degraded()
     return [
         {
             'title': 'Dune: Part Two',
@@ -700,43 +1441,98 @@ def get_mock_new_movies():
         }
     ]
 
-def search_movies(query):
-    """Search movies using Trakt API"""
-    if not TRAKT_CLIENT_ID:
+async def search_local_index_async(query, year=None):
+    """Answer a search from the local index; empty on a cold miss"""
+    state = app_state()
+    snapshot = await state.catalog_store.current_async()
+    
+    def search_snapshot():
+        state.search_index.sync_snapshot(snapshot)
+        return state.search_index.search(query, year=year)
+    
+    # Indexing a new snapshot and scoring trigrams are CPU work, keep them off the shared loop
+    results = await asyncio.to_thread(search_snapshot)
+    if not results or results[0][0] < settings.SEARCH_INDEX_MIN_SCORE:
+        return []
+    return [
+        {
+            'title': movie['title'],
+            'year': movie['year'],
+            'ids': movie['ids'],
+            'genre': 'search_result',
+            'score': score
+        }
+        for score, movie in results
+        if score >= settings.SEARCH_INDEX_MIN_SCORE
+    ]
+
+async def fetch_trakt_search_async(query, year=None, page=1):
+    """One page of Trakt search results, or None if the search failed"""
+    url = f'{settings.TRAKT_API_URL}/search/movie'
+    params = {'query': query, 'limit': settings.TRAKT_SEARCH_LIMIT}
+    if page > 1:
+        params['page'] = page
+    if year:
+        params['years'] = year
+    response = await async_client.get(url, headers=trakt_headers(), params=params, endpoint='trakt.search')
+    if response.status_code != 200:
+        logger.warning(f"Trakt API search returned status {response.status_code}")
+        mark_degraded()
+        return None
+    return [
+        {
+            'title': item['movie']['title'],
+            'year': item['movie']['year'],
+            'ids': item['movie']['ids'],
+            'genre': 'search_result',
+            'score': item.get('score', 0)
+        }
+        for item in response.json()
+    ]
+
+async def fetch_trakt_movie_async(trakt_id):
+    """One movie by Trakt id, or None if it is unknown or the lookup failed"""
+    if not upstream_key('TRAKT_CLIENT_ID'):
+        return None
+    url = f'{settings.TRAKT_API_URL}/movies/{trakt_id}'
+    try:
+        response = await async_client.get(url, headers=trakt_headers(), endpoint='trakt.movie')
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            logger.warning(f"Trakt API movie {trakt_id} returned status {response.status_code}")
+            mark_degraded()
+            return None
+        movie = response.json()
+        return {'title': movie['title'], 'year': movie['year'], 'ids': movie['ids']}
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error fetching Trakt movie {trakt_id}: {e}")
+    except (KeyError, TypeError, ValueError) as e:
+        logger.error(f"Unexpected Trakt movie payload: {e}")
+    mark_degraded()
+    return None
+
+async def search_movies_async(query, year=None):
+    """Search movies, using the local index and Trakt API on a cold miss"""
+    if not upstream_key('TRAKT_CLIENT_ID'):
         logger.warning("No Trakt API key provided, using mock search")
-        return search_mock_movies(query)
+        return search_mock_movies(query, year)
     
-    headers = {
-        'Content-Type': 'application/json',
-        'trakt-api-version': '2',
-        'trakt-api-key': TRAKT_CLIENT_ID
-    }
+    movies = await search_local_index_async(query, year)
+    if movies:
+        return movies
     
-    movies = []
+    headers = trakt_headers()
     
     try:
         # Try search endpoint first
-        url = 'https://api.trakt.tv/search/movie'
-        params = {'query': query, 'limit': 20}
-        response = requests.get(url, headers=headers, params=params, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            for item in data:
-                movie_info = item['movie']
-                movies.append({
-                    'title': movie_info['title'],
-                    'year': movie_info['year'],
-                    'ids': movie_info['ids'],
-                    'genre': 'search_result',
-                    'score': item.get('score', 0)
-                })
+        results = await fetch_trakt_search_async(query, year)
+        if results is not None:
+            movies.extend(results)
         else:
-            logger.warning(f"Trakt API search returned status {response.status_code}")
-            
             # If search fails, try to get popular movies and filter
-            url = 'https://api.trakt.tv/movies/popular'
-            response = requests.get(url, headers=headers, timeout=10)
+            url = trakt_list_url('popular')
+            response = await async_client.get(url, headers=headers, endpoint='trakt.popular')
             if response.status_code == 200:
                 data = response.json()
                 query_lower = query.lower()
@@ -757,15 +1553,57 @@ def search_movies(query):
                 
     except requests.exceptions.RequestException as e:
         logger.error(f"Error searching movies: {e}")
+        mark_degraded()
     
     if not movies:
         logger.warning("No search results from Trakt API, using mock search")
-        return search_mock_movies(query)
+        return search_mock_movies(query, year)
     
+    # Remember every title we have seen for future local answers
+    app_state().search_index.add_many(movies)
     return movies
 
-def search_mock_movies(query):
-    """Mock search function"""
+async def search_movies_page_async(query, year=None, position=None, limit=None):
+    """One page of search results and the position of the next (None at the end).
+
+    Pages walk the local index matches first, then continue through Trakt
+    search pages, skipping movies already shown.
+    """
+    position = position or {}
+    limit = limit or settings.PAGE_DEFAULT_LIMIT
+    if not upstream_key('TRAKT_CLIENT_ID'):
+        return ([] if position else search_mock_movies(query, year)[:limit]), None
+    
+    local = await search_local_index_async(query, year)
+    if 'p' not in position and local:
+        offset = position.get('o', 0)
+        next_position = {'o': offset + limit} if len(local) > offset + limit else {'p': 0}
+        return local[offset:offset + limit], next_position
+    
+    offset = position.get('p', 0)
+    try:
+        movies, more = await paged_slice_async(
+            lambda page: fetch_trakt_search_async(query, year, page), settings.TRAKT_SEARCH_LIMIT, offset, limit
+        )
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error searching movies: {e}")
+        mark_degraded()
+        movies, more = [], False
+    
+    if not movies and not position:
+        # Cold miss with no Trakt results: the popular-list and mock fallbacks
+        return (await search_movies_async(query, year))[:limit], None
+    app_state().search_index.add_many(movies)
+    shown = {catalog.movie_key(movie) for movie in local}
+    page = [movie for movie in movies if catalog.movie_key(movie) not in shown]
+    return page, ({'p': offset + len(movies)} if more else None)
+
+def search_movies(query, year=None):
+    return async_client.run(search_movies_async(query, year))
+
+def search_mock_movies(query, year=None):
+    """Mock search function with the same fuzzy matching as the local index"""
+    mark_degraded()
     all_movies = [
         {'title': 'Inception', 'year': 2010, 'genre': 'sci-fi'},
         {'title': 'The Dark Knight', 'year': 2008, 'genre': 'action'},
@@ -779,16 +1617,20 @@ def search_mock_movies(query):
         {'title': 'Schindler\'s List', 'year': 1993, 'genre': 'drama'}
     ]
     
-    query_lower = query.lower()
+    index = SearchIndex()
+    index.add_many(all_movies)
+    genres = {movie['title']: movie['genre'] for movie in all_movies}
+    
     results = []
-    for movie in all_movies:
-        if query_lower in movie['title'].lower():
-            results.append(movie)
+    for score, movie in index.search(query, year=year):
+        if score >= settings.SEARCH_INDEX_MIN_SCORE:
+            results.append({'title': movie['title'], 'year': movie['year'], 'genre': genres[movie['title']]})
     
     return results
 
 def get_mock_movies():
     """Return mock movie data for testing"""
+    mark_degraded()
     return [
         {
             'title': 'Inception',
@@ -827,5 +1669,135 @@ def get_mock_movies():
         }
     ]
 
+# Upstream plumbing built from get_config() at import and shared by every app
+# in the process (the one event loop, its connection pools, the response
+# cache, circuit breakers and the recorder); configure() rebuilds it
+UPSTREAM_MODULES = (upstream_snapshot, cache, circuit_breaker, http_client, async_client)
+
+_upstream_config = get_config()
+
+def upstream_key(name):
+    """The configured credential ``name`` for an upstream.
+
+    Replayed upstream calls need no credentials, so in replay mode a missing
+    key must not send the helpers to their mock data.
+    """
+    key = getattr(settings, name)
+    if not key and upstream_snapshot.snapshot.mode == 'replay':
+        return upstream_snapshot.REPLAY_KEY
+    return key
+
+def configure(cfg):
+    """Rebuild the shared upstream plumbing from a configuration class"""
+    global _upstream_config
+    if cfg is not _upstream_config:
+        for module in UPSTREAM_MODULES:
+            module.configure(cfg)
+        _upstream_config = cfg
+
+def in_app_context(app, func):
+    """``func`` run inside ``app``'s context, for work outside a request"""
+    @wraps(func)
+    def run(*args, **kwargs):
+        with app.app_context():
+            return func(*args, **kwargs)
+    return run
+
+class AppState:
+    """The stores and limiter one app owns, kept in ``app.extensions['cinematic']``"""
+    
+    def __init__(self, app, cfg):
+        self.catalog_store = catalog.create_store(cfg)
+        # The refresher thread and celery have no request, so give them the app's context
+        self.catalog_refresher = catalog.CatalogRefresher(
+            self.catalog_store, in_app_context(app, build_catalog_snapshot), cfg.CATALOG_REFRESH_INTERVAL,
+            on_publish=in_app_context(app, prefetch_trailers)
+        )
+        self.search_index = SearchIndex()
+        self.limiter = rate_limiter.RateLimiter.from_config(cfg)
+        self.trailer_store = trailer_store.TrailerStore.from_config(cfg)
+        self.watchmode_index = watchmode_index.WatchModeIndex.from_config(cfg)
+
+def app_state():
+    return current_app.extensions['cinematic']
+
+def upstream_hosts():
+    """Base URLs of the upstreams there are credentials for"""
+    keyed = (
+        (settings.TRAKT_API_URL, upstream_key('TRAKT_CLIENT_ID')),
+        (settings.WATCHMODE_API_URL, upstream_key('WATCHMODE_API_KEY')),
+        (settings.NEWS_API_URL, upstream_key('NEWS_API_KEY')),
+        (settings.YOUTUBE_API_URL, upstream_key('YOUTUBE_API_KEY'))
+    )
+    return [url for url, key in keyed if key]
+
+def prewarm(app):
+    """Compile every template and load the latest catalog snapshot with its indexes"""
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    state = app.extensions['cinematic']
+    snapshot = state.catalog_store.current()
+    if snapshot is None:
+        logger.info("No catalog snapshot published yet, the first refresh will build one")
+        return
+    ranking.index_for_snapshot(snapshot, app.config['RECOMMENDATION_TOP_K'])
+    state.search_index.sync_snapshot(snapshot)
+    logger.info(f"Prewarmed catalog snapshot {snapshot.version}")
+
+def start_worker(app):
+    """Per-process start-up: open upstream connections and start the app's catalog refresher.
+
+    Sockets and threads do not survive a fork, so when the app is preloaded
+    in the gunicorn master this runs in each worker instead (see
+    gunicorn.conf.py).
+    """
+    with app.app_context():
+        if settings.PREWARM_CONNECTIONS and upstream_snapshot.snapshot.mode != 'replay':
+            async_client.warm(upstream_hosts(), settings.PREWARM_TIMEOUT)
+        if settings.CATALOG_REFRESH_MODE == 'thread' and upstream_key('TRAKT_CLIENT_ID'):
+            app.extensions['cinematic'].catalog_refresher.start()
+
+def create_app(config_name=None, preload=False):
+    """Build the app for a configuration: a name from config.py's ``config`` or a class.
+
+    The app keeps its settings in ``app.config`` and its own catalog store,
+    refresher, search index, rate limiter, session interface, trailer store
+    and WatchMode index, so building another app leaves this one as it was.
+    Only the upstream plumbing is shared by the process (see ``configure``).
+    Templates and the catalog snapshot are prewarmed before returning, and
+    ``start_worker`` runs too, unless ``preload`` says the app is being built
+    in a gunicorn master that forks workers.
+    """
+    if config_name is None:
+        cfg = get_config()
+    elif isinstance(config_name, str):
+        if config_name not in configs:
+            raise ValueError(f"Unknown configuration {config_name!r}, expected one of {', '.join(configs)}")
+        cfg = configs[config_name]
+    else:
+        cfg = config_name
+    configure(cfg)
+    
+    app = CinematicFlask(__name__)
+    app.config.from_object(cfg)
+    app.extensions['cinematic'] = AppState(app, cfg)
+    app.session_interface = sessions.create_interface(cfg)
+    app.add_template_global(assets.asset_url)
+    routes.register(app)
+    
+    prewarm(app)
+    if not preload:
+        start_worker(app)
+    return app
+
+def __getattr__(name):
+    # ``app.app`` (python app.py, gunicorn app:app, the benchmarks) is built
+    # on first use for the environment's configuration
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == '__main__':
-    app.run(debug=True, host='127.0.0.1', port=5000)
\ No newline at end of file
+    create_app().run(debug=True, host='127.0.0.1', port=5000)
@@ -0,0 +1,266 @@
+"""
+ASGI entry point for serving without a thread per request.
+
+    uvicorn asgi:app --workers 4
+
+Under gunicorn each request holds a worker thread until its response is
+built, even while an async view is only waiting on upstreams. Here async
+views run as tasks on the shared upstream loop and the server just awaits
+them, so a request waiting on Trakt or WatchMode holds no thread and one
+process serves hundreds at once. Sync work (session reads and writes,
+request hooks, sync views, streamed bodies) runs in worker threads, which
+it holds only while it runs. A view still running when the client
+disconnects is cancelled, and a streamed body stops being read.
+
+Each step is one of Flask's public dispatch methods (``preprocess_request``,
+``handle_user_exception``, ``finalize_request``, ...), called in the order
+``Flask.wsgi_app`` calls them; test_asgi.py checks the result behaves like
+the WSGI app for hooks, sessions, error handlers and streamed bodies.
+"""
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import io
+import os
+import sys
+
+from flask.signals import request_started
+
+import async_client
+from app import StreamedPage, create_app
+
+
+class AsgiAdapter:
+    """Serves a ``CinematicFlask`` app over ASGI (``http`` and ``lifespan`` scopes)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope {scope['type']!r}")
+
+        body = await read_body(receive)
+        if body is None:
+            return  # The client left before sending its body
+        exchange = Exchange()
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        try:
+            # The view runs on the upstream loop, where the aiohttp sessions live
+            respond = asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+                self._respond(environ_for(scope, body), exchange), async_client.get_loop()
+            ))
+            await asyncio.wait({respond, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not respond.done():
+                async_client.get_loop().call_soon_threadsafe(exchange.disconnect)
+                return
+            (status, headers, body), context = respond.result()
+
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            if isinstance(body, bytes):
+                await send({'type': 'http.response.body', 'body': body})
+                return
+            await self._stream(body, context, send, disconnected)
+        finally:
+            disconnected.cancel()
+
+    async def _stream(self, body, context, send, disconnected):
+        # Streamed bodies block between chunks, read them in worker threads
+        loop = asyncio.get_running_loop()
+
+        def read(fn, *args):
+            return loop.run_in_executor(None, functools.partial(context.run, fn, *args))
+
+        try:
+            chunks = await read(iter, body)
+            while not disconnected.done():
+                chunk = await read(next, chunks, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        finally:
+            if hasattr(body, 'close'):
+                await read(body.close)
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _respond(self, environ, exchange):
+        """``Flask.wsgi_app`` with the view awaited rather than run to completion on a thread.
+
+        Every step shares one context, so the request context pushed first
+        is the one hooks, the view and a streamed body see. Returns
+        ``((status, headers, body), context)``.
+        """
+        app = self.app
+        loop = asyncio.get_running_loop()
+        context = contextvars.Context()
+
+        def call(fn, *args, **kwargs):
+            return loop.run_in_executor(None, functools.partial(context.run, fn, *args, **kwargs))
+
+        ctx = app.request_context(environ)
+        error = None
+        try:
+            try:
+                # Opens the session, a store read
+                await call(ctx.push)
+                response = await self._full_dispatch(ctx, context, call, exchange)
+            except Exception as e:
+                error = e
+                response = await call(app.handle_exception, e)
+            except BaseException:
+                error = sys.exc_info()[1]
+                raise
+            return await call(wsgi_response, response, environ), context
+        finally:
+            if error is not None and app.should_ignore_error(error):
+                error = None
+            await call(ctx.pop, error)
+
+    async def _full_dispatch(self, ctx, context, call, exchange):
+        app = self.app
+        try:
+            rv = await call(self._preprocess)
+            if rv is None:
+                rv = await self._dispatch(ctx.request, context, call, exchange)
+        except Exception as e:
+            rv = await call(app.handle_user_exception, e)
+        return await call(self._finalize, rv)
+
+    def _preprocess(self):
+        request_started.send(self.app)
+        return self.app.preprocess_request()
+
+    async def _dispatch(self, request, context, call, exchange):
+        app = self.app
+        if request.routing_exception is not None:
+            app.raise_routing_exception(request)
+        rule = request.url_rule
+        if getattr(rule, 'provide_automatic_options', False) and request.method == 'OPTIONS':
+            return app.make_default_options_response()
+        view = app.view_functions[rule.endpoint]
+        if inspect.iscoroutinefunction(view):
+            # A task of its own, cancelled if the client goes away
+            return await exchange.run(view(**request.view_args), context.copy())
+        return await call(view, **request.view_args)
+
+    def _finalize(self, rv):
+        if isinstance(rv, StreamedPage):
+            rv = rv.response()
+        return self.app.finalize_request(rv)
+
+
+class Exchange:
+    """One request's async view, cancelled if its client disconnects first.
+
+    Both methods run on the upstream loop.
+    """
+
+    def __init__(self):
+        self.gone = False
+        self.view = None
+
+    async def run(self, coro, context):
+        self.view = asyncio.get_running_loop().create_task(coro, context=context)
+        if self.gone:
+            self.view.cancel()
+        return await self.view
+
+    def disconnect(self):
+        self.gone = True
+        if self.view is not None:
+            self.view.cancel()
+
+
+async def read_body(receive):
+    """The request body, or None if the client disconnected first"""
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body.extend(message.get('body', b''))
+        if not message.get('more_body'):
+            return bytes(body)
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+def environ_for(scope, body):
+    """The WSGI environ for an ASGI ``http`` scope"""
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = name if name == 'CONTENT_TYPE' else f'HTTP_{name}'
+        if key in environ:
+            separator = '; ' if key == 'HTTP_COOKIE' else ','
+            value = environ[key] + separator + value
+        environ[key] = value
+    return environ
+
+
+def wsgi_response(response, environ):
+    """``(status, headers, body)`` for ASGI; buffered bodies are joined into bytes"""
+    app_iter, status, headers = response.get_wsgi_response(environ)
+    headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    if response.is_streamed:
+        return int(status.split(' ', 1)[0]), headers, app_iter
+    try:
+        body = b''.join(app_iter)
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+    return int(status.split(' ', 1)[0]), headers, body
+
+
+def __getattr__(name):
+    # ``asgi:app`` is built on first use, so importing the adapter boots nothing
+    if name == 'app':
+        global app
+        app = AsgiAdapter(create_app(os.getenv('FLASK_CONFIG', 'production')))
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,190 @@
+"""
+Fingerprinted, precompressed static assets.
+
+``python assets.py`` copies every file under ``static/`` to ``static/dist``
+under a name carrying a hash of its contents. Text files also get a gzip copy
+and, with the optional brotli package, a brotli copy next to it. The
+``original name -> fingerprinted name`` map goes to ``static/dist/manifest.json``.
+Earlier builds are left in place so pages rendered before a deploy still load.
+
+Templates link files with ``asset_url('css/style.css')``. It resolves to the
+fingerprinted URL from the manifest, or to the plain static URL when no build
+has run. A fingerprinted file never changes under its name, so it is served
+in the best encoding the client accepts and cached as immutable.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import threading
+
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli output is optional
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Only text formats are worth precompressing
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+
+# Content-Encoding and file suffix of each precompressed copy, most preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+HASH_LENGTH = 12
+
+
+def fingerprint(name, content):
+    """``css/style.css`` -> ``css/style.<content hash>.css``"""
+    root, ext = os.path.splitext(name)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{ext}'
+
+
+def compress(content):
+    """``(encoding, compressed bytes)`` for each copy we can build"""
+    variants = []
+    if brotli is not None:
+        variants.append(('br', brotli.compress(content, quality=11)))
+    # mtime=0 keeps the output identical across builds
+    variants.append(('gzip', gzip.compress(content, compresslevel=9, mtime=0)))
+    return variants
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def build(static_folder):
+    """Fingerprint and precompress everything under ``static_folder``; returns the manifest"""
+    dist = os.path.join(static_folder, DIST_DIR)
+    suffixes = dict(ENCODINGS)
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        if os.path.samefile(root, static_folder):
+            dirs[:] = [name for name in dirs if name != DIST_DIR]
+        for filename in sorted(files):
+            source = os.path.join(root, filename)
+            name = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                content = f.read()
+            hashed = fingerprint(name, content)
+            target = os.path.join(dist, hashed)
+            _write(target, content)
+            encodings = []
+            if name.endswith(COMPRESSIBLE):
+                for encoding, compressed in compress(content):
+                    if len(compressed) < len(content):
+                        _write(target + suffixes[encoding], compressed)
+                        encodings.append(encoding)
+            manifest[name] = {'path': hashed, 'encodings': encodings}
+    _write(os.path.join(dist, MANIFEST_NAME),
+           json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+class AssetManifest:
+    """The build manifest, reloaded when a new build replaces it"""
+
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def entries(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return {}
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    try:
+                        with open(self.path) as f:
+                            self._entries = json.load(f)
+                    except (OSError, ValueError) as e:
+                        logger.warning(f"Unreadable asset manifest {self.path}: {e}")
+                        self._entries = {}
+                    self._mtime = mtime
+        return self._entries
+
+    def get(self, name):
+        return self.entries().get(name)
+
+
+_manifests = {}
+
+
+def manifest_for(static_folder):
+    manifest = _manifests.get(static_folder)
+    if manifest is None:
+        manifest = _manifests.setdefault(
+            static_folder, AssetManifest(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME))
+        )
+    return manifest
+
+
+def asset_url(filename, **values):
+    """``url_for('static', filename=...)``, pointing at the fingerprinted build when there is one"""
+    entry = manifest_for(current_app.static_folder).get(filename)
+    if entry is not None:
+        filename = f"{DIST_DIR}/{entry['path']}"
+    return url_for('static', filename=filename, **values)
+
+
+def is_fingerprinted(filename):
+    return filename.startswith(DIST_DIR + '/') and filename != f'{DIST_DIR}/{MANIFEST_NAME}'
+
+
+def send_asset(static_folder, filename):
+    """Serve a fingerprinted file in the best encoding the client accepts, as immutable"""
+    dist = os.path.join(static_folder, DIST_DIR)
+    name = filename[len(DIST_DIR) + 1:]
+    path = safe_join(dist, name)
+    chosen, suffix = None, ''
+    if path is not None:
+        for encoding, encoded_suffix in ENCODINGS:
+            if request.accept_encodings[encoding] and os.path.isfile(path + encoded_suffix):
+                chosen, suffix = encoding, encoded_suffix
+                break
+
+    mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    response = send_from_directory(dist, name + suffix, mimetype=mimetype)
+    if chosen is not None:
+        response.headers['Content-Encoding'] = chosen
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fingerprint and precompress static assets')
+    parser.add_argument('static_folder', nargs='?',
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    args = parser.parse_args()
+
+    manifest = build(args.static_folder)
+    for name, entry in sorted(manifest.items()):
+        encodings = ', '.join(entry['encodings']) or 'uncompressed'
+        print(f"{name} -> {DIST_DIR}/{entry['path']} ({encodings})")
+    if brotli is None:
+        print('brotli is not installed, built gzip copies only')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+"""
+Non-blocking upstream client for the async serving path.
+
+Upstream calls run as coroutines on one shared event loop per process, so a
+page's streaming, news and trailer lookups (and those of every other request
+in flight) wait on sockets instead of pinning a thread each. Responses go
+through the same response cache, circuit breakers, request deadline and
+single-flight coalescing as ``http_client``.
+
+Sync code (the catalog refresher, Celery tasks, the sync helpers in app.py)
+drives coroutines with ``run``. Without aiohttp installed, fetches fall back
+to the pooled ``requests`` client on a worker thread.
+"""
+
+import asyncio
+import atexit
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import cache
+import circuit_breaker
+import coalesce
+import deadline
+import http_client
+import metrics
+import upstream_snapshot
+from config import get_config
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - the requests client is used instead
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+class AsyncResponse:
+    """Fully read upstream response with the parts of ``requests.Response`` we use"""
+
+    from_cache = False
+
+    def __init__(self, status_code, content, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = CaseInsensitiveDict(headers or {})
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncUpstreamClient:
+    """aiohttp connection pool per upstream host with shared timeouts and retries"""
+
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=10,
+                 retries=2, backoff_factor=0.3):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self._sessions = {}
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(
+            pool_size=cfg.HTTP_POOL_SIZE,
+            connect_timeout=cfg.HTTP_CONNECT_TIMEOUT,
+            read_timeout=cfg.REQUEST_TIMEOUT,
+            retries=cfg.HTTP_RETRIES,
+            backoff_factor=cfg.HTTP_RETRY_BACKOFF
+        )
+
+    def session_for(self, url):
+        """Return the pooled session for the host of ``url`` (call on the shared loop)"""
+        host = urlsplit(url).netloc
+        session = self._sessions.get(host)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300)
+            session = aiohttp.ClientSession(connector=connector)
+            self._sessions[host] = session
+        return session
+
+    def _backoff(self, attempt):
+        # Full jitter, never sleeping past the request deadline
+        backoff = random.uniform(0, self.backoff_factor * (2 ** attempt))
+        left = deadline.remaining()
+        return backoff if left is None else min(backoff, left)
+
+    async def get(self, url, params=None, headers=None, timeout=None):
+        """GET ``url``, retrying connection errors and 429/5xx like the sync client.
+
+        aiohttp errors are raised as their ``requests`` equivalents so callers
+        handle both clients the same way.
+        """
+        timeout = timeout or self.timeout
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        client_timeout = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+        session = self.session_for(url)
+
+        response = error = None
+        for attempt in range(self.retries + 1):
+            try:
+                async with session.get(url, params=params, headers=headers,
+                                       timeout=client_timeout) as raw:
+                    response = AsyncResponse(raw.status, await raw.read(), raw.headers)
+                error = None
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+            except asyncio.TimeoutError:
+                error = requests.exceptions.Timeout(f"Timed out fetching {url}")
+            except aiohttp.ClientError as e:
+                error = requests.exceptions.ConnectionError(str(e))
+            if attempt == self.retries or deadline.expired():
+                break
+            await asyncio.sleep(self._backoff(attempt))
+
+        if error is not None:
+            raise error
+        return response
+
+    async def warm(self, urls, timeout=2.0):
+        """Open a pooled connection (DNS, TCP and TLS) to the host of each of ``urls``"""
+        async def open_one(url):
+            try:
+                async with self.session_for(url).head(url, allow_redirects=False,
+                                                      timeout=aiohttp.ClientTimeout(total=timeout)):
+                    pass
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                logger.warning(f"Could not open a connection to {url} ahead of traffic: {e}")
+
+        await asyncio.gather(*(open_one(url) for url in urls))
+
+    async def close(self):
+        sessions = list(self._sessions.values())
+        self._sessions = {}
+        for session in sessions:
+            await session.close()
+
+
+_config = get_config()
+client = AsyncUpstreamClient.from_config(_config)
+
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+
+def get_loop():
+    """Return the shared event loop, starting its thread on first use"""
+    global _loop, _loop_thread
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                _loop_thread = threading.Thread(target=loop.run_forever, name='upstream-loop', daemon=True)
+                _loop_thread.start()
+                _loop = loop
+    return _loop
+
+
+def _reset_after_fork():
+    # The loop thread and its sockets do not survive a fork
+    global _loop, _loop_thread, client
+    _loop = _loop_thread = None
+    client = AsyncUpstreamClient.from_config(_config)
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+@atexit.register
+def _close_at_exit():
+    if _loop is not None:
+        asyncio.run_coroutine_threadsafe(client.close(), _loop).result(timeout=1)
+
+
+def configure(cfg):
+    """Rebuild the async client from a configuration class"""
+    global client, _config
+    old_client = client
+    _config = cfg
+    client = AsyncUpstreamClient.from_config(cfg)
+    if _loop is not None:
+        asyncio.run_coroutine_threadsafe(old_client.close(), _loop)
+
+
+def run(coro):
+    """Run ``coro`` on the shared loop and wait for its result.
+
+    The coroutine sees the caller's context variables, so the Flask request
+    and the request deadline carry over.
+    """
+    loop = get_loop()
+    if threading.current_thread() is _loop_thread:
+        raise RuntimeError('async_client.run() called from the upstream loop')
+    context = contextvars.copy_context()
+    result = Future()
+
+    def copy_outcome(task):
+        if task.cancelled():
+            result.cancel()
+        elif task.exception() is not None:
+            result.set_exception(task.exception())
+        else:
+            result.set_result(task.result())
+
+    def start():
+        # Tasks copy the current context, so create it inside the caller's
+        task = context.run(loop.create_task, coro)
+        task.add_done_callback(copy_outcome)
+
+    loop.call_soon_threadsafe(start)
+    return result.result()
+
+
+def warm(urls, timeout=2.0):
+    """Open connections to the upstream hosts before traffic arrives.
+
+    Warms the pool that fetches will use: aiohttp's, or the ``requests``
+    pool when aiohttp is not installed.
+    """
+    if aiohttp is None:
+        http_client.client.warm(urls, timeout)
+    else:
+        run(client.warm(urls, timeout))
+
+
+async def _hedged(attempt, hedge_after):
+    """Await ``attempt``, racing a duplicate if it is still pending after ``hedge_after``.
+
+    The first attempt to return wins and the other is cancelled; an error is
+    raised only when both fail.
+    """
+    left = deadline.remaining()
+    if left is not None and left <= hedge_after:
+        return await attempt()
+    done, pending = await asyncio.wait({asyncio.ensure_future(attempt())}, timeout=hedge_after)
+    if not done:
+        logger.info(f"Upstream call still pending after {hedge_after}s, sending a hedged request")
+        pending.add(asyncio.ensure_future(attempt()))
+
+    error = None
+    while True:
+        for task in done:
+            if task.exception() is None:
+                for loser in pending:
+                    loser.cancel()
+                return task.result()
+            error = task.exception()
+        if not pending:
+            raise error
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+
+async def fetch(url, params=None, headers=None, timeout=None, endpoint=None, hedge_after=None):
+    """Async ``http_client.fetch``: breaker, deadline, hedging, coalescing and replay"""
+    key = http_client.cache_key(endpoint, url, params)
+    snapshot = upstream_snapshot.snapshot
+    if snapshot.mode == 'replay':
+        return snapshot.replay(key)
+    if aiohttp is None:
+        return await asyncio.to_thread(
+            http_client.fetch, url, params, headers, timeout, endpoint, hedge_after
+        )
+    breaker = circuit_breaker.for_endpoint(endpoint)
+
+    async def call():
+        capped = deadline.cap_timeout(timeout or client.timeout)
+        if breaker is None:
+            return await client.get(url, params=params, headers=headers, timeout=capped)
+        return await breaker.call_async(
+            lambda: client.get(url, params=params, headers=headers, timeout=capped),
+            http_client.is_upstream_failure
+        )
+
+    async def attempt():
+        started = time.perf_counter()
+        try:
+            response = await call()
+        except Exception as e:
+            metrics.record_upstream(endpoint, started, error=e)
+            raise
+        metrics.record_upstream(endpoint, started, response=response)
+        return response
+
+    async def flight():
+        if hedge_after is None:
+            response = await attempt()
+        else:
+            response = await _hedged(attempt, hedge_after)
+        snapshot.record(key, response)
+        return response
+
+    return await coalesce.async_flights.do(http_client.flight_key(key, headers), flight)
+
+
+async def get(url, params=None, headers=None, timeout=None, endpoint=None, hedge_after=None):
+    """Async ``http_client.get``, served from the shared response cache when possible"""
+    response_cache = cache.response_cache
+    if endpoint is None or not response_cache.enabled_for(endpoint):
+        return await fetch(url, params=params, headers=headers, timeout=timeout,
+                           endpoint=endpoint, hedge_after=hedge_after)
+
+    last_response = {}
+
+    async def load(validators):
+        response = await fetch(url, params=params,
+                               headers=http_client.conditional_headers(headers, validators),
+                               timeout=timeout, endpoint=endpoint, hedge_after=hedge_after)
+        last_response['response'] = response
+        if response.status_code == 304 and validators:
+            return cache.NOT_MODIFIED
+        if response.status_code == 200:
+            return cache.Validated(response.json(), http_client.response_validators(response))
+        return None
+
+    key = http_client.cache_key(endpoint, url, params)
+    data = await response_cache.get_or_load_async(endpoint, key, load)
+    if data is None:
+        return last_response['response']
+    return http_client.CachedResponse(data)
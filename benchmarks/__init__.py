@@ -0,0 +1 @@
+"""Offline benchmarks: stand-in upstream servers and a load driver (see run.py)."""
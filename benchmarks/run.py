@@ -0,0 +1,252 @@
+"""
+Offline load benchmark for the Cinematic app.
+
+Starts the stand-in upstreams (``benchmarks.stubs``) and the app
+(``benchmarks.serve``) in subprocesses. It then drives each page at a fixed
+concurrency and reports, per page:
+
+- throughput
+- p50/p95/p99 latency
+- the share of non-2xx/3xx responses
+- upstream calls per request, per upstream
+
+    python -m benchmarks.run --requests 200 --concurrency 16 --latency 0.08
+    python -m benchmarks.run --save benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json
+
+Each page runs against whatever cache state the pages before it left, as in
+production. Use ``--pages`` to pick a subset. With the default
+``--refresh-mode thread``, calls made by the catalog refresher and trailer
+prefetcher during a page count towards it; ``--refresh-mode off`` leaves only
+the calls the page itself makes.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks import stubs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUIZ_ANSWERS = {'friday_night': 'puzzle_solving', 'mysterious_map': 'adventure_seeker'}
+
+TITLES = [f'Stub Movie {i}' for i in range(40)]
+QUERIES = ['matrix', 'galaxy', 'murder', 'love', 'heist', 'dragon', 'storm', 'ghost']
+
+# Page name -> path generator (called with the request number)
+PAGES = {
+    'index': lambda n: '/',
+    'recommendations': lambda n: '/recommendations',
+    'new_movies': lambda n: '/new-movies',
+    'search': lambda n: f'/search?q={QUERIES[n % len(QUERIES)]}',
+    'api_movies': lambda n: f'/api/movies/{stubs.GENRES[n % len(stubs.GENRES)]}',
+    'api_search': lambda n: f'/api/search/{QUERIES[n % len(QUERIES)]}',
+    'api_streaming': lambda n: f'/api/streaming/{TITLES[n % len(TITLES)]}',
+    'api_trailer': lambda n: f'/api/trailer/{TITLES[n % len(TITLES)]}'
+}
+
+
+def percentile(sorted_values, share):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(share * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def wait_until_up(url, process, timeout=30):
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f'{url} exited with status {process.returncode}')
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f'{url} did not come up within {timeout}s')
+
+
+class StubCounters:
+    """Reads and resets call counts on every stub"""
+
+    def __init__(self, port):
+        self.urls = {name: f'http://127.0.0.1:{port + offset}'
+                     for offset, name in enumerate(stubs.UPSTREAMS)}
+
+    def reset(self):
+        for url in self.urls.values():
+            requests.post(f'{url}/__reset', timeout=5)
+
+    def totals(self):
+        return {name: sum(requests.get(f'{url}/__stats', timeout=5).json().values())
+                for name, url in self.urls.items()}
+
+
+def drive(base_url, page, total, concurrency):
+    """Send ``total`` requests for ``page`` from ``concurrency`` clients"""
+    local = threading.local()
+    counter = itertools.count()
+
+    def client():
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+            if page == 'recommendations':
+                session.post(f'{base_url}/process_quiz', data=QUIZ_ANSWERS, allow_redirects=False)
+        return session
+
+    def one(_):
+        n = next(counter)
+        started = time.perf_counter()
+        try:
+            # A redirect is a failure too: for recommendations it means the
+            # quiz answers were lost and the page sent the client back to /quiz
+            response = client().get(base_url + PAGES[page](n), timeout=30, allow_redirects=False)
+            # Read streamed pages to the end
+            response.content
+            ok = response.status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        'requests': total,
+        'throughput': total / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'error_rate': sum(not ok for _, ok in results) / total
+    }
+
+
+def run(args):
+    stub_port, app_port = args.stub_port, args.app_port
+    data_dir = tempfile.mkdtemp(prefix='cinematic-bench-')
+    env = dict(os.environ)
+    env.update(stubs.base_urls(stub_port))
+    env.update({
+        'TRAKT_CLIENT_ID': 'bench', 'WATCHMODE_API_KEY': 'bench',
+        'NEWS_API_KEY': 'bench', 'YOUTUBE_API_KEY': 'bench',
+        'WATCHMODE_INDEX_PATH': os.path.join(data_dir, 'watchmode_index.sqlite3'),
+        'TRAILER_STORE_PATH': os.path.join(data_dir, 'trailers.sqlite3'),
+        'CATALOG_SNAPSHOT_PATH': os.path.join(data_dir, 'catalog_snapshot.json'),
+        'CATALOG_REFRESH_MODE': args.refresh_mode,
+        'PYTHONPATH': ROOT
+    })
+    env.pop('REDIS_URL', None)
+
+    stub_command = [sys.executable, '-m', 'benchmarks.stubs', '--port', str(stub_port),
+                    '--latency', str(args.latency), '--jitter', str(args.jitter),
+                    '--error-rate', str(args.error_rate), '--items', str(args.items),
+                    '--padding', str(args.padding)]
+    if args.seed is not None:
+        stub_command += ['--seed', str(args.seed)]
+    app_command = [sys.executable, '-m', 'benchmarks.serve', '--port', str(app_port),
+                   '--workers', str(args.workers)]
+
+    log_path = os.path.join(data_dir, 'app.log')
+    with open(log_path, 'w') as log:
+        stub_process = subprocess.Popen(stub_command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+        app_process = subprocess.Popen(app_command, cwd=ROOT, env=env, stdout=log, stderr=log)
+        try:
+            wait_until_up(f'http://127.0.0.1:{stub_port}/__stats', stub_process)
+            base_url = f'http://127.0.0.1:{app_port}'
+            wait_until_up(base_url + '/', app_process)
+            counters = StubCounters(stub_port)
+
+            results = {}
+            for page in args.pages:
+                if args.warmup:
+                    drive(base_url, page, args.warmup, args.concurrency)
+                counters.reset()
+                result = drive(base_url, page, args.requests, args.concurrency)
+                result['upstream_calls'] = {
+                    name: count / args.requests for name, count in counters.totals().items() if count
+                }
+                results[page] = result
+                print(format_row(page, result), flush=True)
+        except RuntimeError:
+            print(f'App log: {log_path}', file=sys.stderr)
+            raise
+        finally:
+            app_process.terminate()
+            stub_process.terminate()
+            app_process.wait(timeout=10)
+            stub_process.wait(timeout=10)
+    return {
+        'settings': {name: getattr(args, name) for name in (
+            'requests', 'concurrency', 'warmup', 'workers', 'refresh_mode',
+            'latency', 'jitter', 'error_rate', 'items', 'padding')},
+        'pages': results
+    }
+
+
+def format_row(page, result):
+    calls = ' '.join(f'{name}={count:.2f}' for name, count in sorted(result['upstream_calls'].items()))
+    return (f"{page:<16} {result['throughput']:8.1f} req/s  p50 {result['p50_ms']:7.1f}ms  "
+            f"p95 {result['p95_ms']:7.1f}ms  p99 {result['p99_ms']:7.1f}ms  "
+            f"errors {result['error_rate']:5.1%}  upstream/req {calls or '-'}")
+
+
+def compare(results, baseline):
+    """Print the change against a saved baseline for every page both ran"""
+    print('\nChange vs baseline (negative latency is better):')
+    for page, result in results['pages'].items():
+        before = baseline['pages'].get(page)
+        if before is None:
+            continue
+        changes = []
+        for metric in ('throughput', 'p50_ms', 'p95_ms', 'p99_ms'):
+            if before[metric]:
+                changes.append(f'{metric} {(result[metric] - before[metric]) / before[metric]:+.1%}')
+        before_calls = sum(before['upstream_calls'].values())
+        after_calls = sum(result['upstream_calls'].values())
+        changes.append(f'upstream/req {before_calls:.2f} -> {after_calls:.2f}')
+        print(f'{page:<16} ' + '  '.join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the app against stand-in upstreams')
+    parser.add_argument('--pages', nargs='+', choices=list(PAGES), default=list(PAGES))
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per page')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per page first')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='gunicorn workers; 0 uses the werkzeug threaded server')
+    parser.add_argument('--refresh-mode', default='thread', choices=('thread', 'off'),
+                        help='CATALOG_REFRESH_MODE for the app')
+    parser.add_argument('--stub-port', type=int, default=9100)
+    parser.add_argument('--app-port', type=int, default=5100)
+    parser.add_argument('--save', metavar='PATH', help='Write the results as a baseline')
+    parser.add_argument('--compare', metavar='PATH', help='Compare against a saved baseline')
+    stubs.add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Saved baseline to {args.save}')
+
+
+if __name__ == '__main__':
+    main()
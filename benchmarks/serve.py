@@ -0,0 +1,56 @@
+"""
+Serve app.py for a benchmark run.
+
+Started by ``benchmarks.run`` with the stub base URLs and API keys in the
+environment. The rate limiter is relaxed so the load driver measures the app
+rather than its 429s. Uses gunicorn when installed (``--workers``), otherwise
+werkzeug's threaded server.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import get_config  # noqa: E402
+
+
+class BenchmarkConfig(get_config()):
+    RATE_LIMIT_MAX_REQUESTS = 10 ** 9
+    RATE_LIMIT_MAX_KEYS = 16
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve app.py for benchmarks')
+    parser.add_argument('--port', type=int, default=5100)
+    parser.add_argument('--workers', type=int, default=0,
+                        help='gunicorn workers; 0 uses the werkzeug threaded server')
+    args = parser.parse_args()
+
+    import app as appmod
+    # gunicorn builds the app once and forks; each worker then warms itself
+    app = appmod.create_app(BenchmarkConfig, preload=bool(args.workers))
+
+    if args.workers:
+        from gunicorn.app.base import BaseApplication
+
+        class Server(BaseApplication):
+            def load_config(self):
+                self.cfg.set('bind', f'127.0.0.1:{args.port}')
+                self.cfg.set('workers', args.workers)
+                self.cfg.set('threads', 8)
+                self.cfg.set('loglevel', 'warning')
+                self.cfg.set('post_fork', lambda server, worker: appmod.start_worker(app))
+
+            def load(self):
+                return app
+
+        Server().run()
+    else:
+        from werkzeug.serving import make_server
+        make_server('127.0.0.1', args.port, app, threaded=True).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
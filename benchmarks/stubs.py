@@ -0,0 +1,261 @@
+"""
+Stand-in Trakt, WatchMode, NewsAPI and YouTube servers for offline benchmarks.
+
+Each upstream listens on its own port (``--port`` and the next three) and
+answers the endpoints app.py calls with generated payloads in the real
+shape. Latency, error rate and payload size are set per run:
+
+    python -m benchmarks.stubs --port 9100 --latency 0.08 --jitter 0.04 --error-rate 0.01
+
+Trakt and WatchMode send an ETag and answer a matching If-None-Match with
+304, as the real APIs do. ``GET /__stats`` on any stub returns its call
+counts per path and
+``POST /__reset`` clears them; the load driver uses both to count upstream
+calls per page.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+UPSTREAMS = ('trakt', 'watchmode', 'newsapi', 'youtube')
+
+# Stubs that send ETags and honour conditional requests
+CONDITIONAL_UPSTREAMS = ('trakt', 'watchmode')
+
+GENRES = ('action', 'adventure', 'comedy', 'drama', 'fantasy', 'horror', 'mystery',
+          'romance', 'science-fiction', 'thriller', 'documentary', 'crime')
+
+SERVICES = ('Netflix', 'Hulu', 'Amazon Prime Video', 'Disney+', 'HBO Max', 'Peacock')
+
+
+class StubProfile:
+    """How a stub behaves: added latency, failure rate and payload size"""
+
+    def __init__(self, latency=0.05, jitter=0.02, error_rate=0.0, items=100,
+                 padding=0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.items = items
+        self.padding = padding  # Extra overview bytes per movie
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def delay(self):
+        with self.lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def fails(self):
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+
+def stub_movie(index, padding=0):
+    return {
+        'title': f'Stub Movie {index}',
+        'year': 1980 + index % 45,
+        'ids': {'trakt': 1000 + index, 'imdb': f'tt{9000000 + index}', 'tmdb': 5000 + index,
+                'slug': f'stub-movie-{index}'},
+        'genres': [GENRES[index % len(GENRES)], GENRES[(index * 7 + 3) % len(GENRES)]],
+        'rating': round(5 + (index * 37 % 50) / 10, 1),
+        'overview': 'x' * padding
+    }
+
+
+def trakt_payload(path, query, profile):
+    last = path.rsplit('/', 1)[-1]
+    if path.startswith('/movies/') and last.isdigit():
+        # Stub movies have Trakt ids from 1000 up
+        index = int(last) - 1000
+        return stub_movie(index, profile.padding) if index >= 0 else None
+    limit = min(int(query.get('limit', [profile.items])[0]), profile.items)
+    page = int(query.get('page', ['1'])[0])
+    offset = (page - 1) * limit
+    movies = [stub_movie(offset + i, profile.padding) for i in range(limit)]
+    if 'genres' in query:
+        # Like Trakt, page through only the movies in one of the genres
+        wanted = set(query['genres'][0].split(','))
+        matching = (stub_movie(i, profile.padding) for i in range((offset + limit) * len(GENRES)))
+        matching = [movie for movie in matching if wanted & set(movie['genres'])]
+        movies = matching[offset:offset + limit]
+    if path.endswith('/movies/trending'):
+        return [{'watchers': 500 - i, 'movie': movie} for i, movie in enumerate(movies)]
+    if path.endswith('/movies/releases'):
+        return [{'release_date': f'2024-{1 + i % 12:02d}-01', 'country': 'us', 'movie': movie}
+                for i, movie in enumerate(movies)]
+    if path.endswith('/movies/popular'):
+        return movies
+    if path.endswith('/search/movie'):
+        term = query.get('query', [''])[0]
+        return [{'score': 100 - i, 'movie': dict(movie, title=f'{term} {movie["title"]}')}
+                for i, movie in enumerate(movies[:20])]
+    return None
+
+
+def watchmode_payload(path, query, profile):
+    if path.endswith('/search'):
+        seed = sum(map(ord, query.get('searchValue', [''])[0]))
+        return {'title_results': [{'id': 100000 + seed, 'year': 2000 + seed % 25,
+                                   'imdb_id': f'tt{seed}', 'tmdb_id': seed}]}
+    if path.endswith('/sources'):
+        return [{'name': name, 'type': 'sub' if i % 2 == 0 else 'rent'}
+                for i, name in enumerate(SERVICES)]
+    return None
+
+
+def newsapi_payload(path, query, profile):
+    if not path.endswith('/everything'):
+        return None
+    term = query.get('q', [''])[0].strip('"')
+    size = int(query.get('pageSize', ['20'])[0])
+    return {'status': 'ok', 'articles': [
+        {'title': f'{term} film review {i}', 'description': f'A look at the movie {term}',
+         'url': f'https://news.example.com/{i}', 'publishedAt': f'2024-05-{1 + i % 28:02d}T00:00:00Z',
+         'source': {'name': 'Stub News'}}
+        for i in range(size)
+    ]}
+
+
+def youtube_payload(path, query, profile):
+    if not path.endswith('/search'):
+        return None
+    seed = sum(map(ord, query.get('q', [''])[0]))
+    return {'items': [{'id': {'kind': 'youtube#video', 'videoId': f'stub{seed:07d}'}}]}
+
+
+PAYLOADS = {
+    'trakt': trakt_payload,
+    'watchmode': watchmode_payload,
+    'newsapi': newsapi_payload,
+    'youtube': youtube_payload
+}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, name, port, profile):
+        super().__init__(('127.0.0.1', port), StubHandler)
+        self.name = name
+        self.profile = profile
+        self.calls = {}
+        self.calls_lock = threading.Lock()
+
+    def count(self, path):
+        with self.calls_lock:
+            self.calls[path] = self.calls.get(path, 0) + 1
+
+    def stats(self):
+        with self.calls_lock:
+            return dict(self.calls)
+
+    def reset(self):
+        with self.calls_lock:
+            self.calls = {}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, etag=False):
+        body = json.dumps(payload).encode('utf-8')
+        tag = f'"{hashlib.sha1(body).hexdigest()}"' if etag else None
+        if tag is not None and self.headers.get('If-None-Match') == tag:
+            status, body = 304, b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if tag is not None:
+            self.send_header('ETag', tag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path == '/__reset':
+            self.server.reset()
+            self.send_json(200, {'reset': True})
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path == '/__stats':
+            self.send_json(200, self.server.stats())
+            return
+
+        server = self.server
+        server.count(parts.path)
+        time.sleep(server.profile.delay())
+        if server.profile.fails():
+            self.send_json(503, {'error': 'stub failure'})
+            return
+        payload = PAYLOADS[server.name](parts.path, parse_qs(parts.query), server.profile)
+        if payload is None:
+            self.send_json(404, {'error': 'not found'})
+        else:
+            self.send_json(200, payload, etag=server.name in CONDITIONAL_UPSTREAMS)
+
+
+def start(port, profile):
+    """Start one stub per upstream on ``port`` and the ports after it.
+
+    Returns ``{name: server}``; every server runs on a daemon thread.
+    """
+    servers = {}
+    for offset, name in enumerate(UPSTREAMS):
+        server = StubServer(name, port + offset, profile)
+        threading.Thread(target=server.serve_forever, name=f'stub-{name}', daemon=True).start()
+        servers[name] = server
+    return servers
+
+
+def base_urls(port):
+    """Environment variables pointing app.py at stubs started on ``port``"""
+    return {
+        'TRAKT_API_URL': f'http://127.0.0.1:{port}',
+        'WATCHMODE_API_URL': f'http://127.0.0.1:{port + 1}/v1',
+        'NEWS_API_URL': f'http://127.0.0.1:{port + 2}/v2',
+        'YOUTUBE_API_URL': f'http://127.0.0.1:{port + 3}/youtube/v3'
+    }
+
+
+def add_profile_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds added to every upstream call')
+    parser.add_argument('--jitter', type=float, default=0.02, help='Uniform +/- seconds around --latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of calls answered with a 503')
+    parser.add_argument('--items', type=int, default=100, help='Movies per Trakt list page')
+    parser.add_argument('--padding', type=int, default=0, help='Extra overview bytes per movie')
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def profile_from_args(args):
+    return StubProfile(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                       items=args.items, padding=args.padding, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run stand-in upstream API servers')
+    parser.add_argument('--port', type=int, default=9100, help='First of four consecutive ports')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    start(args.port, profile_from_args(args))
+    for name, url in base_urls(args.port).items():
+        print(f'{name}={url}', flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,464 @@
+"""
+Two-tier TTL cache for upstream responses.
+
+A bounded in-process LRU sits in front of an optional shared Redis tier so all
+gunicorn workers reuse the same entries. Entries past their TTL are still
+served for a stale window while a background refresh revalidates them.
+With Redis configured, a miss takes a short cluster-wide lock so only one
+worker loads a key while the others wait for its result to land in Redis.
+``get_or_load_async`` is the same lookup for coroutine loaders on the async
+serving path, with Redis calls moved off the event loop.
+
+Entries can carry the upstream's validators (ETag / Last-Modified). Loaders
+receive them when reloading an expired entry, so they can send a conditional
+request and return ``NOT_MODIFIED`` to renew the held value for the cost of
+the response headers.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import deadline
+from config import get_config
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is optional for local installs
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Returned by a loader whose conditional request found the held value unchanged
+NOT_MODIFIED = object()
+
+
+class Validated:
+    """A loaded value plus the upstream validators to revalidate it with later"""
+
+    __slots__ = ('value', 'validators')
+
+    def __init__(self, value, validators=None):
+        self.value = value
+        self.validators = validators or {}
+
+
+def _new_entry(value, ttl, stale_ttl, validators=None):
+    entry = {
+        'value': value,
+        'stored_at': time.time(),
+        'ttl': ttl,
+        'stale_ttl': stale_ttl
+    }
+    if validators:
+        entry['validators'] = validators
+    return entry
+
+
+def _validators(entry):
+    return entry.get('validators', {}) if entry is not None else {}
+
+
+def _is_fresh(entry, now):
+    return now < entry['stored_at'] + entry['ttl']
+
+
+def _is_usable(entry, now):
+    return now < entry['stored_at'] + entry['ttl'] + entry['stale_ttl']
+
+
+class LRUCache:
+    """Thread-safe bounded LRU mapping of cache keys to entries"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisTier:
+    """Shared cache tier; backs off for a while after a Redis error"""
+
+    # Delete the lock only if we still hold it
+    RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+    def __init__(self, url, prefix='cinematic:cache:', retry_after=30):
+        self.client = redis.Redis.from_url(
+            url,
+            socket_timeout=0.25,
+            socket_connect_timeout=0.25
+        )
+        self.prefix = prefix
+        self.retry_after = retry_after
+        self._down_until = 0
+
+    @property
+    def available(self):
+        return time.time() >= self._down_until
+
+    def _failed(self, e):
+        logger.warning(f"Redis cache tier unavailable: {e}")
+        self._down_until = time.time() + self.retry_after
+
+    def get(self, key):
+        if not self.available:
+            return None
+        try:
+            raw = self.client.get(self.prefix + key)
+        except redis.RedisError as e:
+            self._failed(e)
+            return None
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def set(self, key, entry):
+        if not self.available:
+            return
+        expire = max(1, int(entry['ttl'] + entry['stale_ttl']))
+        try:
+            self.client.set(self.prefix + key, json.dumps(entry), ex=expire)
+        except (redis.RedisError, TypeError, ValueError) as e:
+            self._failed(e)
+
+    def acquire(self, key, seconds):
+        """Take the load lock for ``key``.
+
+        Returns a token to pass to ``release``, or None when another worker
+        holds the lock. If Redis is unavailable the caller proceeds unlocked.
+        """
+        token = uuid.uuid4().hex
+        if not self.available:
+            return token
+        try:
+            acquired = self.client.set(
+                self.prefix + 'lock:' + key, token, nx=True, px=int(seconds * 1000)
+            )
+        except redis.RedisError as e:
+            self._failed(e)
+            return token
+        return token if acquired else None
+
+    def release(self, key, token):
+        if not self.available:
+            return
+        try:
+            self.client.eval(self.RELEASE_SCRIPT, 1, self.prefix + 'lock:' + key, token)
+        except redis.RedisError as e:
+            self._failed(e)
+
+
+class TieredCache:
+    """LRU + Redis cache with per-endpoint TTLs and stale-while-revalidate"""
+
+    def __init__(self, ttls, maxsize=1024, stale_factor=1.0, redis_url=None,
+                 lock_seconds=0, lock_poll=0.05):
+        self.ttls = dict(ttls)
+        self.stale_factor = stale_factor
+        self.lock_seconds = lock_seconds
+        self.lock_poll = lock_poll
+        self.local = LRUCache(maxsize)
+        self.shared = None
+        if redis_url:
+            if redis is None:
+                logger.warning("REDIS_URL is set but redis is not installed, using in-process cache only")
+            else:
+                self.shared = RedisTier(redis_url)
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cache-revalidate')
+        self._async_refreshes = set()
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(
+            cfg.CACHE_TTLS,
+            maxsize=cfg.CACHE_MAX_ENTRIES,
+            stale_factor=cfg.CACHE_STALE_FACTOR,
+            redis_url=cfg.REDIS_URL,
+            lock_seconds=cfg.CACHE_LOCK_SECONDS
+        )
+
+    def enabled_for(self, endpoint):
+        return self.ttls.get(endpoint, 0) > 0
+
+    def _count(self, endpoint, counter):
+        with self._stats_lock:
+            counters = self._stats.setdefault(
+                endpoint,
+                {'hits': 0, 'stale_hits': 0, 'misses': 0, 'redis_hits': 0, 'lock_waits': 0,
+                 'not_modified': 0}
+            )
+            counters[counter] += 1
+
+    def stats(self):
+        """Return hit/miss counters per endpoint"""
+        with self._stats_lock:
+            per_endpoint = {name: dict(counters) for name, counters in self._stats.items()}
+        return {
+            'entries': len(self.local),
+            'redis': self.shared is not None,
+            'endpoints': per_endpoint
+        }
+
+    def _lookup(self, endpoint, key):
+        entry = self.local.get(key)
+        if entry is None and self.shared is not None:
+            entry = self.shared.get(key)
+            if entry is not None:
+                self._count(endpoint, 'redis_hits')
+                self.local.set(key, entry)
+        return entry
+
+    def set(self, endpoint, key, value, validators=None):
+        ttl = self.ttls.get(endpoint, 0)
+        if ttl <= 0:
+            return
+        entry = _new_entry(value, ttl, ttl * self.stale_factor, validators)
+        self.local.set(key, entry)
+        if self.shared is not None:
+            self.shared.set(key, entry)
+
+    def _store(self, endpoint, key, value, held=None):
+        """Cache a loader's result and return the value to serve"""
+        if value is NOT_MODIFIED:
+            if held is None:
+                return None
+            # Unchanged upstream: the held value starts a new TTL
+            self._count(endpoint, 'not_modified')
+            self.set(endpoint, key, held['value'], _validators(held))
+            return held['value']
+        if isinstance(value, Validated):
+            if value.value is not None:
+                self.set(endpoint, key, value.value, value.validators)
+            return value.value
+        if value is not None:
+            self.set(endpoint, key, value)
+        return value
+
+    def _wait_for_peer(self, endpoint, key):
+        """Poll Redis for a fresh entry another worker is loading"""
+        self._count(endpoint, 'lock_waits')
+        wait_until = time.monotonic() + self.lock_seconds
+        left = deadline.remaining()
+        if left is not None:
+            wait_until = min(wait_until, time.monotonic() + left)
+        while time.monotonic() < wait_until:
+            time.sleep(self.lock_poll)
+            entry = self.shared.get(key)
+            if entry is not None and _is_fresh(entry, time.time()):
+                self.local.set(key, entry)
+                return entry
+        return None
+
+    def _load(self, endpoint, key, loader, wait=True, held=None):
+        """Call ``loader`` and cache its value, one worker at a time when Redis is shared.
+
+        ``loader`` gets the validators of ``held``, the expired entry being
+        reloaded. If another worker holds the load lock, wait for its entry
+        instead (or return None right away when ``wait`` is false). Should it
+        not land in time, load here anyway.
+        """
+        validators = _validators(held)
+        if self.shared is None or not self.lock_seconds:
+            return self._store(endpoint, key, loader(validators), held)
+        token = self.shared.acquire(key, self.lock_seconds)
+        if token is None:
+            if not wait:
+                return None
+            entry = self._wait_for_peer(endpoint, key)
+            if entry is not None:
+                return entry['value']
+            return self._store(endpoint, key, loader(validators), held)
+        try:
+            return self._store(endpoint, key, loader(validators), held)
+        finally:
+            self.shared.release(key, token)
+
+    def _revalidate(self, endpoint, key, loader, held):
+        try:
+            # Another worker already revalidating this key is good enough
+            self._load(endpoint, key, loader, wait=False, held=held)
+        except Exception as e:
+            logger.warning(f"Background revalidation failed for {endpoint}: {e}")
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(key)
+
+    def _schedule_revalidation(self, endpoint, key, loader, held):
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        self._refresher.submit(self._revalidate, endpoint, key, loader, held)
+
+    def get_or_load(self, endpoint, key, loader):
+        """Return the cached value for ``key``, calling ``loader`` on a miss.
+
+        ``loader`` is called with the validators stored with the expired
+        entry (an empty dict if there are none). It returns the value to
+        cache, a ``Validated`` value to cache with new validators,
+        ``NOT_MODIFIED`` to keep the held value, or None when the result
+        should not be cached (None is then returned to the caller). When an
+        expired entry is still held and the loader fails, the expired value
+        is served.
+        """
+        now = time.time()
+        entry = self._lookup(endpoint, key)
+        if entry is not None:
+            if _is_fresh(entry, now):
+                self._count(endpoint, 'hits')
+                return entry['value']
+            if _is_usable(entry, now):
+                self._count(endpoint, 'stale_hits')
+                self._schedule_revalidation(endpoint, key, loader, entry)
+                return entry['value']
+        self._count(endpoint, 'misses')
+        if entry is None:
+            return self._load(endpoint, key, loader)
+
+        # An expired copy is still better than nothing if the upstream fails
+        try:
+            value = self._load(endpoint, key, loader, held=entry)
+        except Exception as e:
+            logger.warning(f"Serving expired {endpoint} entry after upstream error: {e}")
+            return entry['value']
+        return entry['value'] if value is None else value
+
+    async def _shared_call(self, fn, *args):
+        # Redis is blocking, keep it off the event loop
+        if self.shared is None:
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    async def _wait_for_peer_async(self, endpoint, key):
+        self._count(endpoint, 'lock_waits')
+        wait_until = time.monotonic() + self.lock_seconds
+        left = deadline.remaining()
+        if left is not None:
+            wait_until = min(wait_until, time.monotonic() + left)
+        while time.monotonic() < wait_until:
+            await asyncio.sleep(self.lock_poll)
+            entry = await asyncio.to_thread(self.shared.get, key)
+            if entry is not None and _is_fresh(entry, time.time()):
+                self.local.set(key, entry)
+                return entry
+        return None
+
+    async def _load_async(self, endpoint, key, loader, wait=True, held=None):
+        """``_load`` for a coroutine function ``loader``"""
+        validators = _validators(held)
+        if self.shared is None or not self.lock_seconds:
+            return await self._shared_call(self._store, endpoint, key, await loader(validators), held)
+        token = await asyncio.to_thread(self.shared.acquire, key, self.lock_seconds)
+        if token is None:
+            if not wait:
+                return None
+            entry = await self._wait_for_peer_async(endpoint, key)
+            if entry is not None:
+                return entry['value']
+            return await self._shared_call(self._store, endpoint, key, await loader(validators), held)
+        try:
+            return await self._shared_call(self._store, endpoint, key, await loader(validators), held)
+        finally:
+            await asyncio.to_thread(self.shared.release, key, token)
+
+    async def _revalidate_async(self, endpoint, key, loader, held):
+        try:
+            await self._load_async(endpoint, key, loader, wait=False, held=held)
+        except Exception as e:
+            logger.warning(f"Background revalidation failed for {endpoint}: {e}")
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(key)
+
+    def _schedule_revalidation_async(self, endpoint, key, loader, held):
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        # Like the executor on the sync path, the refresh outlives the request
+        # and must not inherit its nearly spent deadline
+        task = asyncio.get_running_loop().create_task(
+            self._revalidate_async(endpoint, key, loader, held), context=deadline.detached_context()
+        )
+        self._async_refreshes.add(task)
+        task.add_done_callback(self._async_refreshes.discard)
+
+    async def get_or_load_async(self, endpoint, key, loader):
+        """``get_or_load`` for a coroutine function ``loader``"""
+        now = time.time()
+        entry = self.local.get(key)
+        if entry is None:
+            entry = await self._shared_call(self._lookup, endpoint, key)
+        if entry is not None:
+            if _is_fresh(entry, now):
+                self._count(endpoint, 'hits')
+                return entry['value']
+            if _is_usable(entry, now):
+                self._count(endpoint, 'stale_hits')
+                self._schedule_revalidation_async(endpoint, key, loader, entry)
+                return entry['value']
+        self._count(endpoint, 'misses')
+        if entry is None:
+            return await self._load_async(endpoint, key, loader)
+
+        # An expired copy is still better than nothing if the upstream fails
+        try:
+            value = await self._load_async(endpoint, key, loader, held=entry)
+        except Exception as e:
+            logger.warning(f"Serving expired {endpoint} entry after upstream error: {e}")
+            return entry['value']
+        return entry['value'] if value is None else value
+
+    def clear(self):
+        self.local.clear()
+
+
+response_cache = TieredCache.from_config(get_config())
+
+
+def configure(cfg):
+    """Rebuild the shared response cache from a configuration class"""
+    global response_cache
+    response_cache = TieredCache.from_config(cfg)
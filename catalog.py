@@ -0,0 +1,225 @@
+"""
+Precomputed Trakt catalog snapshots.
+
+A refresher (a background thread, or the celery beat task in tasks.py) pulls
+the Trakt trending/popular/releases lists off the request path, enriches them
+and publishes an immutable, versioned snapshot. Routes only read the latest
+published snapshot.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+from config import get_config
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is optional for local installs
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_SNAPSHOT_KEY = 'cinematic:catalog:snapshot'
+REDIS_VERSION_KEY = 'cinematic:catalog:version'
+
+
+def movie_key(movie):
+    """Stable key for a movie: its Trakt id, or title and year"""
+    ids = movie.get('ids') or {}
+    if ids.get('trakt'):
+        return f"trakt:{ids['trakt']}"
+    return f"title:{movie.get('title', '').lower()}:{movie.get('year')}"
+
+
+class CatalogSnapshot:
+    """Immutable, versioned Trakt lists plus per-movie enrichment"""
+
+    __slots__ = ('version', 'created_at', '_lists', '_enrichment', '_by_key')
+
+    def __init__(self, version, created_at, lists, enrichment):
+        self.version = version
+        self.created_at = created_at
+        self._lists = {name: tuple(movies) for name, movies in lists.items() if movies}
+        self._enrichment = dict(enrichment)
+        self._by_key = {}
+        for movies in self._lists.values():
+            for movie in movies:
+                self._by_key.setdefault(movie_key(movie), movie)
+
+    @classmethod
+    def build(cls, lists, enrichment):
+        return cls(int(time.time() * 1000), time.time(), lists, enrichment)
+
+    @property
+    def list_names(self):
+        return list(self._lists)
+
+    def movies(self, name):
+        """Return copies of the movies in list ``name``, or None if missing"""
+        movies = self._lists.get(name)
+        if not movies:
+            return None
+        return [dict(movie) for movie in movies]
+
+    def movie_for_key(self, key):
+        """Return a copy of the movie with ``movie_key`` ``key`` (e.g. 'trakt:123'), or None"""
+        movie = self._by_key.get(key)
+        return dict(movie) if movie is not None else None
+
+    def enrichment_for(self, movie):
+        """Return the precomputed streaming/news dict for ``movie``"""
+        return self._enrichment.get(movie_key(movie))
+
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'created_at': self.created_at,
+            'lists': {name: list(movies) for name, movies in self._lists.items()},
+            'enrichment': self._enrichment
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['version'], data['created_at'], data['lists'], data['enrichment'])
+
+
+class SnapshotStore:
+    """Publishes snapshots to disk (and Redis when configured) and serves the latest"""
+
+    def __init__(self, path, redis_url=None, check_interval=5):
+        self.path = path
+        self.check_interval = check_interval
+        self.redis = None
+        if redis_url and redis is not None:
+            self.redis = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._snapshot = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def publish(self, snapshot):
+        """Atomically make ``snapshot`` the latest version"""
+        payload = json.dumps(snapshot.to_dict())
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, self.path)
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.set(REDIS_SNAPSHOT_KEY, payload)
+                pipe.set(REDIS_VERSION_KEY, snapshot.version)
+                pipe.execute()
+            except redis.RedisError as e:
+                logger.warning(f"Failed to publish catalog snapshot to Redis: {e}")
+        with self._lock:
+            self._snapshot = snapshot
+            self._checked_at = time.time()
+        logger.info(f"Published catalog snapshot {snapshot.version}")
+
+    def _load_from_redis(self, known_version):
+        version = self.redis.get(REDIS_VERSION_KEY)
+        if version is None or int(version) == known_version:
+            return None
+        payload = self.redis.get(REDIS_SNAPSHOT_KEY)
+        return CatalogSnapshot.from_dict(json.loads(payload)) if payload else None
+
+    def _load_from_disk(self, known_version):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, encoding='utf-8') as f:
+            snapshot = CatalogSnapshot.from_dict(json.load(f))
+        return snapshot if snapshot.version != known_version else None
+
+    def _reload(self):
+        known_version = self._snapshot.version if self._snapshot else None
+        try:
+            if self.redis is not None:
+                try:
+                    return self._load_from_redis(known_version)
+                except redis.RedisError as e:
+                    logger.warning(f"Failed to read catalog snapshot from Redis: {e}")
+            return self._load_from_disk(known_version)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Failed to load catalog snapshot: {e}")
+            return None
+
+    def current(self):
+        """Return the latest published snapshot, or None before the first one"""
+        now = time.time()
+        if now - self._checked_at < self.check_interval:
+            return self._snapshot
+        with self._lock:
+            if now - self._checked_at >= self.check_interval:
+                self._checked_at = now
+                snapshot = self._reload()
+                if snapshot is not None and (
+                        self._snapshot is None or snapshot.version > self._snapshot.version):
+                    self._snapshot = snapshot
+        return self._snapshot
+
+    async def current_async(self):
+        """``current`` for the event loop: reloads from disk or Redis run in a worker thread"""
+        if time.time() - self._checked_at < self.check_interval:
+            return self._snapshot
+        return await asyncio.to_thread(self.current)
+
+
+class CatalogRefresher:
+    """Periodically rebuilds and publishes catalog snapshots.
+
+    ``on_publish(snapshot)`` runs after each publish, for follow-up work such
+    as prefetching trailers for the new lists.
+    """
+
+    def __init__(self, store, builder, interval=300, on_publish=None):
+        self.store = store
+        self.builder = builder
+        self.interval = interval
+        self.on_publish = on_publish
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh_once(self):
+        """Build and publish one snapshot; returns its version or None"""
+        try:
+            snapshot = self.builder()
+        except Exception as e:
+            logger.error(f"Catalog refresh failed: {e}")
+            return None
+        if snapshot is None:
+            logger.warning("Catalog refresh produced no data, keeping previous snapshot")
+            return None
+        self.store.publish(snapshot)
+        if self.on_publish is not None:
+            try:
+                self.on_publish(snapshot)
+            except Exception as e:
+                logger.error(f"Catalog post-publish hook failed: {e}")
+        return snapshot.version
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh_once()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='catalog-refresher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def create_store(cfg=None):
+    cfg = cfg or get_config()
+    return SnapshotStore(cfg.CATALOG_SNAPSHOT_PATH, redis_url=cfg.REDIS_URL)
@@ -0,0 +1,192 @@
+"""
+Per-upstream circuit breakers.
+
+Each upstream (Trakt, WatchMode, NewsAPI, YouTube) gets a breaker that opens
+once the failure rate over a sliding window crosses a threshold. While open,
+calls fail immediately with ``CircuitOpenError`` so callers fall back to
+cached or mock data instead of pinning a worker on timeouts. After a cool-off
+the breaker goes half-open and lets a few probe requests decide whether to
+close again.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+import requests
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+UPSTREAMS = ('trakt', 'watchmode', 'newsapi', 'youtube')
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker driven by the failure rate of recent calls"""
+
+    def __init__(self, name, failure_rate=0.5, minimum_calls=5, window_seconds=30,
+                 open_seconds=30, half_open_probes=1, probe_timeout=15):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.minimum_calls = minimum_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.probe_timeout = probe_timeout
+        self.state = CLOSED
+        self._calls = deque()  # (timestamp, failed)
+        self._failures = 0
+        self._opened_at = 0
+        self._probes = 0
+        self._probe_deadline = 0
+        self._generation = 0  # Bumped on every state change
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, name, cfg):
+        return cls(
+            name,
+            failure_rate=cfg.BREAKER_FAILURE_RATE,
+            minimum_calls=cfg.BREAKER_MINIMUM_CALLS,
+            window_seconds=cfg.BREAKER_WINDOW_SECONDS,
+            open_seconds=cfg.BREAKER_OPEN_SECONDS,
+            half_open_probes=cfg.BREAKER_HALF_OPEN_PROBES,
+            probe_timeout=cfg.BREAKER_PROBE_TIMEOUT
+        )
+
+    def _transition(self, state):
+        logger.warning(f"Circuit breaker {self.name}: {self.state} -> {state}")
+        self.state = state
+        self._calls.clear()
+        self._failures = 0
+        self._probes = 0
+        self._generation += 1
+        if state == OPEN:
+            self._opened_at = time.time()
+
+    def _prune(self, now):
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            _, failed = self._calls.popleft()
+            self._failures -= failed
+
+    def _admit(self):
+        """Admit a call; returns the state generation it was admitted in, or None"""
+        with self._lock:
+            now = time.time()
+            if self.state == HALF_OPEN and self._probes and now >= self._probe_deadline:
+                logger.warning(f"Circuit breaker {self.name}: half-open probe timed out")
+                self._transition(OPEN)
+            if self.state == OPEN:
+                if now - self._opened_at < self.open_seconds:
+                    return None
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    return None
+                self._probes += 1
+                self._probe_deadline = now + self.probe_timeout
+            return self._generation
+
+    def allow(self):
+        """Return True if a call may go to the upstream now"""
+        return self._admit() is not None
+
+    def record(self, failed, generation=None):
+        """Record the outcome of an allowed call.
+
+        ``generation`` is what ``_admit`` returned for the call; outcomes of
+        calls admitted before the breaker last changed state are dropped.
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if self.state == HALF_OPEN:
+                self._transition(OPEN if failed else CLOSED)
+                return
+            if self.state == OPEN:
+                return
+            now = time.time()
+            self._calls.append((now, failed))
+            self._failures += failed
+            self._prune(now)
+            if (len(self._calls) >= self.minimum_calls
+                    and self._failures / len(self._calls) >= self.failure_rate):
+                self._transition(OPEN)
+
+    def _release(self, generation):
+        """Free the probe slot of a call that ended without an outcome, e.g. cancelled"""
+        with self._lock:
+            if generation == self._generation and self.state == HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def _settle(self, generation, failed):
+        if failed is None:
+            self._release(generation)
+        else:
+            self.record(failed, generation)
+
+    def call(self, fn, is_failure):
+        """Run ``fn`` through the breaker; ``is_failure(result)`` classifies results"""
+        generation = self._admit()
+        if generation is None:
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        failed = None
+        try:
+            result = fn()
+            failed = is_failure(result)
+            return result
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._settle(generation, failed)
+
+    async def call_async(self, fn, is_failure):
+        """``call`` for a coroutine function ``fn``; a cancelled call releases its probe slot"""
+        generation = self._admit()
+        if generation is None:
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        failed = None
+        try:
+            result = await fn()
+            failed = is_failure(result)
+            return result
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._settle(generation, failed)
+
+
+def create_breakers(cfg):
+    return {name: CircuitBreaker.from_config(name, cfg) for name in UPSTREAMS}
+
+
+breakers = create_breakers(get_config())
+
+
+def configure(cfg):
+    """Rebuild every breaker from a configuration class"""
+    global breakers
+    breakers = create_breakers(cfg)
+
+
+def for_endpoint(endpoint):
+    """Return the breaker for an endpoint name like 'trakt.trending'"""
+    if not endpoint:
+        return None
+    return breakers.get(endpoint.split('.', 1)[0])
+
+
+def states():
+    return {name: breaker.state for name, breaker in breakers.items()}
@@ -0,0 +1,126 @@
+"""
+Single-flight coalescing of identical concurrent upstream calls.
+
+When many requests ask for the same upstream URL at once (a traffic spike on
+/recommendations all fetching Trakt trending), only the first caller goes to
+the network. Everyone else waiting on the same key gets the leader's result,
+or its exception, when it completes. ``AsyncSingleFlight`` does the same for
+coroutines on the shared upstream event loop, running each shared call as a
+task that no single request owns and that stops when nobody waits for it.
+"""
+
+import asyncio
+import threading
+
+import deadline
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls sharing a key into one in-flight call"""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Run ``fn`` unless a call for ``key`` is already in flight, then share its outcome"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            # Waiters give up with the rest of their request budget
+            if not flight.done.wait(timeout=deadline.remaining()):
+                raise deadline.DeadlineExceeded('Request deadline exceeded waiting for upstream')
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+
+class _AsyncFlight:
+    __slots__ = ('task', 'context', 'waiters')
+
+    def __init__(self, fn, ends):
+        self.context = deadline.context_until(ends)
+        self.task = asyncio.get_running_loop().create_task(fn(), context=self.context)
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """``SingleFlight`` for coroutines running on one event loop.
+
+    The shared call runs as a task of its own, under the deadline of the
+    caller with the most time left (moved out as later callers join, and
+    unbounded once a caller without a deadline waits). Callers wait on it
+    shielded, each for the rest of its own budget, so a caller that is
+    cancelled or runs out of time stops waiting without failing the others.
+    The call is cancelled when its last caller stops waiting.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        """Await ``fn()`` unless a call for ``key`` is already in flight, then share its outcome"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _AsyncFlight(fn, deadline.current())
+            flight.task.add_done_callback(lambda task: self._land(key, flight))
+        else:
+            self.coalesced += 1
+            deadline.extend(flight.context, deadline.current())
+        flight.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(flight.task), timeout=deadline.remaining())
+        except asyncio.TimeoutError:
+            if flight.task.done():
+                raise  # The call itself timed out
+            raise deadline.DeadlineExceeded('Request deadline exceeded waiting for upstream')
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # Nobody is left to use the result
+                flight.task.cancel()
+
+    def _land(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled():
+            flight.task.exception()  # Retrieved here so an error no caller waited for is not logged
+
+    def in_flight(self):
+        return len(self._flights)
+
+
+flights = SingleFlight()
+async_flights = AsyncSingleFlight()
@@ -10,14 +10,146 @@ class Config:
     TRAKT_CLIENT_SECRET = os.getenv('TRAKT_CLIENT_SECRET')
     NEWS_API_KEY = os.getenv('NEWS_API_KEY')
     WATCHMODE_API_KEY = os.getenv('WATCHMODE_API_KEY')
+    YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY')
+    
+    # Upstream API base URLs (point these at stand-in servers to benchmark offline)
+    TRAKT_API_URL = os.getenv('TRAKT_API_URL', 'https://api.trakt.tv')
+    WATCHMODE_API_URL = os.getenv('WATCHMODE_API_URL', 'https://api.watchmode.com/v1')
+    NEWS_API_URL = os.getenv('NEWS_API_URL', 'https://newsapi.org/v2')
+    YOUTUBE_API_URL = os.getenv('YOUTUBE_API_URL', 'https://www.googleapis.com/youtube/v3')
+    
+    # Record upstream responses to a snapshot file, or replay them with no network
+    UPSTREAM_MODE = os.getenv('UPSTREAM_MODE', 'live')  # live, record or replay
+    UPSTREAM_SNAPSHOT_PATH = os.getenv('UPSTREAM_SNAPSHOT_PATH', 'data/upstream_snapshot.bin')
     
     # Rate limiting
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')  # memory or redis
     RATE_LIMIT_WINDOW = 60  # seconds
     RATE_LIMIT_MAX_REQUESTS = 100
+    RATE_LIMIT_BLOCK_SECONDS = 60  # Penalty once a client exceeds the limit
+    RATE_LIMIT_MAX_KEYS = 100000  # Clients tracked in memory before evicting the idlest
     
     # API timeouts
     REQUEST_TIMEOUT = 10
     
+    # Upstream HTTP connection pooling
+    HTTP_POOL_SIZE = 10  # Keep-alive connections per upstream host
+    HTTP_CONNECT_TIMEOUT = 3.05
+    HTTP_RETRIES = 2
+    HTTP_RETRY_BACKOFF = 0.3  # seconds, jittered
+    
+    # Per-upstream circuit breakers
+    BREAKER_FAILURE_RATE = 0.5  # Open once this share of recent calls failed
+    BREAKER_MINIMUM_CALLS = 5  # Calls in the window before the rate counts
+    BREAKER_WINDOW_SECONDS = 30
+    BREAKER_OPEN_SECONDS = 30  # Fail fast this long before probing again
+    BREAKER_HALF_OPEN_PROBES = 1
+    BREAKER_PROBE_TIMEOUT = 15  # A half-open probe still running after this long counts as failed
+    
+    # Sessions: redis keeps them server-side for every worker, cookie uses Flask's
+    # signed cookie, memory keeps them server-side in one process only
+    SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'redis' if os.getenv('REDIS_URL') else 'cookie')
+    SESSION_TTL = 7 * 86400  # seconds a session lives after its last change
+    SESSION_MAX_ENTRIES = 10000  # Sessions kept in memory before evicting the oldest
+    
+    # Upstream response cache (in-process LRU + optional shared Redis tier)
+    REDIS_URL = os.getenv('REDIS_URL')
+    CACHE_MAX_ENTRIES = 2048
+    CACHE_STALE_FACTOR = 1.0  # Serve stale for this multiple of the TTL while revalidating
+    CACHE_LOCK_SECONDS = 5  # Redis lock so one worker loads a missing key, 0 disables
+    CACHE_TTLS = {  # seconds per upstream endpoint, 0 disables caching
+        'trakt.trending': 600,
+        'trakt.popular': 3600,
+        'trakt.releases': 3600,
+        'trakt.search': 900,
+        'trakt.movie': 86400,
+        'watchmode.search': 86400,
+        'watchmode.sources': 21600,
+        'newsapi.everything': 1800,
+        'youtube.search': 604800
+    }
+    
+    # Local WatchMode id index (Trakt/IMDb/TMDB ids and titles -> WatchMode id)
+    WATCHMODE_INDEX_PATH = os.getenv('WATCHMODE_INDEX_PATH', 'data/watchmode_index.sqlite3')
+    WATCHMODE_INDEX_MEMORY_ENTRIES = 10000  # Index keys kept in memory in front of SQLite
+    
+    # Persistent YouTube trailer store and search quota
+    TRAILER_STORE_PATH = os.getenv('TRAILER_STORE_PATH', 'data/trailers.sqlite3')
+    TRAILER_TTL = 30 * 86400  # seconds to keep a found trailer
+    TRAILER_NEGATIVE_TTL = 3 * 86400  # seconds to remember that there is no trailer
+    TRAILER_MEMORY_ENTRIES = 10000  # Trailer keys kept in memory in front of SQLite
+    YOUTUBE_DAILY_QUOTA = int(os.getenv('YOUTUBE_DAILY_QUOTA', 10000))  # units, search.list costs 100
+    YOUTUBE_PREFETCH_SHARE = 0.8  # Share of the daily quota the prefetcher may spend
+    TRAILER_PREFETCH_LISTS = ('trending', 'releases')  # Prefetched after each catalog refresh
+    
+    # Catalog snapshots (Trakt lists refreshed off the request path)
+    CATALOG_REFRESH_MODE = os.getenv('CATALOG_REFRESH_MODE', 'thread')  # thread, celery or off
+    CATALOG_REFRESH_INTERVAL = 300  # seconds
+    CATALOG_SNAPSHOT_PATH = os.getenv('CATALOG_SNAPSHOT_PATH', 'data/catalog_snapshot.json')
+    CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+    
+    # Recommendation ranking
+    TRAKT_LIST_LIMIT = 100  # Movies per Trakt list in the catalog
+    RECOMMENDATION_TOP_K = 50  # Precomputed movies per genre
+    
+    # Local search index
+    SEARCH_INDEX_MIN_SCORE = 0.45  # Below this, /search falls through to Trakt
+    
+    # Latency budget per route, in seconds, shared by all of its upstream calls
+    ROUTE_DEADLINES = {
+        'recommendations': 0.8,
+        'new_movies': 0.8,
+        'search': 1.0,
+        'api_movies': 1.0,
+        'api_streaming': 1.0,
+        'api_trailer': 1.5,
+        'api_search': 1.0,
+        'api_streaming_batch': 2.0,
+        'api_trailer_batch': 3.0,
+        'api_new_movies': 1.0
+    }
+    
+    # Browser/CDN caching per route: (max-age, stale-while-revalidate) in seconds.
+    # Responses to these routes also get a content-hash ETag and honour If-None-Match.
+    HTTP_CACHE_POLICIES = {
+        'new_movies': (300, 900),
+        'search': (600, 1800),
+        'api_movies': (300, 900),
+        'api_new_movies': (300, 900),
+        'api_search': (600, 1800),
+        'api_streaming': (3600, 21600),
+        'api_trailer': (86400, 604800)
+    }
+    
+    # Enrichment
+    ENRICH_MAX_WORKERS = 8  # Concurrent upstream lookups per page
+    ENRICH_NEWS_LIMIT = 3
+    BATCH_MAX_ITEMS = 50  # Titles plus Trakt ids per streaming/trailer batch call
+    PROFILE_BATCH_MAX_SIZE = 10000  # Answer sets /api/profile/batch scores per call
+    STREAM_RENDERING = os.getenv('STREAM_RENDERING', 'on') == 'on'  # Chunked pages, except those with a cache policy
+    
+    # Cursor pagination
+    PAGE_DEFAULT_LIMIT = 20
+    PAGE_MAX_LIMIT = 50
+    NEW_MOVIES_PAGE_SIZE = 15
+    TRAKT_SEARCH_LIMIT = 20
+    
+    # News lookups
+    NEWS_LOOKUP_MODE = os.getenv('NEWS_LOOKUP_MODE', 'single')  # single or sequential
+    NEWS_MAX_ARTICLES = 3
+    NEWS_CANDIDATE_ARTICLES = 20  # Fetched by the single query, then ranked locally
+    NEWS_HEDGE_AFTER = 0.3  # seconds before a duplicate request is sent
+    NEWS_DOMAINS = 'variety.com,hollywoodreporter.com,indiewire.com,deadline.com,thewrap.com'
+    NEWS_KEYWORDS = ('movie', 'film', 'cinema')  # Articles that mention one rank first
+    
+    # Boot: create_app() compiles templates and loads the catalog snapshot; each
+    # worker also opens a connection to every upstream before taking traffic
+    PREWARM_CONNECTIONS = os.getenv('PREWARM_CONNECTIONS', 'on') == 'on'
+    PREWARM_TIMEOUT = 2.0  # seconds per upstream host
+    
+    # Metrics
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'on') == 'on'  # Prometheus text at /metrics
+    
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 
@@ -40,6 +172,9 @@ class TestingConfig(Config):
     DEBUG = True
     TESTING = True
     WTF_CSRF_ENABLED = False
+    REDIS_URL = None
+    CATALOG_REFRESH_MODE = 'off'
+    PREWARM_CONNECTIONS = False
 
 # Configuration dictionary
 config = {
@@ -47,4 +182,8 @@ config = {
     'production': ProductionConfig,
     'testing': TestingConfig,
     'default': DevelopmentConfig
-} 
\ No newline at end of file
+}
+
+def get_config():
+    """Return the configuration class for the current environment"""
+    return config.get(os.getenv('FLASK_CONFIG', 'default'), DevelopmentConfig)
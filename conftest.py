@@ -0,0 +1,21 @@
+"""Shared pytest fixtures"""
+
+import pytest
+
+from config import TestingConfig
+
+
+@pytest.fixture
+def offline_config(tmp_path):
+    class OfflineConfig(TestingConfig):
+        # No upstream keys, so lookups answer with their defaults and never touch the network
+        TRAKT_CLIENT_ID = NEWS_API_KEY = WATCHMODE_API_KEY = YOUTUBE_API_KEY = None
+        UPSTREAM_MODE = 'live'
+        CATALOG_SNAPSHOT_PATH = str(tmp_path / 'catalog_snapshot.json')
+        WATCHMODE_INDEX_PATH = str(tmp_path / 'watchmode_index.sqlite3')
+        TRAILER_STORE_PATH = str(tmp_path / 'trailers.sqlite3')
+        BATCH_MAX_ITEMS = 3
+        PROFILE_BATCH_MAX_SIZE = 2
+        RATE_LIMIT_MAX_REQUESTS = 1000
+
+    return OfflineConfig
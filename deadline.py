@@ -0,0 +1,89 @@
+"""
+Per-request deadline budgets.
+
+A route sets a deadline at entry with ``budget(seconds)``; every upstream call
+made while handling it (including from enrichment worker threads started with
+``submit``) only gets the time that is left. Once the budget is spent,
+upstream calls fail immediately with ``DeadlineExceeded`` and callers use
+their defaults.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+import requests
+
+# Below this many seconds there is no point starting an upstream call
+MINIMUM_CALL_SECONDS = 0.01
+
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Raised instead of calling an upstream once the request budget is spent"""
+
+
+@contextmanager
+def budget(seconds):
+    """Run the enclosed block with a deadline ``seconds`` from now"""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def current():
+    """The current deadline as a ``time.monotonic()`` value, or None when there is none"""
+    return _deadline.get()
+
+
+def remaining():
+    """Seconds left in the current budget, or None when there is no deadline"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def expired():
+    left = remaining()
+    return left is not None and left < MINIMUM_CALL_SECONDS
+
+
+def cap_timeout(timeout):
+    """Shrink a requests timeout (a number or a (connect, read) tuple) to the budget"""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left < MINIMUM_CALL_SECONDS:
+        raise DeadlineExceeded('Request deadline exceeded')
+    if isinstance(timeout, tuple):
+        return tuple(min(part, left) for part in timeout)
+    return min(timeout, left) if timeout else left
+
+
+def context_until(ends):
+    """A copy of the current context with its deadline at ``ends`` (None for no deadline)"""
+    context = contextvars.copy_context()
+    context.run(_deadline.set, ends)
+    return context
+
+
+def extend(context, ends):
+    """Move the deadline of ``context`` (not currently running) out to ``ends`` if that is later"""
+    current_ends = context.get(_deadline)
+    if current_ends is not None and (ends is None or ends > current_ends):
+        context.run(_deadline.set, ends)
+
+
+def detached_context():
+    """A copy of the current context without the deadline, for work no single request owns"""
+    return context_until(None)
+
+
+def submit(executor, fn, *args, **kwargs):
+    """Submit ``fn`` to an executor so it runs under the caller's deadline"""
+    context = contextvars.copy_context()
+    return executor.submit(context.run, fn, *args, **kwargs)
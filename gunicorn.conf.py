@@ -0,0 +1,24 @@
+"""gunicorn settings: ``gunicorn -c gunicorn.conf.py``"""
+
+import os
+
+from config import get_config
+
+wsgi_app = 'wsgi:app'
+bind = os.getenv('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+if workers > 1 and get_config().SESSION_BACKEND == 'memory':
+    # Each worker would have its own sessions and lose the quiz half the time
+    raise RuntimeError('SESSION_BACKEND=memory only works with one worker, use redis or cookie')
+
+# Build the app once in the master so workers fork with it already warm
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Sockets and threads do not survive a fork; open them in each worker
+    import app
+    import wsgi
+    app.start_worker(wsgi.app)
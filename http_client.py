@@ -0,0 +1,305 @@
+"""
+Pooled upstream HTTP client shared by all API helpers.
+
+Keeps one keep-alive ``requests.Session`` per upstream host so repeated calls
+to Trakt, WatchMode, NewsAPI and YouTube reuse TCP+TLS connections instead of
+handshaking on every request.
+"""
+
+import copy
+import hashlib
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import cache
+import circuit_breaker
+import coalesce
+import deadline
+import metrics
+import upstream_snapshot
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+# Credentials are never part of a cache key
+SECRET_PARAMS = frozenset(['apiKey', 'key'])
+
+# Hedged duplicates run here; a losing request is left to finish in the background
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='upstream-hedge')
+
+
+class JitteredRetry(Retry):
+    """Retry policy using full-jitter exponential backoff.
+
+    Retries stop once the current request deadline is spent, and backoff
+    sleeps never run past it.
+    """
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        if backoff <= 0:
+            return 0
+        backoff = random.uniform(0, backoff)
+        left = deadline.remaining()
+        return backoff if left is None else min(backoff, left)
+
+    def is_exhausted(self):
+        return super().is_exhausted() or deadline.expired()
+
+
+class CachedResponse:
+    """Minimal stand-in for ``requests.Response`` served from the cache"""
+
+    status_code = 200
+    from_cache = True
+
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return copy.deepcopy(self._data)
+
+
+class UpstreamClient:
+    """Connection pool per upstream host with shared timeouts and retries"""
+
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=10,
+                 retries=2, backoff_factor=0.3):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(
+            pool_size=cfg.HTTP_POOL_SIZE,
+            connect_timeout=cfg.HTTP_CONNECT_TIMEOUT,
+            read_timeout=cfg.REQUEST_TIMEOUT,
+            retries=cfg.HTTP_RETRIES,
+            backoff_factor=cfg.HTTP_RETRY_BACKOFF
+        )
+
+    def _build_session(self):
+        retry = JitteredRetry(
+            total=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False,
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+            max_retries=retry
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def session_for(self, url):
+        """Return the pooled session for the host of ``url``"""
+        host = urlsplit(url).netloc
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    session = self._build_session()
+                    self._sessions[host] = session
+        return session
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        return self.session_for(url).get(
+            url,
+            params=params,
+            headers=headers,
+            timeout=timeout or self.timeout
+        )
+
+    def warm(self, urls, timeout=2.0):
+        """Open a pooled connection (DNS, TCP and TLS) to the host of each of ``urls``"""
+        for url in urls:
+            try:
+                self.session_for(url).head(url, allow_redirects=False, timeout=timeout)
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Could not open a connection to {url} ahead of traffic: {e}")
+
+    def close(self):
+        """Close every pooled connection"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions = {}
+        for session in sessions:
+            session.close()
+
+
+client = UpstreamClient.from_config(get_config())
+
+
+def configure(cfg):
+    """Rebuild the shared client from a configuration class"""
+    global client
+    old_client = client
+    client = UpstreamClient.from_config(cfg)
+    old_client.close()
+
+
+def cache_key(endpoint, url, params=None):
+    """Build a stable cache key from the URL and its non-secret params"""
+    items = sorted(
+        (name, str(value)) for name, value in (params or {}).items()
+        if name not in SECRET_PARAMS
+    )
+    digest = hashlib.sha1(f"{url}?{urlencode(items)}".encode('utf-8')).hexdigest()
+    return f"{endpoint}:{digest}"
+
+
+def is_upstream_failure(response):
+    """Responses that count against an upstream's circuit breaker"""
+    return response.status_code == 429 or response.status_code >= 500
+
+
+def response_validators(response):
+    """The ETag / Last-Modified of a response, for revalidating it later"""
+    validators = {}
+    if response.headers.get('ETag'):
+        validators['etag'] = response.headers['ETag']
+    if response.headers.get('Last-Modified'):
+        validators['last_modified'] = response.headers['Last-Modified']
+    return validators
+
+
+def conditional_headers(headers, validators):
+    """``headers`` plus If-None-Match / If-Modified-Since from stored validators"""
+    if not validators:
+        return headers
+    headers = dict(headers or {})
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+
+def flight_key(key, headers):
+    """Coalescing key for a fetch; conditional requests only share with their own kind"""
+    if not headers or not ('If-None-Match' in headers or 'If-Modified-Since' in headers):
+        return key
+    return f"{key}:{headers.get('If-None-Match', '')}:{headers.get('If-Modified-Since', '')}"
+
+
+def _hedged(attempt, hedge_after):
+    """Run ``attempt``, racing a duplicate if it is still pending after ``hedge_after``.
+
+    The first attempt to return wins; an error is raised only when both fail.
+    """
+    left = deadline.remaining()
+    if left is not None and left <= hedge_after:
+        return attempt()
+    pending = {deadline.submit(_hedge_executor, attempt)}
+    done, pending = wait(pending, timeout=hedge_after)
+    if not done:
+        logger.info(f"Upstream call still pending after {hedge_after}s, sending a hedged request")
+        pending.add(deadline.submit(_hedge_executor, attempt))
+
+    error = None
+    while done or pending:
+        for future in done:
+            try:
+                return future.result()
+            except Exception as e:
+                error = e
+        if not pending:
+            break
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+    raise error
+
+
+def fetch(url, params=None, headers=None, timeout=None, endpoint=None, hedge_after=None):
+    """GET from the network through the endpoint's circuit breaker.
+
+    The timeout is capped to what is left of the request deadline. With
+    ``hedge_after`` set, a duplicate request is sent if the first has not
+    answered within that many seconds and whichever returns first is used.
+    Concurrent fetches of the same URL and params share one upstream call.
+    In replay mode the recorded response is returned instead.
+    """
+    key = cache_key(endpoint, url, params)
+    snapshot = upstream_snapshot.snapshot
+    if snapshot.mode == 'replay':
+        return snapshot.replay(key)
+    breaker = circuit_breaker.for_endpoint(endpoint)
+
+    def call():
+        capped = deadline.cap_timeout(timeout or client.timeout)
+        if breaker is None:
+            return client.get(url, params=params, headers=headers, timeout=capped)
+        return breaker.call(
+            lambda: client.get(url, params=params, headers=headers, timeout=capped),
+            is_upstream_failure
+        )
+
+    def attempt():
+        started = time.perf_counter()
+        try:
+            response = call()
+        except Exception as e:
+            metrics.record_upstream(endpoint, started, error=e)
+            raise
+        metrics.record_upstream(endpoint, started, response=response)
+        return response
+
+    def flight():
+        response = attempt() if hedge_after is None else _hedged(attempt, hedge_after)
+        # Read the body here so every waiter shares the same bytes
+        response.content
+        snapshot.record(key, response)
+        return response
+
+    return coalesce.flights.do(flight_key(key, headers), flight)
+
+
+def get(url, params=None, headers=None, timeout=None, endpoint=None, hedge_after=None):
+    """Issue a GET through the shared pooled client.
+
+    When ``endpoint`` names a cached endpoint, successful JSON responses are
+    served from the response cache and failures fall through uncached. An
+    expired entry is revalidated with a conditional request, and a 304 keeps
+    it. If the upstream fails (or its circuit is open) while an older cached
+    copy is still held, that copy is served instead. ``hedge_after`` is passed
+    on to ``fetch`` for cache misses.
+    """
+    response_cache = cache.response_cache
+    if endpoint is None or not response_cache.enabled_for(endpoint):
+        return fetch(url, params=params, headers=headers, timeout=timeout, endpoint=endpoint,
+                     hedge_after=hedge_after)
+
+    last_response = {}
+
+    def load(validators):
+        response = fetch(url, params=params, headers=conditional_headers(headers, validators),
+                         timeout=timeout, endpoint=endpoint, hedge_after=hedge_after)
+        last_response['response'] = response
+        if response.status_code == 304 and validators:
+            return cache.NOT_MODIFIED
+        if response.status_code == 200:
+            return cache.Validated(response.json(), response_validators(response))
+        return None
+
+    data = response_cache.get_or_load(endpoint, cache_key(endpoint, url, params), load)
+    if data is None:
+        return last_response['response']
+    return CachedResponse(data)
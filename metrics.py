@@ -0,0 +1,257 @@
+"""
+In-process metrics exposed in the Prometheus text format.
+
+Upstream clients record a latency histogram, status codes and errors per
+endpoint (``trakt.trending``, ``watchmode.sources``, ...); the app records
+render time and status per route and rate-limiter rejections. Cache, single-
+flight and circuit breaker figures are read from their modules at scrape
+time, so scraping only formats counters that already exist.
+
+Metrics are per process: with several gunicorn workers, each scrape sees the
+worker that answered it.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+import requests
+
+import cache
+import circuit_breaker
+import coalesce
+import deadline
+
+# Seconds; upstream calls and page renders both fall in this range
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with a fixed set of label names"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            series = [(labels, list(values)) for labels, values in self._series.items()]
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                yield (f'{self.name}_bucket',
+                       _labels(self.labelnames, labels, ('le', _number(float(bound)))),
+                       cumulative)
+            yield f'{self.name}_sum', _labels(self.labelnames, labels), values[-1]
+            yield f'{self.name}_count', _labels(self.labelnames, labels), cumulative
+
+
+class Collector:
+    """Metric whose samples are computed at scrape time.
+
+    ``collect()`` returns ``{label values tuple: value}``.
+    """
+
+    def __init__(self, name, help_text, kind, labelnames, collect):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def samples(self):
+        for labels, value in self.collect().items():
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def collector(self, name, help_text, kind, labelnames, collect):
+        return self.register(Collector(name, help_text, kind, labelnames, collect))
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+UPSTREAM_SECONDS = registry.histogram(
+    'cinematic_upstream_request_seconds', 'Upstream call latency, including client retries',
+    ('endpoint',)
+)
+UPSTREAM_RESPONSES = registry.counter(
+    'cinematic_upstream_responses_total', 'Upstream responses by status code',
+    ('endpoint', 'status')
+)
+UPSTREAM_ERRORS = registry.counter(
+    'cinematic_upstream_errors_total', 'Upstream calls that raised, by error kind',
+    ('endpoint', 'error')
+)
+ROUTE_SECONDS = registry.histogram(
+    'cinematic_route_seconds', 'Time to build each response (first byte for streamed pages)',
+    ('route',)
+)
+ROUTE_RESPONSES = registry.counter(
+    'cinematic_route_responses_total', 'Responses by route and status code',
+    ('route', 'status')
+)
+RATE_LIMITED = registry.counter(
+    'cinematic_rate_limited_total', 'Requests rejected by the rate limiter', ('route',)
+)
+
+
+def error_kind(error):
+    """Short label for an upstream exception"""
+    if isinstance(error, circuit_breaker.CircuitOpenError):
+        return 'circuit_open'
+    if isinstance(error, deadline.DeadlineExceeded):
+        return 'deadline'
+    if isinstance(error, requests.exceptions.Timeout):
+        return 'timeout'
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return 'connection'
+    return 'other'
+
+
+def record_upstream(endpoint, started, response=None, error=None):
+    """Record one upstream call that began at ``time.perf_counter()`` ``started``"""
+    endpoint = endpoint or 'other'
+    UPSTREAM_SECONDS.observe(time.perf_counter() - started, endpoint)
+    if error is not None:
+        UPSTREAM_ERRORS.inc(endpoint, error_kind(error))
+    else:
+        UPSTREAM_RESPONSES.inc(endpoint, str(response.status_code))
+
+
+def _cache_events():
+    events = {}
+    for endpoint, counters in cache.response_cache.stats()['endpoints'].items():
+        for event, count in counters.items():
+            events[(endpoint, event)] = count
+    return events
+
+
+def _cache_hit_ratios():
+    ratios = {}
+    for endpoint, counters in cache.response_cache.stats()['endpoints'].items():
+        hits = counters['hits'] + counters['stale_hits']
+        lookups = hits + counters['misses']
+        if lookups:
+            ratios[(endpoint,)] = hits / lookups
+    return ratios
+
+
+def _coalesced():
+    return {
+        ('thread',): coalesce.flights.coalesced,
+        ('async',): coalesce.async_flights.coalesced
+    }
+
+
+def _breaker_open():
+    return {
+        (name,): int(state != circuit_breaker.CLOSED)
+        for name, state in circuit_breaker.states().items()
+    }
+
+
+registry.collector(
+    'cinematic_cache_events_total', 'Response cache lookups by outcome', 'counter',
+    ('endpoint', 'event'), _cache_events
+)
+registry.collector(
+    'cinematic_cache_hit_ratio', 'Fresh plus stale hits over all response cache lookups', 'gauge',
+    ('endpoint',), _cache_hit_ratios
+)
+registry.collector(
+    'cinematic_coalesced_calls_total', 'Upstream calls that joined an identical call in flight',
+    'counter', ('path',), _coalesced
+)
+registry.collector(
+    'cinematic_circuit_open', '1 while an upstream circuit breaker is open or half-open', 'gauge',
+    ('upstream',), _breaker_open
+)
+
+
+def render():
+    return registry.render()
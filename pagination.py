@@ -0,0 +1,63 @@
+"""
+Cursor pagination for the JSON list endpoints.
+
+A cursor is URL-safe base64 over a small JSON object saying where the next
+page starts, e.g. an offset into the local ranking or into a Trakt feed.
+Clients treat it as opaque and send back the ``next_cursor`` they were given;
+a missing ``next_cursor`` means there are no more results.
+"""
+
+import base64
+import binascii
+import json
+
+# Longest cursor accepted; real ones are a few dozen bytes
+MAX_CURSOR_LENGTH = 256
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor or limit the client should not have sent"""
+
+
+def encode_cursor(position):
+    """Opaque cursor for a position dict, or None for the end of the results"""
+    if not position:
+        return None
+    raw = json.dumps(position, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Position dict for a cursor; an empty dict for the first page"""
+    if not cursor:
+        return {}
+    if len(cursor) > MAX_CURSOR_LENGTH:
+        raise InvalidCursor('Cursor is too long')
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise InvalidCursor('Malformed cursor')
+    if not isinstance(position, dict):
+        raise InvalidCursor('Malformed cursor')
+    for value in position.values():
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise InvalidCursor('Malformed cursor')
+        if isinstance(value, int) and value < 0:
+            raise InvalidCursor('Malformed cursor')
+    return position
+
+
+def page_args(args, default_limit=20, max_limit=50):
+    """``(position, limit)`` from a request's ``cursor`` and ``limit`` query args"""
+    limit = args.get('limit', default_limit, type=int)
+    if limit < 1:
+        raise InvalidCursor('limit must be a positive integer')
+    return decode_cursor(args.get('cursor')), min(limit, max_limit)
+
+
+def page(items, next_position, key='movies', **extra):
+    """JSON body for one page of ``items``"""
+    body = {key: items, 'next_cursor': encode_cursor(next_position)}
+    body.update(extra)
+    return body
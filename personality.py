@@ -0,0 +1,160 @@
+"""
+Precompiled personality scoring.
+
+Quiz answers, genres and profiles are compiled once into integer-indexed
+weight matrices. A submission is scored by summing the genre rows of its
+answers, taking the top genres (ties go to the genre that appeared first) and
+picking the profile with the most matching genres (ties go to the profile
+listed first). Batches are scored in one vectorized pass when NumPy is
+installed and with the same arithmetic in pure Python otherwise.
+"""
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy only speeds up batch scoring
+    np = None
+
+
+class PersonalityEngine:
+    """Scores quiz answer sets against compiled genre and profile matrices"""
+
+    def __init__(self, mapping, profiles, default_profile, top_n=3):
+        self.top_n = top_n
+        self.answer_index = {answer: i for i, answer in enumerate(mapping)}
+
+        genres = []
+        for genre_list in list(mapping.values()) + [p['genres'] for p in profiles.values()]:
+            for genre in genre_list:
+                if genre not in genres:
+                    genres.append(genre)
+        self.genres = tuple(genres)
+        genre_index = {genre: i for i, genre in enumerate(self.genres)}
+
+        # answer -> tuple of genre indices, in mapping order
+        self.answer_rows = tuple(
+            tuple(genre_index[genre] for genre in genre_list)
+            for genre_list in mapping.values()
+        )
+
+        self.profile_names = tuple(profiles)
+        self.profile_descriptions = tuple(p['description'] for p in profiles.values())
+        self.profile_matrix = tuple(
+            tuple(1 if genre in p['genres'] else 0 for genre in self.genres)
+            for p in profiles.values()
+        )
+        self.default_profile_id = self.profile_names.index(default_profile)
+
+        if np is not None:
+            width = max((len(row) for row in self.answer_rows), default=0)
+            # One padding row at the end for unknown answers; -1 marks an empty slot
+            rows = np.full((len(self.answer_rows) + 1, width), -1, dtype=np.int64)
+            for i, row in enumerate(self.answer_rows):
+                rows[i, :len(row)] = row
+            self._np_answer_rows = rows
+            self._np_profile_matrix = np.array(self.profile_matrix, dtype=np.int64)
+
+    def profile(self, profile_id):
+        """Return the name/description dict for a profile id"""
+        return {
+            'id': profile_id,
+            'name': self.profile_names[profile_id],
+            'description': self.profile_descriptions[profile_id]
+        }
+
+    def match_profile(self, genres):
+        """Return the id of the profile best matching a list of genre names"""
+        indices = [self.genres.index(genre) for genre in genres if genre in self.genres]
+        return self._match_profile(indices)
+
+    def _match_profile(self, genre_ids):
+        best_id, best_score = self.default_profile_id, 0
+        for profile_id, weights in enumerate(self.profile_matrix):
+            score = sum(weights[g] for g in genre_ids)
+            if score > best_score:
+                best_id, best_score = profile_id, score
+        return best_id
+
+    def _top_genres(self, answers):
+        counts = [0] * len(self.genres)
+        first_seen = [0] * len(self.genres)
+        position = 0
+        for answer in answers:
+            answer_id = self.answer_index.get(answer)
+            if answer_id is None:
+                continue
+            for g in self.answer_rows[answer_id]:
+                position += 1
+                if not counts[g]:
+                    first_seen[g] = position
+                counts[g] += 1
+        ranked = sorted(
+            (g for g in range(len(self.genres)) if counts[g]),
+            key=lambda g: (-counts[g], first_seen[g])
+        )
+        return ranked[:self.top_n]
+
+    def score(self, answers):
+        """Score one submission (a dict of question -> answer, or answer values).
+
+        Returns the dominant trait names and the matching profile id.
+        """
+        if isinstance(answers, dict):
+            answers = answers.values()
+        genre_ids = self._top_genres(answers)
+        return {
+            'traits': [self.genres[g] for g in genre_ids],
+            'profile_id': self._match_profile(genre_ids)
+        }
+
+    def score_batch(self, answer_sets):
+        """Score many submissions at once; results match ``score`` one by one"""
+        answer_sets = [
+            list(answers.values()) if isinstance(answers, dict) else list(answers)
+            for answers in answer_sets
+        ]
+        if np is None or not answer_sets:
+            return [self.score(answers) for answers in answer_sets]
+        return self._score_batch_numpy(answer_sets)
+
+    def _score_batch_numpy(self, answer_sets):
+        n = len(answer_sets)
+        genre_count = len(self.genres)
+        unknown = len(self.answer_rows)
+        length = max(len(answers) for answers in answer_sets) or 1
+
+        answer_ids = np.full((n, length), unknown, dtype=np.int64)
+        for i, answers in enumerate(answer_sets):
+            answer_ids[i, :len(answers)] = [self.answer_index.get(a, unknown) for a in answers]
+
+        # (n, length * width) genre ids in submission order; empty slots go to a sink column
+        slots = self._np_answer_rows[answer_ids].reshape(n, -1)
+        slots = np.where(slots < 0, genre_count, slots)
+        positions = np.broadcast_to(np.arange(slots.shape[1]), slots.shape)
+        rows = np.broadcast_to(np.arange(n)[:, None], slots.shape)
+
+        counts = np.zeros((n, genre_count + 1), dtype=np.int64)
+        np.add.at(counts, (rows, slots), 1)
+        first_seen = np.full((n, genre_count + 1), slots.shape[1], dtype=np.int64)
+        np.minimum.at(first_seen, (rows, slots), positions)
+        counts, first_seen = counts[:, :genre_count], first_seen[:, :genre_count]
+
+        # Higher count wins, then earlier first appearance; unseen genres rank last
+        span = slots.shape[1] + 1
+        keys = counts * span + (span - 1 - first_seen)
+        keys[counts == 0] = -1
+        top = np.argsort(-keys, axis=1, kind='stable')[:, :self.top_n]
+        top_valid = np.take_along_axis(counts, top, axis=1) > 0
+
+        selected = np.zeros((n, genre_count), dtype=np.int64)
+        np.put_along_axis(selected, top, top_valid.astype(np.int64), axis=1)
+        profile_scores = selected @ self._np_profile_matrix.T
+        best = np.argmax(profile_scores, axis=1)
+        best = np.where(profile_scores.max(axis=1) > 0, best, self.default_profile_id)
+
+        return [
+            {
+                'traits': [self.genres[g] for g, valid in zip(top[i], top_valid[i]) if valid],
+                'profile_id': int(best[i])
+            }
+            for i in range(n)
+        ]
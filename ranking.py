@@ -0,0 +1,122 @@
+"""
+Genre-aware recommendation ranking.
+
+``GenreIndex`` keeps a precomputed top-K list per Trakt genre, ordered by
+watchers then rating. Recommendations for a personality are a k-way merge of
+the lists for its dominant traits, so a request costs O(K) and no upstream
+calls.
+"""
+
+import heapq
+import threading
+
+from catalog import movie_key
+
+# Personality traits whose Trakt genre slugs differ from the trait name
+TRAIT_GENRES = {
+    'sci-fi': ('science-fiction',),
+    'historical': ('history', 'war'),
+    'biography': ('history',),
+    'sports': ('sports', 'sporting-event'),
+    'musical': ('musical', 'music')
+}
+
+# Later traits are weighted down so the dominant trait leads the merge
+TRAIT_WEIGHTS = (1.0, 0.85, 0.7)
+
+
+def trakt_genres(trait):
+    """Trakt genre slugs matching a personality trait"""
+    return TRAIT_GENRES.get(trait, (trait,))
+
+
+def rank_score(movie):
+    return (movie.get('watchers') or 0, movie.get('rating') or 0)
+
+
+def _weighted_stream(movies, rank, trait):
+    """Yield ``(sort key, trait, movie)`` with the key ascending"""
+    weight = TRAIT_WEIGHTS[rank] if rank < len(TRAIT_WEIGHTS) else 0
+    for movie in movies:
+        watchers, rating = rank_score(movie)
+        yield (-weight * watchers, -weight * rating, rank), trait, movie
+
+
+class GenreIndex:
+    """Top-K movies per genre, ordered by watchers then rating"""
+
+    def __init__(self, movies, top_k=50):
+        self.top_k = top_k
+        unique = {}
+        for movie in movies:
+            key = movie_key(movie)
+            # Keep the copy with the most signal (trending has watchers)
+            if key not in unique or rank_score(movie) > rank_score(unique[key]):
+                unique[key] = movie
+
+        ranked = sorted(unique.values(), key=rank_score, reverse=True)
+        self.overall = ranked[:top_k]
+        self.by_genre = {}
+        for movie in ranked:
+            for genre in movie.get('genres') or [movie.get('genre')]:
+                if not genre:
+                    continue
+                movies_for_genre = self.by_genre.setdefault(genre, [])
+                if len(movies_for_genre) < top_k:
+                    movies_for_genre.append(movie)
+
+    def top(self, trait):
+        """Top movies for a personality trait, best first"""
+        lists = [self.by_genre.get(genre, []) for genre in trakt_genres(trait)]
+        if len(lists) == 1:
+            return lists[0]
+        return list(heapq.merge(*lists, key=rank_score, reverse=True))
+
+    def recommend(self, traits, limit=15, offset=0):
+        """Merge the top lists of ``traits`` into one ranked list.
+
+        Each movie is labelled with the trait it was matched on; when the
+        trait lists run short the overall top movies fill the rest.
+        """
+        traits = list(traits[:len(TRAIT_WEIGHTS)])
+        streams = [
+            _weighted_stream(self.top(trait), rank, trait)
+            for rank, trait in enumerate(traits)
+        ]
+        fallback_trait = traits[0] if traits else 'drama'
+        streams.append(_weighted_stream(self.overall, len(TRAIT_WEIGHTS), fallback_trait))
+
+        results = []
+        seen = set()
+        for _, trait, movie in heapq.merge(*streams, key=lambda item: item[0]):
+            key = movie_key(movie)
+            if key in seen:
+                continue
+            seen.add(key)
+            if len(seen) <= offset:
+                continue
+            results.append(dict(movie, genre=trait))
+            if len(results) >= limit:
+                break
+        return results
+
+
+_snapshot_index = (None, None)
+_snapshot_lock = threading.Lock()
+
+
+def index_for_snapshot(snapshot, top_k=50):
+    """Return the GenreIndex for a catalog snapshot, built once per version"""
+    global _snapshot_index
+    version, index = _snapshot_index
+    if version == snapshot.version:
+        return index
+    with _snapshot_lock:
+        version, index = _snapshot_index
+        if version != snapshot.version:
+            movies = []
+            for name in snapshot.list_names:
+                movies.extend(snapshot.movies(name) or [])
+            index = GenreIndex(movies, top_k)
+            _snapshot_index = (snapshot.version, index)
+        return index
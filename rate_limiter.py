@@ -0,0 +1,190 @@
+"""
+Rate limiting with pluggable backends.
+
+Both backends use a sliding-window counter: the current and previous fixed
+windows are kept as two integers and the previous one is weighted by how much
+of it still overlaps the sliding window. Updates are O(1) per request.
+
+``MemoryBackend`` is per process and evicts idle clients. ``RedisBackend``
+runs the same algorithm in an atomic Lua script so limits hold across every
+gunicorn worker.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from config import get_config
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is optional for local installs
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """In-process sliding-window counters with idle-key eviction"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        # key -> [window start, current count, previous count, blocked until]
+        self._state = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window, block_seconds, cost=1):
+        now = time.time()
+        window_start = now - (now % window)
+        with self._lock:
+            state = self._state.get(key)
+            if state is None:
+                state = [window_start, 0, 0, 0]
+                self._state[key] = state
+            else:
+                self._state.move_to_end(key)
+
+            if now < state[3]:
+                return False, state[3] - now
+
+            if state[0] != window_start:
+                # Roll the windows forward; anything older than one window is gone
+                elapsed_windows = round((window_start - state[0]) / window)
+                state[2] = state[1] if elapsed_windows == 1 else 0
+                state[1] = 0
+                state[0] = window_start
+
+            weight = 1 - (now - window_start) / window
+            estimated = state[2] * weight + state[1]
+            if estimated + cost > limit:
+                state[3] = now + block_seconds
+                return False, block_seconds
+
+            state[1] += cost
+            self._evict(now, window)
+            return True, 0
+
+    def _evict(self, now, window):
+        # Least recently seen keys are at the front; drop idle ones and overflow
+        while self._state:
+            key, state = next(iter(self._state.items()))
+            idle = now - state[0] > 2 * window and now >= state[3]
+            if not idle and len(self._state) <= self.max_keys:
+                break
+            self._state.popitem(last=False)
+
+    def __len__(self):
+        return len(self._state)
+
+
+class RedisBackend:
+    """Sliding-window counters shared by every worker through Redis"""
+
+    SCRIPT = """
+    local key = KEYS[1]
+    local now = tonumber(ARGV[1])
+    local window = tonumber(ARGV[2])
+    local limit = tonumber(ARGV[3])
+    local block_seconds = tonumber(ARGV[4])
+    local cost = tonumber(ARGV[5])
+
+    local blocked_until = tonumber(redis.call('GET', key .. ':blocked') or '0')
+    if now < blocked_until then
+        return {0, tostring(blocked_until - now)}
+    end
+
+    local window_start = now - (now % window)
+    local current_key = key .. ':' .. window_start
+    local previous_key = key .. ':' .. (window_start - window)
+    local current = tonumber(redis.call('GET', current_key) or '0')
+    local previous = tonumber(redis.call('GET', previous_key) or '0')
+    local weight = 1 - (now - window_start) / window
+
+    if previous * weight + current + cost > limit then
+        redis.call('SET', key .. ':blocked', now + block_seconds, 'EX', math.ceil(block_seconds))
+        return {0, tostring(block_seconds)}
+    end
+
+    redis.call('INCRBY', current_key, cost)
+    redis.call('EXPIRE', current_key, math.ceil(window * 2))
+    return {1, '0'}
+    """
+
+    def __init__(self, url, prefix='cinematic:ratelimit:'):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        self.prefix = prefix
+        self._script = self.client.register_script(self.SCRIPT)
+
+    def hit(self, key, limit, window, block_seconds, cost=1):
+        allowed, retry_after = self._script(
+            keys=[self.prefix + key],
+            args=[time.time(), window, limit, block_seconds, cost]
+        )
+        return bool(allowed), float(retry_after)
+
+
+class RateLimiter:
+    """Applies a request limit per client key using a backend"""
+
+    def __init__(self, backend, limit=100, window=60, block_seconds=60):
+        self.backend = backend
+        self.limit = limit
+        self.window = window
+        self.block_seconds = block_seconds
+        self.fallback = None
+        self.rejections = 0
+
+    @classmethod
+    def from_config(cls, cfg):
+        backend = MemoryBackend(max_keys=cfg.RATE_LIMIT_MAX_KEYS)
+        limiter = cls(
+            backend,
+            limit=cfg.RATE_LIMIT_MAX_REQUESTS,
+            window=cfg.RATE_LIMIT_WINDOW,
+            block_seconds=cfg.RATE_LIMIT_BLOCK_SECONDS
+        )
+        if cfg.RATE_LIMIT_BACKEND == 'redis':
+            if redis is None or not cfg.REDIS_URL:
+                logger.warning("Redis rate limiting needs redis and REDIS_URL, using in-process limits")
+            else:
+                # Keep the memory backend to enforce per-worker limits if Redis is down
+                limiter.fallback = backend
+                limiter.backend = RedisBackend(cfg.REDIS_URL)
+        return limiter
+
+    def hit(self, key, cost=1):
+        """Record ``cost`` units of work for ``key``.
+
+        Returns ``(allowed, retry_after_seconds)``.
+        """
+        try:
+            allowed, retry_after = self.backend.hit(
+                key, self.limit, self.window, self.block_seconds, cost
+            )
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            logger.warning(f"Rate limit backend failed, using in-process limits: {e}")
+            allowed, retry_after = self.fallback.hit(
+                key, self.limit, self.window, self.block_seconds, cost
+            )
+        if not allowed:
+            self.rejections += 1
+        return allowed, retry_after
+
+    async def hit_async(self, key, cost=1):
+        """``hit`` for the event loop; Redis round trips run in a worker thread"""
+        if isinstance(self.backend, MemoryBackend):
+            return self.hit(key, cost)
+        return await asyncio.to_thread(self.hit, key, cost)
+
+
+limiter = RateLimiter.from_config(get_config())
+
+
+def configure(cfg):
+    """Rebuild the shared limiter from a configuration class"""
+    global limiter
+    limiter = RateLimiter.from_config(cfg)
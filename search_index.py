@@ -0,0 +1,159 @@
+"""
+In-memory movie search index.
+
+Every title the app sees (catalog refreshes and past Trakt search results) is
+indexed in a token inverted index plus a trigram index over the token
+vocabulary. Queries are answered locally with ranked fuzzy matching, so typos
+like "incepshun" still find "Inception".
+"""
+
+import re
+import threading
+
+from catalog import movie_key
+from watchmode_index import normalize_title
+
+YEAR_PATTERN = re.compile(r'^(19|20)\d{2}$')
+
+
+def trigrams(token):
+    """Padded character trigrams of a token"""
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    """Dice coefficient between two trigram sets"""
+    if not a or not b:
+        return 0.0
+    return 2.0 * len(a & b) / (len(a) + len(b))
+
+
+def parse_query(query):
+    """Split a query into tokens and an optional trailing year filter"""
+    tokens = normalize_title(query).split()
+    year = None
+    if len(tokens) > 1 and YEAR_PATTERN.match(tokens[-1]):
+        year = int(tokens.pop())
+    return tokens, year
+
+
+class SearchIndex:
+    """Token inverted index plus trigram index with ranked fuzzy lookup"""
+
+    def __init__(self, min_similarity=0.4, max_documents=50000):
+        self.min_similarity = min_similarity
+        self.max_documents = max_documents
+        self._documents = []
+        self._keys = {}
+        self._postings = {}  # token -> set of document ids
+        self._trigrams = {}  # trigram -> set of tokens
+        self._token_trigrams = {}
+        self._snapshot_version = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, movie):
+        """Index a movie dict; returns False if it was already indexed"""
+        key = movie_key(movie)
+        with self._lock:
+            if key in self._keys or len(self._documents) >= self.max_documents:
+                return False
+            doc_id = len(self._documents)
+            self._documents.append({
+                'title': movie['title'],
+                'year': movie.get('year'),
+                'ids': movie.get('ids'),
+                'tokens': normalize_title(movie['title']).split()
+            })
+            self._keys[key] = doc_id
+            for token in self._documents[doc_id]['tokens']:
+                self._postings.setdefault(token, set()).add(doc_id)
+                if token not in self._token_trigrams:
+                    grams = trigrams(token)
+                    self._token_trigrams[token] = grams
+                    for gram in grams:
+                        self._trigrams.setdefault(gram, set()).add(token)
+            return True
+
+    def add_many(self, movies):
+        return sum(1 for movie in movies if self.add(movie))
+
+    def sync_snapshot(self, snapshot):
+        """Index every movie of a catalog snapshot once per version"""
+        if snapshot is None or snapshot.version == self._snapshot_version:
+            return
+        with self._lock:
+            if snapshot.version == self._snapshot_version:
+                return
+            for name in snapshot.list_names:
+                self.add_many(snapshot.movies(name) or [])
+            self._snapshot_version = snapshot.version
+
+    def _match_token(self, token):
+        """Return {vocabulary token: score} for tokens close to ``token``"""
+        matches = {}
+        if token in self._postings:
+            matches[token] = 1.0
+        grams = trigrams(token)
+        candidates = set()
+        for gram in grams:
+            candidates |= self._trigrams.get(gram, set())
+        for candidate in candidates:
+            if candidate == token:
+                continue
+            if candidate.startswith(token):
+                score = 0.9
+            else:
+                score = similarity(grams, self._token_trigrams[candidate])
+            if score >= self.min_similarity:
+                matches[candidate] = max(score, matches.get(candidate, 0))
+        return matches
+
+    def search(self, query, year=None, limit=20):
+        """Return ``(score, movie)`` pairs ranked best first.
+
+        A trailing year in the query filters by year; when nothing matches
+        that way it is searched as part of the title ("Blade Runner 2049").
+        """
+        tokens, query_year = parse_query(query)
+        results = self._rank(tokens, year or query_year, limit)
+        if not results and query_year is not None:
+            results = self._rank(tokens + [str(query_year)], year, limit)
+        return results
+
+    def _rank(self, tokens, year, limit):
+        if not tokens:
+            return []
+
+        with self._lock:
+            scores = {}
+            for token in tokens:
+                best = {}
+                for candidate, score in self._match_token(token).items():
+                    for doc_id in self._postings[candidate]:
+                        if score > best.get(doc_id, 0):
+                            best[doc_id] = score
+                for doc_id, score in best.items():
+                    scores[doc_id] = scores.get(doc_id, 0) + score
+
+            results = []
+            for doc_id, total in scores.items():
+                document = self._documents[doc_id]
+                if year and document['year'] != year:
+                    continue
+                # Favour titles that match the whole query with nothing extra
+                coverage = total / len(tokens)
+                precision = total / max(len(document['tokens']), len(tokens))
+                results.append((round(0.8 * coverage + 0.2 * precision, 3), document))
+
+        results.sort(key=lambda result: (-result[0], result[1]['title']))
+        return [
+            (score, {'title': doc['title'], 'year': doc['year'], 'ids': doc['ids']})
+            for score, doc in results[:limit]
+        ]
+
+
+search_index = SearchIndex()
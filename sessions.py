@@ -0,0 +1,205 @@
+"""
+Server-side Flask sessions.
+
+The cookie carries only a random session id. Session data lives in Redis
+(shared by every worker and node) or in an in-process LRU (one process
+only), so requests no longer ship, HMAC-verify and deserialize the whole
+session on every hit. The store is only written when the session changes,
+and static files never touch it.
+
+Without Redis, sessions stay in Flask's signed cookie, which every worker
+can read; the in-process store has to be asked for explicitly.
+"""
+
+import json
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from config import get_config
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is optional for local installs
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dict that tracks reads and changes and remembers its id"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(session):
+            session.modified = True
+            session.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.accessed = False
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        self.accessed = True
+        return super().__contains__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+
+class MemorySessionStore:
+    """In-process LRU of serialized sessions with a TTL"""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # sid -> (expires_at, payload)
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._data[sid]
+                return None
+            self._data.move_to_end(sid)
+            return entry[1]
+
+    def set(self, sid, payload, ttl):
+        with self._lock:
+            self._data[sid] = (time.time() + ttl, payload)
+            self._data.move_to_end(sid)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+
+class RedisSessionStore:
+    """Sessions as Redis strings expiring with their TTL"""
+
+    def __init__(self, url, prefix='cinematic:session:'):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        self.prefix = prefix
+
+    def get(self, sid):
+        return self.client.get(self.prefix + sid)
+
+    def set(self, sid, payload, ttl):
+        self.client.set(self.prefix + sid, payload, ex=int(ttl))
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Keeps session data in a store and only its id in the cookie"""
+
+    session_class = ServerSideSession
+
+    def __init__(self, store, ttl=7 * 86400):
+        self.store = store
+        self.ttl = ttl
+
+    @classmethod
+    def from_config(cls, cfg):
+        if cfg.SESSION_BACKEND == 'redis':
+            store = RedisSessionStore(cfg.REDIS_URL)
+        else:
+            store = MemorySessionStore(maxsize=cfg.SESSION_MAX_ENTRIES)
+        return cls(store, ttl=cfg.SESSION_TTL)
+
+    def _new_session(self):
+        return self.session_class(sid=secrets.token_urlsafe(16), new=True)
+
+    def open_session(self, app, request):
+        if app.static_url_path and request.path.startswith(app.static_url_path + '/'):
+            return self.session_class()
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid:
+            return self._new_session()
+        try:
+            payload = self.store.get(sid)
+        except Exception as e:
+            logger.error(f"Session store read failed: {e}")
+            payload = None
+        if payload is None:
+            return self._new_session()
+        try:
+            return self.session_class(json.loads(payload), sid=sid)
+        except ValueError:
+            return self._new_session()
+
+    def save_session(self, app, session, response):
+        if session.sid is None:
+            return
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.modified and not session.new:
+                try:
+                    self.store.delete(session.sid)
+                except Exception as e:
+                    logger.error(f"Session store delete failed: {e}")
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not session.modified:
+            return
+
+        payload = json.dumps(dict(session), separators=(',', ':'))
+        try:
+            self.store.set(session.sid, payload, self.ttl)
+        except Exception as e:
+            logger.error(f"Session store write failed: {e}")
+            return
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+
+def create_interface(cfg):
+    """The session interface for SESSION_BACKEND ('redis', 'memory' or 'cookie')"""
+    backend = cfg.SESSION_BACKEND
+    if backend not in ('redis', 'memory', 'cookie'):
+        raise ValueError(f"SESSION_BACKEND must be redis, memory or cookie, not {backend!r}")
+    if backend == 'redis' and (redis is None or not cfg.REDIS_URL):
+        # An in-process store would lose sessions between workers, the cookie does not
+        logger.warning("Redis sessions need redis and REDIS_URL, keeping sessions in the signed cookie")
+        backend = 'cookie'
+    if backend == 'cookie':
+        return SecureCookieSessionInterface()
+    return ServerSideSessionInterface.from_config(cfg)
+
+
+session_interface = create_interface(get_config())
+
+
+def configure(cfg):
+    """Rebuild the session interface from a configuration class"""
+    global session_interface
+    session_interface = create_interface(cfg)
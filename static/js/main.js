@@ -215,6 +215,91 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
+// Trailer API URL for a title, with the card's Trakt/IMDb/TMDB ids and year
+// so the server can answer from its trailer store
+function trailerUrl(movieTitle, button) {
+    const params = new URLSearchParams();
+    const card = button && button.closest('[data-movie-title]');
+    if (card) {
+        const fields = {trakt: 'traktId', imdb: 'imdbId', tmdb: 'tmdbId', year: 'year'};
+        for (const [name, key] of Object.entries(fields)) {
+            if (card.dataset[key]) {
+                params.set(name, card.dataset[key]);
+            }
+        }
+    }
+    const query = params.toString();
+    return `/api/trailer/${encodeURIComponent(movieTitle)}` + (query ? `?${query}` : '');
+}
+
+// Load more: fetch the next page of a paginated API and append its cards.
+// The button carries the API URL, the grid to fill, the card style
+// ('new-movie' or 'movie') and the opaque cursor for the next page.
+function buildMovieCard(movie, style) {
+    const card = document.createElement('div');
+    card.className = `${style}-card`;
+    card.dataset.movieTitle = movie.title;
+    const ids = movie.ids || {};
+    if (ids.trakt) card.dataset.traktId = ids.trakt;
+    if (ids.imdb) card.dataset.imdbId = ids.imdb;
+    if (ids.tmdb) card.dataset.tmdbId = ids.tmdb;
+    if (movie.year) card.dataset.year = movie.year;
+
+    function element(tag, className, text) {
+        const node = document.createElement(tag);
+        node.className = className;
+        if (text !== undefined) node.textContent = text;
+        return node;
+    }
+
+    const poster = element('div', `${style}-poster`);
+    const placeholder = element('div', `${style}-poster-placeholder`);
+    placeholder.appendChild(element('span', `${style}-initial`, movie.title.charAt(0)));
+    poster.appendChild(placeholder);
+    const overlay = element('div', `${style}-overlay`);
+    const button = element('button', 'play-trailer-btn', '▶️ Watch Trailer');
+    button.addEventListener('click', () => playTrailer(movie.title, button));
+    overlay.appendChild(button);
+    poster.appendChild(overlay);
+    card.appendChild(poster);
+
+    const info = element('div', `${style}-info`);
+    info.appendChild(element('h3', `${style}-title`, movie.title));
+    info.appendChild(element('p', `${style}-year`, movie.year || ''));
+    const genre = (movie.genre || '').replace(/_/g, ' ').replace(/\b\w/g, c => c.toUpperCase());
+    info.appendChild(element('p', `${style}-genre`, genre));
+    if (movie.country) {
+        info.appendChild(element('p', `${style}-country`, movie.country));
+    }
+    card.appendChild(info);
+    return card;
+}
+
+function loadMore(button) {
+    const grid = document.querySelector(button.dataset.grid);
+    const url = new URL(button.dataset.url, window.location.origin);
+    url.searchParams.set('cursor', button.dataset.cursor);
+    button.disabled = true;
+
+    fetch(url)
+        .then(response => response.json())
+        .then(data => {
+            (data.movies || []).forEach(movie => {
+                grid.appendChild(buildMovieCard(movie, button.dataset.card));
+            });
+            if (data.next_cursor) {
+                button.dataset.cursor = data.next_cursor;
+                button.disabled = false;
+            } else {
+                button.remove();
+            }
+        })
+        .catch(error => {
+            console.error('Error loading more movies:', error);
+            button.disabled = false;
+        });
+}
+
 // Loading animation for API calls
 function showLoading(element) {
     element.style.opacity = '0.6';
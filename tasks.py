@@ -0,0 +1,40 @@
+"""
+Celery tasks for multi-node installs.
+
+Run a worker with the beat scheduler to keep the catalog snapshot fresh:
+    celery -A tasks worker --beat --loglevel=info
+Set CATALOG_REFRESH_MODE=celery on the web nodes so they only read snapshots.
+"""
+
+from celery import Celery
+
+from config import get_config
+
+cfg = get_config()
+
+celery_app = Celery('cinematic', broker=cfg.CELERY_BROKER_URL)
+celery_app.conf.beat_schedule = {
+    'refresh-catalog': {
+        'task': 'tasks.refresh_catalog',
+        'schedule': cfg.CATALOG_REFRESH_INTERVAL
+    }
+}
+
+
+_web_app = None
+
+
+def catalog_refresher():
+    """The catalog refresher of an app built once per worker process"""
+    global _web_app
+    if _web_app is None:
+        from app import create_app
+        # preload: the task runs refreshes itself, so no refresher thread
+        _web_app = create_app(cfg, preload=True)
+    return _web_app.extensions['cinematic'].catalog_refresher
+
+
+@celery_app.task(name='tasks.refresh_catalog', ignore_result=True)
+def refresh_catalog():
+    """Rebuild and publish the Trakt catalog snapshot"""
+    return catalog_refresher().refresh_once()
@@ -0,0 +1,179 @@
+"""Tests for the app routes and batch API endpoints"""
+
+import pytest
+
+import app as appmod
+import deadline
+from benchmarks import stubs
+
+STUB_PORT = 19470
+
+
+@pytest.fixture
+def client(offline_config):
+    return appmod.create_app(offline_config).test_client()
+
+
+def test_apps_keep_their_own_configuration(offline_config):
+    class StrictConfig(offline_config):
+        PROFILE_BATCH_MAX_SIZE = 1
+        RATE_LIMIT_MAX_REQUESTS = 1
+
+    first = appmod.create_app(offline_config)
+    strict = appmod.create_app(StrictConfig)
+    assert first.extensions['cinematic'].catalog_store is not strict.extensions['cinematic'].catalog_store
+
+    body = {'answers': [['quiet_night'], ['wild_party']]}
+    assert strict.test_client().post('/api/profile/batch', json=body).status_code == 413
+    # Building the strict app changed neither the limits nor the limiter of the first
+    client = first.test_client()
+    for _ in range(3):
+        assert client.post('/api/profile/batch', json=body).status_code == 200
+
+
+def test_route_deadline_is_read_from_the_app_serving_the_request(offline_config):
+    @appmod.request_deadline
+    def api_movies():
+        return deadline.remaining()
+
+    class QuickConfig(offline_config):
+        ROUTE_DEADLINES = {'api_movies': 0.5}
+
+    class UnboundedConfig(offline_config):
+        ROUTE_DEADLINES = {}
+
+    quick = appmod.create_app(QuickConfig)
+    unbounded = appmod.create_app(UnboundedConfig)
+    with quick.test_request_context():
+        assert 0 < api_movies() <= 0.5
+    with unbounded.test_request_context():
+        assert api_movies() is None
+
+
+def test_profile_batch_scores_each_answer_set(client):
+    response = client.post('/api/profile/batch', json={'answers': [
+        ['quiet_night', 'creative_artist'],
+        {'q1': 'tech_enthusiast', 'q2': 'puzzle_solving'}
+    ]})
+    assert response.status_code == 200
+    profiles = response.get_json()['profiles']
+    assert len(profiles) == 2
+    assert all(profile['profile_name'] for profile in profiles)
+
+
+@pytest.mark.parametrize('body', [
+    None,
+    {'answers': 'quiet_night'},
+    {'answers': ['quiet_night']},
+    {'answers': [['not_an_option']]},
+    {'answers': [[1, 2]]},
+    {'answers': [{'q1': None}]}
+])
+def test_profile_batch_rejects_malformed_bodies(client, body):
+    response = client.post('/api/profile/batch', json=body)
+    assert response.status_code == 400
+
+
+def test_profile_batch_rejects_oversized_batches(client):
+    response = client.post('/api/profile/batch', json={'answers': [['quiet_night']] * 3})
+    assert response.status_code == 413
+
+
+def test_streaming_batch_answers_every_title_and_id(client):
+    response = client.post('/api/streaming/batch', json={'titles': ['Heat'], 'trakt_ids': [42]})
+    assert response.status_code == 200
+    streaming = response.get_json()['streaming']
+    assert set(streaming) == {'Heat', 'trakt:42'}
+    # Without a Trakt key an id missing from the catalog cannot be resolved
+    assert streaming['trakt:42'] is None
+
+
+@pytest.fixture
+def trakt_stub():
+    servers = stubs.start(STUB_PORT, stubs.StubProfile(latency=0, jitter=0))
+    yield stubs.base_urls(STUB_PORT)['TRAKT_API_URL']
+    for server in servers.values():
+        server.shutdown()
+        server.server_close()
+
+
+def test_streaming_batch_resolves_ids_missing_from_the_catalog(offline_config, trakt_stub):
+    class TraktConfig(offline_config):
+        TRAKT_CLIENT_ID = 'test'
+        TRAKT_API_URL = trakt_stub
+
+    client = appmod.create_app(TraktConfig).test_client()
+    response = client.post('/api/streaming/batch', json={'trakt_ids': [1005, 5]})
+    streaming = response.get_json()['streaming']
+    # 1005 is a stub movie, 5 is unknown to Trakt
+    assert streaming['trakt:1005'] is not None
+    assert streaming['trakt:5'] is None
+
+
+def test_trailer_batch_answers_every_title(client):
+    response = client.post('/api/trailer/batch', json={'titles': ['Heat', 'Alien']})
+    assert response.status_code == 200
+    assert set(response.get_json()['trailers']) == {'Heat', 'Alien'}
+
+
+@pytest.mark.parametrize('endpoint', ['/api/streaming/batch', '/api/trailer/batch'])
+@pytest.mark.parametrize('body, status', [
+    ({}, 400),
+    ({'titles': 'Heat'}, 400),
+    ({'titles': ['']}, 400),
+    ({'trakt_ids': ['42']}, 400),
+    ({'trakt_ids': [True]}, 400),
+    ({'titles': ['A', 'B'], 'trakt_ids': [1, 2]}, 413)
+])
+def test_batch_rejects_malformed_or_oversized_bodies(client, endpoint, body, status):
+    assert client.post(endpoint, json=body).status_code == status
+
+def test_news_ranks_title_with_movie_keyword_first(client):
+    articles = [
+        {'title': 'Weather report', 'description': 'Heat wave', 'publishedAt': '2024-03-01'},
+        {'title': 'Heat returns', 'description': 'A sequel is planned', 'publishedAt': '2024-01-01'},
+        {'title': 'Classic', 'description': 'Heat is the best heist film', 'publishedAt': '2023-01-01'},
+        {'title': 'Markets', 'description': 'Stocks rise', 'publishedAt': '2024-05-01'}
+    ]
+    ranked = appmod.rank_news_articles(articles, 'Heat')
+    assert [article['title'] for article in ranked] == [
+        'Classic', 'Heat returns', 'Weather report', 'Markets'
+    ]
+
+
+def test_genre_feed_pages_stay_inside_the_genre(offline_config, trakt_stub):
+    class TraktConfig(offline_config):
+        TRAKT_CLIENT_ID = 'test'
+        TRAKT_API_URL = trakt_stub
+
+    client = appmod.create_app(TraktConfig).test_client()
+    seen, cursor = [], None
+    for _ in range(6):
+        query = {'limit': 10, **({'cursor': cursor} if cursor else {})}
+        body = client.get('/api/movies/drama', query_string=query).get_json()
+        assert all('drama' in movie['genres'] for movie in body['movies'])
+        seen.extend(movie['ids']['trakt'] for movie in body['movies'])
+        cursor = body['next_cursor']
+    # The ranking runs out after two pages and Trakt's genre feed takes over,
+    # skipping the movies the ranking already showed
+    assert len(seen) > 30
+    assert len(set(seen)) == len(seen)
+
+
+def test_new_movies_page_is_buffered_and_cacheable(offline_config, trakt_stub):
+    # The stubs answer every upstream, so nothing falls back to default data
+    settings = dict(stubs.base_urls(STUB_PORT), STREAM_RENDERING=True, TRAKT_CLIENT_ID='test',
+                    WATCHMODE_API_KEY='test', NEWS_API_KEY='test', YOUTUBE_API_KEY='test')
+    client = appmod.create_app(type('StubConfig', (offline_config,), settings)).test_client()
+    response = client.get('/new-movies')
+    assert response.status_code == 200
+    assert 'max-age' in response.headers['Cache-Control']
+    etag = response.headers['ETag']
+    assert client.get('/new-movies', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_new_movies_from_mock_data_is_not_stored(client):
+    response = client.get('/new-movies')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-store'
+    assert 'ETag' not in response.headers
@@ -0,0 +1,187 @@
+"""End-to-end tests for the ASGI adapter"""
+
+import asyncio
+import threading
+
+import pytest
+from flask import Response, g, request, session, stream_with_context
+
+import app as appmod
+import asgi
+from app import CinematicFlask
+
+
+class Client:
+    """Drives an ASGI app the way an HTTP server would"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def request(self, method, path, body=b'', headers=(), disconnect=None):
+        """Return ``(status, headers, body)``; ``disconnect`` is an event that hangs up the client"""
+        sent = []
+
+        async def main():
+            messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+            gone = asyncio.Event()
+            if disconnect is not None:
+                loop = asyncio.get_running_loop()
+                threading.Thread(target=lambda: disconnect.wait(5) and loop.call_soon_threadsafe(gone.set),
+                                 daemon=True).start()
+
+            async def receive():
+                if messages:
+                    return messages.pop(0)
+                await gone.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+
+            path_info, _, query = path.partition('?')
+            scope = {
+                'type': 'http', 'method': method, 'path': path_info, 'query_string': query.encode(),
+                'root_path': '', 'scheme': 'http', 'http_version': '1.1',
+                'server': ('127.0.0.1', 8000), 'client': ('127.0.0.1', 5555),
+                'headers': [(name.lower().encode(), value.encode()) for name, value in headers]
+            }
+            await self.app(scope, receive, send)
+
+        asyncio.run(main())
+        if not sent:
+            return None, {}, b''
+        response_headers = {name.decode(): value.decode() for name, value in sent[0]['headers']}
+        return sent[0]['status'], response_headers, b''.join(m.get('body', b'') for m in sent[1:])
+
+
+@pytest.fixture
+def events():
+    return []
+
+
+@pytest.fixture
+def client(events):
+    flask_app = CinematicFlask(__name__)
+    flask_app.secret_key = 'test'
+    view_cancelled = threading.Event()
+    flask_app.config['view_cancelled'] = view_cancelled
+
+    @flask_app.before_request
+    def before():
+        g.user = request.args.get('user', 'anonymous')
+        if request.path == '/blocked':
+            return 'blocked', 403
+
+    @flask_app.after_request
+    def after(response):
+        response.headers['X-User'] = g.user
+        return response
+
+    @flask_app.teardown_request
+    def teardown(error):
+        events.append(('teardown', type(error).__name__ if error else None))
+
+    @flask_app.route('/hello')
+    async def hello():
+        await asyncio.sleep(0)
+        return f'hello {g.user}'
+
+    @flask_app.route('/count')
+    def count():
+        session['count'] = session.get('count', 0) + 1
+        return str(session['count'])
+
+    @flask_app.route('/stream')
+    def stream():
+        def chunks():
+            for i in range(3):
+                yield f'{request.args.get("user")}{i};'
+        return Response(stream_with_context(chunks()))
+
+    @flask_app.route('/broken')
+    async def broken():
+        raise LookupError('missing')
+
+    @flask_app.errorhandler(LookupError)
+    def lookup_error(error):
+        return f'handled {error}', 404
+
+    @flask_app.route('/slow')
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            view_cancelled.set()
+            raise
+        return 'too late'
+
+    return Client(asgi.AsgiAdapter(flask_app))
+
+
+def test_hooks_wrap_async_views(client):
+    status, headers, body = client.request('GET', '/hello?user=ann')
+    assert (status, body) == (200, b'hello ann')
+    assert headers['x-user'] == 'ann'
+
+
+def test_before_request_can_answer_for_the_view(client):
+    status, headers, body = client.request('GET', '/blocked')
+    assert (status, body, headers['x-user']) == (403, b'blocked', 'anonymous')
+
+
+def test_session_round_trips_through_the_cookie(client):
+    _, headers, body = client.request('GET', '/count')
+    assert body == b'1'
+    cookie = headers['set-cookie'].split(';')[0]
+    _, _, body = client.request('GET', '/count', headers=[('Cookie', cookie)])
+    assert body == b'2'
+
+
+def test_streamed_body_keeps_its_request_context(client):
+    status, _, body = client.request('GET', '/stream?user=bo')
+    assert (status, body) == (200, b'bo0;bo1;bo2;')
+
+
+def test_error_handlers_answer_view_and_routing_errors(client, events):
+    status, _, body = client.request('GET', '/broken')
+    assert (status, body) == (404, b'handled missing')
+    status, _, _ = client.request('GET', '/nowhere')
+    assert status == 404
+    # Handled errors do not reach teardown
+    assert events == [('teardown', None), ('teardown', None)]
+
+
+def test_disconnect_cancels_the_running_view(client):
+    flask_app = client.app.app
+    disconnect = threading.Event()
+    threading.Timer(0.1, disconnect.set).start()
+    status, _, _ = client.request('GET', '/slow', disconnect=disconnect)
+    assert status is None
+    assert flask_app.config['view_cancelled'].wait(2)
+
+
+def test_lifespan_is_acknowledged(client):
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message['type'])
+
+    asyncio.run(client.app({'type': 'lifespan'}, receive, send))
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+
+
+def test_quiz_then_streamed_recommendations_on_the_app(offline_config):
+    client = Client(asgi.AsgiAdapter(appmod.create_app(offline_config)))
+    status, headers, _ = client.request(
+        'POST', '/process_quiz', b'q1=puzzle_solving&q2=tech_enthusiast',
+        headers=[('Content-Type', 'application/x-www-form-urlencoded')]
+    )
+    assert (status, headers['location']) == (302, '/recommendations')
+    cookie = headers['set-cookie'].split(';')[0]
+    status, headers, body = client.request('GET', '/recommendations', headers=[('Cookie', cookie)])
+    assert status == 200
+    assert b'movie-card' in body
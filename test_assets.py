@@ -0,0 +1,84 @@
+"""Tests for fingerprinted, precompressed static assets"""
+
+import gzip
+import json
+import os
+
+import pytest
+
+import assets
+from app import CinematicFlask
+
+CSS = b'body { color: #222; }\n' * 50
+
+
+@pytest.fixture
+def static_folder(tmp_path):
+    folder = tmp_path / 'static'
+    (folder / 'css').mkdir(parents=True)
+    (folder / 'css' / 'style.css').write_bytes(CSS)
+    (folder / 'logo.png').write_bytes(b'\x89PNG' + bytes(range(64)))
+    return str(folder)
+
+
+@pytest.fixture
+def app(static_folder):
+    app = CinematicFlask(__name__, static_folder=static_folder)
+    app.add_template_global(assets.asset_url)
+    return app
+
+
+def test_fingerprint_follows_the_content():
+    name = assets.fingerprint('css/style.css', CSS)
+    assert name.startswith('css/style.') and name.endswith('.css')
+    assert name == assets.fingerprint('css/style.css', CSS)
+    assert name != assets.fingerprint('css/style.css', CSS + b' ')
+
+
+def test_build_writes_the_manifest_and_compressed_copies(static_folder):
+    manifest = assets.build(static_folder)
+    dist = os.path.join(static_folder, assets.DIST_DIR)
+    css = manifest['css/style.css']
+    assert css['path'] == assets.fingerprint('css/style.css', CSS)
+    assert 'gzip' in css['encodings']
+    with open(os.path.join(dist, css['path'] + '.gz'), 'rb') as f:
+        assert gzip.decompress(f.read()) == CSS
+    # Binary formats are copied as they are
+    assert manifest['logo.png']['encodings'] == []
+    with open(os.path.join(dist, assets.MANIFEST_NAME)) as f:
+        assert json.load(f) == manifest
+    # A rebuild does not fingerprint its own output
+    assert set(assets.build(static_folder)) == {'css/style.css', 'logo.png'}
+
+
+def test_asset_url_uses_the_build_when_there_is_one(app, static_folder):
+    with app.test_request_context():
+        assert assets.asset_url('css/style.css') == '/static/css/style.css'
+        manifest = assets.build(static_folder)
+        assert assets.asset_url('css/style.css') == f"/static/dist/{manifest['css/style.css']['path']}"
+        assert assets.asset_url('missing.js') == '/static/missing.js'
+
+
+def test_fingerprinted_files_are_immutable_and_precompressed(app, static_folder):
+    path = assets.build(static_folder)['css/style.css']['path']
+    client = app.test_client()
+
+    response = client.get(f'/static/dist/{path}', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Cache-Control'] == assets.IMMUTABLE
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.mimetype == 'text/css'
+    assert gzip.decompress(response.data) == CSS
+
+    response = client.get(f'/static/dist/{path}')
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == CSS
+
+
+def test_unfingerprinted_files_are_served_as_before(app, static_folder):
+    assets.build(static_folder)
+    client = app.test_client()
+    response = client.get('/static/css/style.css', headers={'Accept-Encoding': 'gzip'})
+    assert response.data == CSS
+    assert response.headers.get('Cache-Control') != assets.IMMUTABLE
+    assert client.get(f'/static/dist/{assets.MANIFEST_NAME}').headers.get('Cache-Control') != assets.IMMUTABLE
@@ -0,0 +1,121 @@
+"""Tests for the tiered upstream response cache"""
+
+import asyncio
+
+import pytest
+
+import cache
+from cache import NOT_MODIFIED, LRUCache, TieredCache, Validated
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'time', lambda: now[0])
+    return now
+
+
+class Loader:
+    """Loader that records the validators it was called with"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = []
+
+    def __call__(self, validators):
+        self.calls.append(validators)
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def settle(store):
+    """Wait for background revalidations to finish"""
+    store._refresher.submit(lambda: None).result(5)
+    store._refresher.submit(lambda: None).result(5)
+
+
+def test_lru_evicts_the_least_recently_used():
+    lru = LRUCache(maxsize=2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    lru.get('a')
+    lru.set('c', 3)
+    assert lru.get('b') is None
+    assert (lru.get('a'), lru.get('c')) == (1, 3)
+
+
+def test_fresh_entry_is_served_without_loading(clock):
+    store = TieredCache({'trakt.list': 60})
+    load = Loader('trending')
+    assert store.get_or_load('trakt.list', 'k', load) == 'trending'
+    clock[0] += 59
+    assert store.get_or_load('trakt.list', 'k', load) == 'trending'
+    assert len(load.calls) == 1
+    assert store.stats()['endpoints']['trakt.list']['hits'] == 1
+
+
+def test_endpoints_without_a_ttl_are_not_cached(clock):
+    store = TieredCache({'trakt.list': 60})
+    load = Loader('a', 'b')
+    assert store.get_or_load('news', 'k', load) == 'a'
+    assert store.get_or_load('news', 'k', load) == 'b'
+
+
+def test_none_is_returned_but_not_cached(clock):
+    store = TieredCache({'trakt.list': 60})
+    load = Loader(None, 'trending')
+    assert store.get_or_load('trakt.list', 'k', load) is None
+    assert store.get_or_load('trakt.list', 'k', load) == 'trending'
+
+
+def test_stale_entry_is_served_while_it_revalidates(clock):
+    store = TieredCache({'trakt.list': 60}, stale_factor=1.0)
+    load = Loader('old', 'new')
+    store.get_or_load('trakt.list', 'k', load)
+    clock[0] += 90
+    assert store.get_or_load('trakt.list', 'k', load) == 'old'
+    settle(store)
+    assert store.get_or_load('trakt.list', 'k', load) == 'new'
+    assert store.stats()['endpoints']['trakt.list']['stale_hits'] == 1
+
+
+def test_expired_entry_is_reloaded_and_served_if_the_reload_fails(clock):
+    store = TieredCache({'trakt.list': 60}, stale_factor=1.0)
+    load = Loader('old', ConnectionError('upstream down'))
+    store.get_or_load('trakt.list', 'k', load)
+    clock[0] += 150
+    assert store.get_or_load('trakt.list', 'k', load) == 'old'
+    assert len(load.calls) == 2
+
+
+def test_reload_sends_the_held_validators_and_renews_on_not_modified(clock):
+    store = TieredCache({'trakt.list': 60}, stale_factor=0)
+    load = Loader(Validated('trending', {'ETag': '"v1"'}), NOT_MODIFIED, 'fresh')
+    assert store.get_or_load('trakt.list', 'k', load) == 'trending'
+    clock[0] += 61
+    assert store.get_or_load('trakt.list', 'k', load) == 'trending'
+    assert load.calls[1] == {'ETag': '"v1"'}
+    assert store.stats()['endpoints']['trakt.list']['not_modified'] == 1
+    # Not modified started a new TTL for the held value
+    clock[0] += 59
+    assert store.get_or_load('trakt.list', 'k', load) == 'trending'
+    assert len(load.calls) == 2
+
+
+def test_async_lookup_shares_entries_and_revalidates_in_the_background(clock):
+    store = TieredCache({'trakt.list': 60}, stale_factor=1.0)
+    results = ['old', 'new']
+
+    async def load(validators):
+        return results.pop(0)
+
+    async def main():
+        first = await store.get_or_load_async('trakt.list', 'k', load)
+        clock[0] += 90
+        stale = await store.get_or_load_async('trakt.list', 'k', load)
+        await asyncio.gather(*store._async_refreshes)
+        return first, stale, await store.get_or_load_async('trakt.list', 'k', load)
+
+    assert asyncio.run(main()) == ('old', 'old', 'new')
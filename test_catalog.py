@@ -0,0 +1,77 @@
+"""Tests for catalog snapshots and their refresher"""
+
+import asyncio
+
+import pytest
+
+from catalog import CatalogRefresher, CatalogSnapshot, SnapshotStore, movie_key
+
+HEAT = {'title': 'Heat', 'year': 1995, 'ids': {'trakt': 2}}
+ALIEN = {'title': 'Alien', 'year': 1979, 'ids': {}}
+
+
+def snapshot(version=1, lists=None):
+    return CatalogSnapshot(version, 0, lists or {'trending': [HEAT, ALIEN]}, {'trakt:2': {'streaming': []}})
+
+
+def test_movie_key():
+    assert movie_key(HEAT) == 'trakt:2'
+    assert movie_key(ALIEN) == 'title:alien:1979'
+
+
+def test_snapshot_hands_out_copies():
+    current = snapshot(lists={'trending': [HEAT], 'popular': []})
+    assert current.list_names == ['trending']
+    assert current.movies('popular') is None
+    current.movies('trending')[0]['title'] = 'changed'
+    assert current.movie_for_key('trakt:2')['title'] == 'Heat'
+    assert current.enrichment_for(HEAT) == {'streaming': []}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path / 'catalog' / 'snapshot.json'), check_interval=0)
+
+
+def test_published_snapshot_is_read_by_other_stores(store):
+    assert store.current() is None
+    store.publish(snapshot())
+    other = SnapshotStore(store.path, check_interval=0)
+    assert other.current().version == 1
+    assert other.current().movies('trending') == [HEAT, ALIEN]
+
+
+def test_older_snapshot_on_disk_does_not_replace_a_newer_one(store):
+    reader = SnapshotStore(store.path, check_interval=0)
+    store.publish(snapshot(version=2))
+    assert reader.current().version == 2
+    store.publish(snapshot(version=1))
+    assert reader.current().version == 2
+
+
+def test_corrupt_snapshot_keeps_the_last_good_one(store):
+    store.publish(snapshot())
+    with open(store.path, 'w', encoding='utf-8') as f:
+        f.write('{not json')
+    assert store.current().version == 1
+
+
+def test_current_async_matches_current(store):
+    store.publish(snapshot(version=3))
+    reader = SnapshotStore(store.path, check_interval=0)
+    assert asyncio.run(reader.current_async()).version == 3
+
+
+def test_refresh_publishes_and_runs_the_hook(store):
+    published = []
+    refresher = CatalogRefresher(store, snapshot, on_publish=published.append)
+    assert refresher.refresh_once() == 1
+    assert store.current().version == 1
+    assert [s.version for s in published] == [1]
+
+
+@pytest.mark.parametrize('builder', [lambda: None, lambda: 1 / 0])
+def test_failed_refresh_keeps_the_previous_snapshot(store, builder):
+    store.publish(snapshot())
+    assert CatalogRefresher(store, builder).refresh_once() is None
+    assert store.current().version == 1
@@ -0,0 +1,96 @@
+"""Tests for the per-upstream circuit breakers"""
+
+import asyncio
+
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+def failing():
+    raise ConnectionError('upstream down')
+
+
+def tripped(open_seconds=0, **kwargs):
+    breaker = CircuitBreaker('trakt', minimum_calls=2, open_seconds=open_seconds, **kwargs)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(failing, lambda result: False)
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_opens_once_the_failure_rate_is_crossed():
+    breaker = CircuitBreaker('trakt', minimum_calls=4, failure_rate=0.5, open_seconds=60)
+    breaker.call(lambda: 200, lambda status: status >= 500)
+    breaker.call(lambda: 200, lambda status: status >= 500)
+    breaker.call(lambda: 503, lambda status: status >= 500)
+    assert breaker.state == CLOSED
+    breaker.call(lambda: 503, lambda status: status >= 500)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 200, lambda status: False)
+
+
+def test_successful_probe_closes():
+    breaker = tripped()
+    assert breaker.call(lambda: 'ok', lambda result: False) == 'ok'
+    assert breaker.state == CLOSED
+
+
+def test_failed_probe_reopens():
+    breaker = tripped()
+    with pytest.raises(ConnectionError):
+        breaker.call(failing, lambda result: False)
+    assert breaker.state == OPEN
+
+
+def test_half_open_admits_only_the_probe_budget():
+    breaker = tripped(half_open_probes=1)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_cancelled_probe_releases_its_slot():
+    breaker = tripped()
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def main():
+        probe = asyncio.ensure_future(breaker.call_async(hang, lambda result: False))
+        await asyncio.sleep(0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(main())
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def test_probe_that_outruns_its_timeout_counts_as_failed(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, 'time', lambda: now[0])
+    breaker = tripped(open_seconds=30, probe_timeout=15)
+    now[0] += 30
+    assert breaker.allow()
+    assert not breaker.allow()
+    now[0] += 15
+    # The next caller finds the probe timed out and the breaker open again
+    assert not breaker.allow()
+    assert breaker.state == OPEN
+
+
+def test_late_outcome_of_a_timed_out_probe_is_dropped(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, 'time', lambda: now[0])
+    breaker = tripped(open_seconds=30, probe_timeout=15)
+    now[0] += 30
+    generation = breaker._admit()
+    now[0] += 15
+    assert not breaker.allow()
+    breaker.record(False, generation)
+    assert breaker.state == OPEN
@@ -0,0 +1,164 @@
+"""Tests for single-flight coalescing of upstream calls"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+import deadline
+from coalesce import AsyncSingleFlight, SingleFlight
+
+
+def test_concurrent_calls_share_one_call():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return 'trending'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do('trakt', fetch))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while flights.coalesced < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == ['trending'] * 5
+    assert flights.in_flight() == 0
+
+
+def test_error_reaches_caller_and_clears_key():
+    flights = SingleFlight()
+
+    def fail():
+        raise ValueError('upstream down')
+
+    with pytest.raises(ValueError):
+        flights.do('trakt', fail)
+    assert flights.in_flight() == 0
+    assert flights.do('trakt', lambda: 'ok') == 'ok'
+
+
+def test_async_concurrent_calls_share_one_call():
+    flights = AsyncSingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'trending'
+
+    async def main():
+        return await asyncio.gather(*(flights.do('trakt', fetch) for _ in range(5)))
+
+    assert asyncio.run(main()) == ['trending'] * 5
+    assert calls == [1]
+    assert flights.coalesced == 4
+    assert flights.in_flight() == 0
+
+
+def test_async_cancelled_caller_does_not_fail_the_others():
+    flights = AsyncSingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return 'trending'
+
+    async def main():
+        first = asyncio.ensure_future(flights.do('trakt', fetch))
+        second = asyncio.ensure_future(flights.do('trakt', fetch))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == 'trending'
+
+
+def test_async_call_outlives_the_first_callers_deadline():
+    flights = AsyncSingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return deadline.remaining()
+
+    async def impatient():
+        with deadline.budget(0.01):
+            return await flights.do('trakt', fetch)
+
+    async def main():
+        first = asyncio.ensure_future(impatient())
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flights.do('trakt', fetch))
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    first, second = asyncio.run(main())
+    assert isinstance(first, deadline.DeadlineExceeded)
+    # The patient caller has no deadline, so neither has the shared call
+    assert second is None
+
+
+def test_async_call_runs_under_its_callers_deadline():
+    flights = AsyncSingleFlight()
+
+    async def fetch():
+        return deadline.remaining()
+
+    async def main():
+        with deadline.budget(5):
+            return await flights.do('trakt', fetch)
+
+    assert 4 < asyncio.run(main()) <= 5
+
+
+def test_async_call_deadline_moves_out_for_a_later_caller():
+    flights = AsyncSingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return deadline.remaining()
+
+    async def call(seconds):
+        with deadline.budget(seconds):
+            return await flights.do('trakt', fetch)
+
+    async def main():
+        first = asyncio.ensure_future(call(0.01))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(call(5))
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    first, second = asyncio.run(main())
+    assert isinstance(first, deadline.DeadlineExceeded)
+    assert 4 < second <= 5
+
+
+def test_async_call_is_cancelled_when_its_last_caller_leaves():
+    flights = AsyncSingleFlight()
+    cancelled = []
+
+    async def fetch():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def main():
+        with deadline.budget(0.02):
+            with pytest.raises(deadline.DeadlineExceeded):
+                await flights.do('trakt', fetch)
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert cancelled == [1]
+    assert flights.in_flight() == 0
@@ -0,0 +1,70 @@
+"""Tests for per-request deadline budgets"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import deadline
+import http_client
+
+
+def test_no_budget_means_no_deadline():
+    assert deadline.remaining() is None
+    assert not deadline.expired()
+    assert deadline.cap_timeout((3.05, 10)) == (3.05, 10)
+
+
+def test_budget_applies_only_inside_the_block():
+    with deadline.budget(5):
+        assert 4 < deadline.remaining() <= 5
+        assert not deadline.expired()
+    assert deadline.remaining() is None
+
+
+def test_timeouts_are_capped_to_what_is_left():
+    with deadline.budget(2):
+        connect, read = deadline.cap_timeout((3.05, 10))
+        assert connect <= 2 and read <= 2
+        assert deadline.cap_timeout(1) == 1
+        assert deadline.cap_timeout(None) <= 2
+
+
+def test_spent_budget_raises_a_timeout():
+    with deadline.budget(0):
+        assert deadline.expired()
+        with pytest.raises(deadline.DeadlineExceeded):
+            deadline.cap_timeout(10)
+
+
+def test_submitted_work_inherits_the_deadline():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(deadline.remaining).result() is None
+        with deadline.budget(5):
+            assert deadline.submit(executor, deadline.remaining).result() > 4
+
+
+def test_detached_context_has_no_deadline():
+    with deadline.budget(5):
+        assert deadline.detached_context().run(deadline.remaining) is None
+        assert deadline.remaining() is not None
+
+
+def test_upstream_call_fails_fast_once_the_budget_is_spent(monkeypatch):
+    monkeypatch.setattr(http_client.upstream_snapshot.snapshot, 'mode', 'live')
+
+    def unreachable(*args, **kwargs):
+        raise AssertionError('no request should be sent')
+
+    monkeypatch.setattr(http_client.client, 'get', unreachable)
+    with deadline.budget(0):
+        with pytest.raises(deadline.DeadlineExceeded):
+            http_client.fetch('https://api.trakt.tv/movies/trending')
+
+
+def test_extend_only_moves_a_deadline_out():
+    with deadline.budget(1):
+        context = deadline.context_until(deadline.current())
+    deadline.extend(context, 0)
+    assert context.run(deadline.current) > 0
+    deadline.extend(context, None)
+    assert context.run(deadline.remaining) is None
@@ -0,0 +1,64 @@
+"""Tests for the pooled upstream HTTP client"""
+
+import threading
+
+import pytest
+
+import http_client
+
+
+def test_cache_key_leaves_out_credentials():
+    key = http_client.cache_key('newsapi.everything', 'https://newsapi.org/v2/everything',
+                                {'q': 'Heat', 'apiKey': 'secret'})
+    assert 'secret' not in key
+    assert key == http_client.cache_key('newsapi.everything', 'https://newsapi.org/v2/everything',
+                                        {'q': 'Heat', 'apiKey': 'other'})
+
+
+def test_fast_first_attempt_is_not_hedged():
+    calls = []
+
+    def attempt():
+        calls.append(1)
+        return 'articles'
+
+    assert http_client._hedged(attempt, 1.0) == 'articles'
+    assert calls == [1]
+
+
+def test_slow_first_attempt_is_raced_by_a_duplicate():
+    release = threading.Event()
+    calls = []
+
+    def attempt():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)
+            return 'slow'
+        return 'hedged'
+
+    try:
+        assert http_client._hedged(attempt, 0.05) == 'hedged'
+    finally:
+        release.set()
+    assert len(calls) == 2
+
+
+def test_hedge_raises_only_when_both_attempts_fail():
+    calls = []
+
+    def attempt():
+        calls.append(1)
+        if len(calls) == 1:
+            threading.Event().wait(0.1)
+            return 'slow'
+        raise ConnectionError('upstream down')
+
+    assert http_client._hedged(attempt, 0.02) == 'slow'
+
+    def failing():
+        threading.Event().wait(0.05)
+        raise ConnectionError('upstream down')
+
+    with pytest.raises(ConnectionError):
+        http_client._hedged(failing, 0.01)
@@ -0,0 +1,65 @@
+"""Tests for the Prometheus metrics"""
+
+import requests
+
+import circuit_breaker
+import deadline
+import metrics
+from metrics import Registry
+
+
+def test_counter_renders_labelled_samples():
+    registry = Registry()
+    calls = registry.counter('calls_total', 'Calls', ('endpoint',))
+    calls.inc('trakt.trending')
+    calls.inc('trakt.trending', amount=2)
+    calls.inc('say "hi"\n')
+    assert registry.render() == (
+        '# HELP calls_total Calls\n'
+        '# TYPE calls_total counter\n'
+        'calls_total{endpoint="trakt.trending"} 3\n'
+        'calls_total{endpoint="say \\"hi\\"\\n"} 1\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    seconds = registry.histogram('seconds', 'Latency', ('route',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        seconds.observe(value, 'index')
+    lines = registry.render().splitlines()[2:]
+    assert lines == [
+        'seconds_bucket{route="index",le="0.1"} 1',
+        'seconds_bucket{route="index",le="1.0"} 3',
+        'seconds_bucket{route="index",le="+Inf"} 4',
+        'seconds_sum{route="index"} 6.05',
+        'seconds_count{route="index"} 4'
+    ]
+
+
+def test_collector_reads_values_at_scrape_time():
+    registry = Registry()
+    state = {('trakt',): 0}
+    registry.collector('open', 'Open', 'gauge', ('upstream',), lambda: state)
+    state[('trakt',)] = 1
+    assert 'open{upstream="trakt"} 1' in registry.render()
+
+
+def test_error_kinds():
+    assert metrics.error_kind(circuit_breaker.CircuitOpenError('trakt')) == 'circuit_open'
+    assert metrics.error_kind(deadline.DeadlineExceeded()) == 'deadline'
+    assert metrics.error_kind(requests.exceptions.ReadTimeout()) == 'timeout'
+    assert metrics.error_kind(requests.exceptions.ConnectionError()) == 'connection'
+    assert metrics.error_kind(ValueError()) == 'other'
+
+
+def test_record_upstream_counts_statuses_and_errors():
+    class Response:
+        status_code = 503
+
+    before = metrics.UPSTREAM_RESPONSES.value('test.endpoint', '503')
+    metrics.record_upstream('test.endpoint', 0, response=Response())
+    metrics.record_upstream('test.endpoint', 0, error=deadline.DeadlineExceeded())
+    assert metrics.UPSTREAM_RESPONSES.value('test.endpoint', '503') == before + 1
+    assert metrics.UPSTREAM_ERRORS.value('test.endpoint', 'deadline') >= 1
+    assert 'cinematic_upstream_request_seconds_count{endpoint="test.endpoint"}' in metrics.render()
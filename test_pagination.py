@@ -0,0 +1,61 @@
+"""Tests for cursor pagination"""
+
+import base64
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from pagination import (
+    MAX_CURSOR_LENGTH, InvalidCursor, decode_cursor, encode_cursor, page, page_args
+)
+
+
+def raw_cursor(text):
+    return base64.urlsafe_b64encode(text.encode('utf-8')).rstrip(b'=').decode('ascii')
+
+
+def test_cursor_round_trips():
+    position = {'l': 'trending', 'o': 40}
+    cursor = encode_cursor(position)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == position
+
+
+def test_no_position_is_no_cursor():
+    assert encode_cursor(None) is None
+    assert encode_cursor({}) is None
+    assert decode_cursor(None) == {}
+    assert decode_cursor('') == {}
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64!',
+    raw_cursor('not json'),
+    raw_cursor('[1, 2]'),
+    raw_cursor('{"o": -1}'),
+    raw_cursor('{"o": true}'),
+    raw_cursor('{"o": 1.5}'),
+    raw_cursor('{"o": [1]}'),
+    'a' * (MAX_CURSOR_LENGTH + 1)
+])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_page_args_defaults_and_caps_the_limit():
+    assert page_args(MultiDict(), 20, 50) == ({}, 20)
+    assert page_args(MultiDict({'limit': '500'}), 20, 50) == ({}, 50)
+    cursor = encode_cursor({'o': 20})
+    assert page_args(MultiDict({'cursor': cursor, 'limit': '5'}), 20, 50) == ({'o': 20}, 5)
+
+
+def test_page_args_rejects_a_limit_below_one():
+    with pytest.raises(InvalidCursor):
+        page_args(MultiDict({'limit': '0'}))
+
+
+def test_page_body():
+    body = page([{'title': 'Heat'}], {'o': 1}, query='heat')
+    assert body == {'movies': [{'title': 'Heat'}], 'next_cursor': encode_cursor({'o': 1}), 'query': 'heat'}
+    assert page([], None, key='results') == {'results': [], 'next_cursor': None}
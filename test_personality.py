@@ -0,0 +1,56 @@
+"""Tests for the precompiled personality engine"""
+
+import pytest
+
+import personality
+from personality import PersonalityEngine
+
+MAPPING = {
+    'quiet_night': ['Drama', 'Romance'],
+    'road_trip': ['Adventure', 'Comedy'],
+    'puzzle': ['Mystery', 'Drama'],
+    'laugh': ['Comedy']
+}
+PROFILES = {
+    'The Dreamer': {'description': 'Feels it all', 'genres': ['Drama', 'Romance']},
+    'The Explorer': {'description': 'Goes places', 'genres': ['Adventure', 'Comedy']},
+    'The Detective': {'description': 'Asks why', 'genres': ['Mystery']}
+}
+
+
+@pytest.fixture
+def engine():
+    return PersonalityEngine(MAPPING, PROFILES, 'The Explorer', top_n=2)
+
+
+def test_top_genres_break_ties_by_first_appearance(engine):
+    result = engine.score(['puzzle', 'quiet_night'])
+    assert result['traits'] == ['Drama', 'Mystery']
+    assert engine.profile(result['profile_id'])['name'] == 'The Dreamer'
+
+
+def test_unknown_answers_fall_back_to_the_default_profile(engine):
+    assert engine.score({'q1': 'nope'}) == {'traits': [], 'profile_id': 1}
+
+
+def test_match_profile_by_genre_names(engine):
+    assert engine.profile(engine.match_profile(['Mystery', 'Western']))['name'] == 'The Detective'
+
+
+ANSWER_SETS = [
+    ['quiet_night', 'road_trip', 'laugh'],
+    {'a': 'puzzle', 'b': 'puzzle'},
+    ['nope'],
+    [],
+    ['laugh', 'road_trip', 'puzzle', 'quiet_night']
+]
+
+
+def test_batch_matches_one_by_one(engine):
+    assert engine.score_batch(ANSWER_SETS) == [engine.score(answers) for answers in ANSWER_SETS]
+
+
+def test_batch_without_numpy(engine, monkeypatch):
+    expected = engine.score_batch(ANSWER_SETS)
+    monkeypatch.setattr(personality, 'np', None)
+    assert engine.score_batch(ANSWER_SETS) == expected
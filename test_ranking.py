@@ -0,0 +1,63 @@
+"""Tests for genre-aware recommendation ranking"""
+
+import ranking
+from catalog import CatalogSnapshot
+from ranking import GenreIndex, trakt_genres
+
+
+def movie(trakt_id, genres, watchers=0, rating=0):
+    return {'title': f'Movie {trakt_id}', 'ids': {'trakt': trakt_id}, 'genres': genres,
+            'watchers': watchers, 'rating': rating}
+
+
+MOVIES = [
+    movie(1, ['drama'], watchers=50),
+    movie(2, ['drama', 'comedy'], watchers=90),
+    movie(3, ['comedy'], watchers=70),
+    movie(4, ['history'], watchers=10),
+    movie(5, ['war'], watchers=20),
+    movie(6, ['horror'], watchers=5)
+]
+
+
+def titles(movies):
+    return [m['ids']['trakt'] for m in movies]
+
+
+def test_trait_genres():
+    assert trakt_genres('historical') == ('history', 'war')
+    assert trakt_genres('drama') == ('drama',)
+
+
+def test_duplicates_keep_the_copy_with_most_signal():
+    index = GenreIndex(MOVIES + [movie(1, ['drama'], watchers=0, rating=9)])
+    assert [m['watchers'] for m in index.top('drama')] == [90, 50]
+
+
+def test_top_is_capped_and_merges_trait_genres():
+    index = GenreIndex(MOVIES, top_k=1)
+    assert titles(index.top('drama')) == [2]
+    assert titles(GenreIndex(MOVIES).top('historical')) == [5, 4]
+
+
+def test_recommend_labels_traits_and_fills_from_overall():
+    index = GenreIndex(MOVIES)
+    results = index.recommend(['horror', 'comedy'], limit=4)
+    assert titles(results) == [2, 3, 6, 1]
+    assert [m['genre'] for m in results] == ['comedy', 'comedy', 'horror', 'horror']
+
+
+def test_recommend_pages_by_offset_without_repeats():
+    index = GenreIndex(MOVIES)
+    first = index.recommend(['drama'], limit=3)
+    second = index.recommend(['drama'], limit=3, offset=3)
+    assert not set(titles(first)) & set(titles(second))
+    assert len(first + second) == len(MOVIES)
+
+
+def test_index_is_built_once_per_snapshot_version(monkeypatch):
+    monkeypatch.setattr(ranking, '_snapshot_index', (None, None))
+    snapshot = CatalogSnapshot(1, 0, {'trending': MOVIES}, {})
+    index = ranking.index_for_snapshot(snapshot)
+    assert ranking.index_for_snapshot(snapshot) is index
+    assert ranking.index_for_snapshot(CatalogSnapshot(2, 0, {'trending': MOVIES}, {})) is not index
@@ -0,0 +1,86 @@
+"""Tests for the sliding-window rate limiter"""
+
+import asyncio
+
+import pytest
+
+import rate_limiter
+from rate_limiter import MemoryBackend, RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, 'time', lambda: now[0])
+    return now
+
+
+def test_allows_up_to_the_limit_then_blocks(clock):
+    limiter = RateLimiter(MemoryBackend(), limit=3, window=60, block_seconds=30)
+    assert [limiter.hit('client')[0] for _ in range(3)] == [True] * 3
+    assert limiter.hit('client') == (False, 30)
+    assert limiter.rejections == 1
+    # Other clients have their own counters
+    assert limiter.hit('other')[0]
+
+
+def test_block_lasts_its_penalty(clock):
+    limiter = RateLimiter(MemoryBackend(), limit=1, window=60, block_seconds=30)
+    limiter.hit('client')
+    limiter.hit('client')
+    clock[0] += 10
+    allowed, retry_after = limiter.hit('client')
+    assert not allowed
+    assert retry_after == pytest.approx(20)
+
+
+def test_previous_window_is_weighted_by_its_overlap(clock):
+    clock[0] = 1200.0  # The start of a window
+    limiter = RateLimiter(MemoryBackend(), limit=4, window=60, block_seconds=1)
+    for _ in range(4):
+        assert limiter.hit('client')[0]
+    # Halfway into the next window the previous four count as two
+    clock[0] += 90
+    assert limiter.hit('client')[0]
+    assert limiter.hit('client')[0]
+    assert not limiter.hit('client')[0]
+
+
+def test_cost_counts_units_of_work(clock):
+    limiter = RateLimiter(MemoryBackend(), limit=10, window=60, block_seconds=1)
+    assert limiter.hit('client', cost=8)[0]
+    assert not limiter.hit('client', cost=3)[0]
+
+
+def test_idle_clients_are_evicted(clock):
+    backend = MemoryBackend(max_keys=2)
+    limiter = RateLimiter(backend, limit=10, window=60, block_seconds=1)
+    for key in ('a', 'b', 'c'):
+        limiter.hit(key)
+    assert len(backend) == 2
+
+
+class BrokenBackend:
+    def hit(self, *args):
+        raise ConnectionError('redis down')
+
+
+def test_falls_back_to_memory_when_the_backend_fails(clock):
+    limiter = RateLimiter(BrokenBackend(), limit=1, window=60, block_seconds=30)
+    limiter.fallback = MemoryBackend()
+    assert limiter.hit('client')[0]
+    assert not limiter.hit('client')[0]
+
+
+def test_backend_error_without_fallback_is_raised(clock):
+    limiter = RateLimiter(BrokenBackend())
+    with pytest.raises(ConnectionError):
+        limiter.hit('client')
+
+
+def test_hit_async_matches_hit(clock):
+    limiter = RateLimiter(MemoryBackend(), limit=1, window=60, block_seconds=30)
+    assert asyncio.run(limiter.hit_async('client')) == (True, 0)
+    limiter.backend, limiter.fallback = BrokenBackend(), limiter.backend
+    # Non-memory backends run in a worker thread, with the same fallback
+    assert asyncio.run(limiter.hit_async('client')) == (False, 30)
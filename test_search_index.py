@@ -0,0 +1,56 @@
+"""Tests for the local movie search index"""
+
+import pytest
+
+from search_index import SearchIndex, parse_query
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('Inception', (['inception'], None)),
+    ('heat 1995', (['heat'], 1995)),
+    ('blade runner 2049', (['blade', 'runner'], 2049)),
+    ('1917', (['1917'], None)),
+    ('ocean s 11', (['ocean', 's', '11'], None)),
+    ('heat 1895', (['heat', '1895'], None))
+])
+def test_parse_query(query, expected):
+    assert parse_query(query) == expected
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.add_many([
+        {'title': 'Inception', 'year': 2010, 'ids': {'trakt': 1}},
+        {'title': 'Heat', 'year': 1995, 'ids': {'trakt': 2}},
+        {'title': 'Heat', 'year': 1986, 'ids': {'trakt': 3}},
+        {'title': 'Blade Runner', 'year': 1982, 'ids': {'trakt': 4}},
+        {'title': 'Blade Runner 2049', 'year': 2017, 'ids': {'trakt': 5}}
+    ])
+    return index
+
+
+def titles(results):
+    return [(movie['title'], movie['year']) for _, movie in results]
+
+
+def test_typos_still_match(index):
+    assert titles(index.search('incepshun'))[0] == ('Inception', 2010)
+
+
+def test_trailing_year_filters_by_year(index):
+    assert titles(index.search('heat 1995')) == [('Heat', 1995)]
+
+
+def test_trailing_year_is_searched_as_title_when_the_filter_finds_nothing(index):
+    assert titles(index.search('blade runner 2049'))[0] == ('Blade Runner 2049', 2017)
+
+
+def test_explicit_year_still_applies_to_the_title_retry(index):
+    assert titles(index.search('blade runner 2049', year=1982)) == [('Blade Runner', 1982)]
+    assert index.search('blade runner 2049', year=1999) == []
+
+
+def test_movies_are_indexed_once(index):
+    assert not index.add({'title': 'Heat', 'year': 1995, 'ids': {'trakt': 2}})
+    assert len(index) == 5
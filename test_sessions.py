@@ -0,0 +1,93 @@
+"""Tests for the session backends"""
+
+import pytest
+from flask import Flask, session
+from flask.sessions import SecureCookieSessionInterface
+
+import sessions
+from config import TestingConfig
+from sessions import MemorySessionStore, ServerSideSessionInterface
+
+
+def configured(**settings):
+    return type('SessionConfig', (TestingConfig,), settings)
+
+
+def test_cookie_backend_without_redis():
+    interface = sessions.create_interface(configured(SESSION_BACKEND='cookie'))
+    assert isinstance(interface, SecureCookieSessionInterface)
+
+
+def test_redis_backend_without_redis_url_keeps_sessions_in_the_cookie():
+    interface = sessions.create_interface(configured(SESSION_BACKEND='redis', REDIS_URL=None))
+    assert isinstance(interface, SecureCookieSessionInterface)
+
+
+def test_memory_backend_only_when_asked_for():
+    interface = sessions.create_interface(configured(SESSION_BACKEND='memory'))
+    assert isinstance(interface, ServerSideSessionInterface)
+    assert isinstance(interface.store, MemorySessionStore)
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        sessions.create_interface(configured(SESSION_BACKEND='disk'))
+
+
+def test_memory_store_expires_and_evicts(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sessions.time, 'time', lambda: now[0])
+    store = MemorySessionStore(maxsize=2)
+    store.set('a', '{}', ttl=10)
+    store.set('b', '{}', ttl=100)
+    store.set('c', '{}', ttl=100)
+    assert store.get('a') is None
+    now[0] += 50
+    assert store.get('b') == '{}'
+    now[0] += 60
+    assert store.get('b') is None
+
+
+def app_with(interface):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.session_interface = interface
+
+    @app.route('/answer/<value>')
+    def answer(value):
+        session['answer'] = value
+        return ''
+
+    @app.route('/read')
+    def read():
+        return session.get('answer', 'none')
+
+    return app
+
+
+@pytest.mark.parametrize('interface', [
+    SecureCookieSessionInterface(),
+    ServerSideSessionInterface(MemorySessionStore())
+])
+def test_session_survives_between_requests(interface):
+    client = app_with(interface).test_client()
+    client.get('/answer/puzzle_solving')
+    assert client.get('/read').data == b'puzzle_solving'
+
+
+def test_signed_cookie_is_readable_by_another_worker():
+    first = app_with(SecureCookieSessionInterface()).test_client()
+    first.get('/answer/gamer')
+    cookie = first.get_cookie('session').value
+    # A second app with the same secret stands in for another worker process
+    second = app_with(SecureCookieSessionInterface()).test_client()
+    second.set_cookie('session', cookie)
+    assert second.get('/read').data == b'gamer'
+
+
+def test_server_side_cookie_holds_only_the_id():
+    client = app_with(ServerSideSessionInterface(MemorySessionStore())).test_client()
+    response = client.get('/answer/gamer')
+    assert 'gamer' not in response.headers['Set-Cookie']
+    # Unchanged sessions are not written back
+    assert 'Set-Cookie' not in client.get('/read').headers
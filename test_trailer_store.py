@@ -0,0 +1,48 @@
+"""Tests for the persistent trailer store and YouTube quota"""
+
+import pytest
+
+import trailer_store
+from trailer_store import SEARCH_COST, TrailerStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(trailer_store.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TrailerStore(str(tmp_path / 'trailers.sqlite3'), ttl=100, negative_ttl=10,
+                        daily_quota=300, prefetch_share=0.5, memory_entries=2)
+
+
+def test_trailers_and_negative_entries_expire(store, clock):
+    store.record('abc', ids={'trakt': 1}, title='Heat', year=1995)
+    store.record(None, title='Alien', year=1979)
+    assert store.lookup(ids={'trakt': 1}) == {'video_id': 'abc'}
+    assert store.lookup(title='Alien', year=1979) == {'video_id': None}
+    clock[0] += 50
+    assert store.lookup(title='Alien', year=1979) is None
+    assert store.lookup(title='Heat', year=1995) == {'video_id': 'abc'}
+    clock[0] += 60
+    assert store.lookup(ids={'trakt': 1}) is None
+
+
+def test_memory_front_is_bounded_and_falls_back_to_sqlite(store, clock):
+    store.record('abc', ids={'trakt': 1, 'imdb': 'tt2', 'tmdb': 3})
+    assert len(store._memory) == 2
+    reopened = TrailerStore(store.path, memory_entries=2)
+    assert reopened.lookup(ids={'tmdb': 3}) == {'video_id': 'abc'}
+    assert len(reopened._memory) == 1
+
+
+def test_prefetch_only_spends_its_share_of_the_quota(store):
+    assert store.spend_quota(prefetch=True)
+    assert not store.spend_quota(prefetch=True)
+    assert store.spend_quota()
+    assert store.spend_quota()
+    assert not store.spend_quota()
+    assert store.quota_used() == 3 * SEARCH_COST
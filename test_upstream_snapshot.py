@@ -0,0 +1,87 @@
+"""Tests for recorded upstream responses"""
+
+import threading
+
+import pytest
+
+import upstream_snapshot
+from upstream_snapshot import ReplayMiss, UpstreamSnapshot
+
+
+class Response:
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'snapshots' / 'upstream.snap')
+
+
+def test_recorded_responses_replay(path):
+    recorder = UpstreamSnapshot(path, mode='record')
+    recorder.record('trakt.trending:a', Response(200, b'[1, 2]'))
+    recorder.record('trakt.search:b', Response(404, b'{}'))
+    recorder.flush()
+
+    replayer = UpstreamSnapshot(path, mode='replay')
+    assert len(replayer) == 2
+    response = replayer.replay('trakt.trending:a')
+    assert (response.status_code, response.json()) == (200, [1, 2])
+    assert replayer.replay('trakt.search:b').status_code == 404
+    with pytest.raises(ReplayMiss):
+        replayer.replay('trakt.popular:c')
+
+
+@pytest.mark.parametrize('status', [304, 429, 503])
+def test_failures_and_not_modified_are_not_recorded(path, status):
+    recorder = UpstreamSnapshot(path, mode='record')
+    recorder.record('trakt.trending:a', Response(status, b''))
+    recorder.flush()
+    assert len(UpstreamSnapshot(path, mode='replay')) == 0
+
+
+def test_live_mode_records_nothing(path):
+    live = UpstreamSnapshot(path)
+    live.record('trakt.trending:a', Response(200, b'[]'))
+    live.flush()
+    assert len(UpstreamSnapshot(path, mode='replay')) == 0
+
+
+def test_flush_merges_with_the_existing_file(path):
+    first = UpstreamSnapshot(path, mode='record')
+    first.record('a', Response(200, b'"old"'))
+    first.record('b', Response(200, b'"kept"'))
+    first.flush()
+    second = UpstreamSnapshot(path, mode='record')
+    second.record('a', Response(200, b'"new"'))
+    second.flush()
+
+    replayer = UpstreamSnapshot(path, mode='replay')
+    assert replayer.replay('a').json() == 'new'
+    assert replayer.replay('b').json() == 'kept'
+
+
+def test_periodic_flush_runs_off_the_recording_thread(path, monkeypatch):
+    monkeypatch.setattr(upstream_snapshot, 'FLUSH_EVERY', 2)
+    writers = []
+    write_snapshot = upstream_snapshot.write_snapshot
+
+    def tracked_write(*args):
+        writers.append(threading.current_thread())
+        write_snapshot(*args)
+
+    monkeypatch.setattr(upstream_snapshot, 'write_snapshot', tracked_write)
+    recorder = UpstreamSnapshot(path, mode='record')
+    recorder.record('a', Response(200, b'1'))
+    recorder.record('b', Response(200, b'2'))
+    upstream_snapshot._flusher.submit(lambda: None).result(5)
+
+    assert writers and threading.current_thread() not in writers
+    assert len(UpstreamSnapshot(path, mode='replay')) == 2
+
+
+def test_unknown_mode_is_rejected(path):
+    with pytest.raises(ValueError):
+        UpstreamSnapshot(path, mode='rewind')
@@ -0,0 +1,54 @@
+"""Tests for the persistent WatchMode id index"""
+
+import pytest
+
+from watchmode_index import WatchModeIndex, index_keys, normalize_title
+
+
+def test_normalize_title():
+    assert normalize_title('Amélie: The Movie!') == 'amelie the movie'
+    assert normalize_title(None) == ''
+
+
+def test_index_keys_most_specific_first():
+    assert index_keys({'trakt': 1, 'imdb': 'tt2', 'slug': 'x'}, 'Heat', 1995) == [
+        'trakt:1', 'imdb:tt2', 'title:heat:1995'
+    ]
+    assert index_keys(title='Heat') == ['title:heat']
+
+
+@pytest.fixture
+def index(tmp_path):
+    return WatchModeIndex(str(tmp_path / 'index.sqlite3'), memory_entries=2)
+
+
+def test_lookup_by_any_recorded_key(index):
+    index.record(77, ids={'trakt': 1, 'imdb': 'tt2'}, title='Heat', year=1995)
+    assert index.lookup(ids={'imdb': 'tt2'}) == 77
+    assert index.lookup(title='Heat', year=1995) == 77
+    assert index.lookup(title='Heat', year=1986) is None
+    assert index.lookup() is None
+
+
+def test_memory_front_is_bounded_and_falls_back_to_sqlite(index, tmp_path):
+    index.record(77, ids={'trakt': 1, 'imdb': 'tt2', 'tmdb': 3})
+    assert len(index._memory) == 2
+    assert index.lookup(ids={'trakt': 1}) == 77
+    # A fresh process starts with an empty memory front
+    reopened = WatchModeIndex(index.path, memory_entries=2)
+    assert reopened.lookup(ids={'tmdb': 3}) == 77
+    assert len(reopened._memory) == 1
+
+
+def test_import_csv_skips_shows_and_bad_rows(index, tmp_path):
+    export = tmp_path / 'title_id_map.csv'
+    export.write_text(
+        'Watchmode ID,IMDB ID,TMDB ID,TMDB Type,Title,Year\n'
+        '10,tt1,100,movie,Heat,1995\n'
+        '11,tt2,200,tv,The Wire,2002\n'
+        'x,tt3,300,movie,Broken,2000\n',
+        encoding='utf-8'
+    )
+    assert index.import_csv(str(export)) == 3
+    assert index.lookup(ids={'tmdb': '100'}) == 10
+    assert index.lookup(ids={'imdb': 'tt2'}) is None
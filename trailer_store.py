@@ -0,0 +1,175 @@
+"""
+Persistent store of YouTube trailer ids.
+
+Trailers are keyed by stable movie ids (Trakt/IMDb/TMDB, falling back to the
+normalized title) so a click only searches YouTube the first time anyone asks
+for a film. Found trailers are kept for weeks; "no trailer" answers are kept
+as negative entries for a few days so new releases get another chance.
+
+YouTube's ``search.list`` costs 100 quota units, so the store also meters a
+daily quota (reset at midnight Pacific, like YouTube's) shared by every
+worker on the host. The background prefetcher only spends up to its share,
+leaving the rest for live clicks.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from cache import LRUCache
+from config import get_config
+from watchmode_index import index_keys
+
+logger = logging.getLogger(__name__)
+
+# Quota units charged by YouTube for one search.list call
+SEARCH_COST = 100
+
+QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+
+
+def quota_day():
+    return datetime.now(QUOTA_TIMEZONE).date().isoformat()
+
+
+class TrailerStore:
+    """SQLite-backed key -> trailer video id map with a bounded in-process front"""
+
+    def __init__(self, path, ttl=30 * 86400, negative_ttl=3 * 86400,
+                 daily_quota=10000, prefetch_share=0.8, memory_entries=10000):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.daily_quota = daily_quota
+        self.prefetch_share = prefetch_share
+        self._conn = None
+        self._memory = LRUCache(memory_entries)  # key -> (video_id, expires_at)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(
+            cfg.TRAILER_STORE_PATH,
+            ttl=cfg.TRAILER_TTL,
+            negative_ttl=cfg.TRAILER_NEGATIVE_TTL,
+            daily_quota=cfg.YOUTUBE_DAILY_QUOTA,
+            prefetch_share=cfg.YOUTUBE_PREFETCH_SHARE,
+            memory_entries=cfg.TRAILER_MEMORY_ENTRIES
+        )
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS trailers ('
+                'key TEXT PRIMARY KEY, video_id TEXT, expires_at REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS youtube_quota ('
+                'day TEXT PRIMARY KEY, units INTEGER NOT NULL)'
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def lookup(self, ids=None, title=None, year=None):
+        """Return ``{'video_id': ...}`` for a known movie, or None if unknown.
+
+        A ``video_id`` of None is a negative entry: YouTube had no trailer.
+        """
+        keys = index_keys(ids, title, year)
+        if not keys:
+            return None
+        now = time.time()
+        for key in keys:
+            cached = self._memory.get(key)
+            if cached is not None and cached[1] > now:
+                return {'video_id': cached[0]}
+        try:
+            with self._lock:
+                placeholders = ','.join('?' for _ in keys)
+                rows = self._connection().execute(
+                    f'SELECT key, video_id, expires_at FROM trailers '
+                    f'WHERE key IN ({placeholders}) AND expires_at > ?',
+                    keys + [now]
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Trailer store lookup failed: {e}")
+            return None
+        found = {key: (video_id, expires_at) for key, video_id, expires_at in rows}
+        for key in keys:
+            if key in found:
+                self._memory.set(key, found[key])
+                return {'video_id': found[key][0]}
+        return None
+
+    def record(self, video_id, ids=None, title=None, year=None):
+        """Remember a trailer (or, with ``video_id`` None, that there is none)"""
+        expires_at = time.time() + (self.ttl if video_id else self.negative_ttl)
+        rows = [(key, video_id, expires_at) for key in index_keys(ids, title, year)]
+        if not rows:
+            return 0
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.executemany(
+                    'INSERT OR REPLACE INTO trailers (key, video_id, expires_at) VALUES (?, ?, ?)',
+                    rows
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Trailer store write failed: {e}")
+            return 0
+        for key, _, _ in rows:
+            self._memory.set(key, (video_id, expires_at))
+        return len(rows)
+
+    def spend_quota(self, units=SEARCH_COST, prefetch=False):
+        """Reserve ``units`` of today's YouTube quota; False if that would exceed it.
+
+        Prefetching may only use ``prefetch_share`` of the daily quota.
+        """
+        limit = self.daily_quota * (self.prefetch_share if prefetch else 1)
+        day = quota_day()
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.execute('INSERT OR IGNORE INTO youtube_quota (day, units) VALUES (?, 0)', (day,))
+                spent = conn.execute(
+                    'UPDATE youtube_quota SET units = units + ? WHERE day = ? AND units + ? <= ?',
+                    (units, day, units, limit)
+                ).rowcount
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"YouTube quota update failed: {e}")
+            return False
+        return spent == 1
+
+    def quota_used(self):
+        """Quota units spent today"""
+        try:
+            with self._lock:
+                row = self._connection().execute(
+                    'SELECT units FROM youtube_quota WHERE day = ?', (quota_day(),)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"YouTube quota read failed: {e}")
+            return 0
+        return row[0] if row else 0
+
+
+trailer_store = TrailerStore.from_config(get_config())
+
+
+def configure(cfg):
+    """Rebuild the trailer store from a configuration class"""
+    global trailer_store
+    trailer_store = TrailerStore.from_config(cfg)
@@ -0,0 +1,252 @@
+"""
+Recorded upstream responses for record/replay runs.
+
+With ``UPSTREAM_MODE=record`` every successful Trakt, WatchMode, NewsAPI and
+YouTube response is also written to a snapshot file. With
+``UPSTREAM_MODE=replay`` the upstream clients answer from that file and never
+touch the network, so cold starts, outages and CI serve real data at local
+disk speed. A request that was never recorded raises ``ReplayMiss`` and
+callers fall back as they would for any upstream error.
+
+File layout (little endian), built to be memory-mapped and searched in place:
+
+    header   8s magic | I entry count | Q index offset
+    bodies   zlib-compressed response bodies, back to back
+    index    one 32-byte record per entry, sorted by key digest:
+             16s digest | Q body offset | I body length | H status | 2x
+
+Record with a single worker: each process rewrites the whole file when it
+flushes.
+"""
+
+import argparse
+import atexit
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CNMSNAP1'
+HEADER = struct.Struct('<8sIQ')
+INDEX_ENTRY = struct.Struct('<16sQIH2x')
+
+MODES = ('live', 'record', 'replay')
+
+# Stands in for API keys in replay mode, where no key is needed
+REPLAY_KEY = 'replay'
+
+# Recorded entries written out after this many new responses
+FLUSH_EVERY = 50
+
+# Flushes rewrite the whole file; they run here, one at a time, off the
+# recording thread (the shared event loop for async upstream calls)
+_flusher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='snapshot-flush')
+
+
+class ReplayMiss(requests.exceptions.ConnectionError):
+    """Raised in replay mode for a request missing from the snapshot"""
+
+
+class ReplayedResponse:
+    """A recorded response with the parts of ``requests.Response`` we use"""
+
+    from_cache = False
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+        self.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def digest(key):
+    return hashlib.sha1(key.encode('utf-8')).digest()[:16]
+
+
+def write_snapshot(path, entries):
+    """Write ``{digest: (status, body)}`` to ``path`` atomically"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    index = []
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, 0, 0))
+        for key_digest in sorted(entries):
+            status, body = entries[key_digest]
+            compressed = zlib.compress(body)
+            index.append(INDEX_ENTRY.pack(key_digest, f.tell(), len(compressed), status))
+            f.write(compressed)
+        index_offset = f.tell()
+        f.write(b''.join(index))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(index), index_offset))
+    os.replace(tmp_path, path)
+
+
+class UpstreamSnapshot:
+    """Memory-mapped snapshot reader plus the recorder for record mode"""
+
+    def __init__(self, path, mode='live'):
+        if mode not in MODES:
+            raise ValueError(f"UPSTREAM_MODE must be one of {', '.join(MODES)}, not {mode!r}")
+        self.path = path
+        self.mode = mode
+        self._map = None
+        self._count = 0
+        self._index_offset = 0
+        self._recorded = {}
+        self._unflushed = 0
+        self._flush_scheduled = False
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        if mode == 'replay':
+            self.open()
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(cfg.UPSTREAM_SNAPSHOT_PATH, mode=cfg.UPSTREAM_MODE)
+
+    def open(self):
+        """Map the snapshot file; a missing file replays as empty"""
+        try:
+            with open(self.path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            logger.warning(f"No upstream snapshot at {self.path}: {e}")
+            return
+        magic, count, index_offset = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC:
+            mapped.close()
+            logger.error(f"{self.path} is not an upstream snapshot")
+            return
+        self._map, self._count, self._index_offset = mapped, count, index_offset
+        logger.info(f"Mapped {count} recorded upstream responses from {self.path}")
+
+    def __len__(self):
+        return self._count
+
+    def _entry(self, position):
+        return INDEX_ENTRY.unpack_from(self._map, self._index_offset + position * INDEX_ENTRY.size)
+
+    def lookup(self, key):
+        """Return ``(status, body)`` recorded for a cache key, or None"""
+        if self._map is None:
+            return None
+        wanted = digest(key)
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            key_digest, offset, length, status = self._entry(middle)
+            if key_digest < wanted:
+                low = middle + 1
+            elif key_digest > wanted:
+                high = middle
+            else:
+                return status, zlib.decompress(self._map[offset:offset + length])
+        return None
+
+    def replay(self, key):
+        """The recorded response for ``key``; raises ``ReplayMiss`` if there is none"""
+        found = self.lookup(key)
+        if found is None:
+            raise ReplayMiss(f"No recorded upstream response for {key}")
+        return ReplayedResponse(*found)
+
+    def record(self, key, response):
+        """Keep a live response for the snapshot (record mode only).
+
+        Every ``FLUSH_EVERY`` responses a flush is queued in the background.
+        """
+        if self.mode != 'record' or response.status_code >= 500 or response.status_code in (304, 429):
+            return
+        with self._lock:
+            self._recorded[digest(key)] = (response.status_code, response.content)
+            self._unflushed += 1
+            flush = self._unflushed >= FLUSH_EVERY and not self._flush_scheduled
+            if flush:
+                self._flush_scheduled = True
+        if flush:
+            _flusher.submit(self._flush_in_background)
+
+    def _flush_in_background(self):
+        with self._lock:
+            self._flush_scheduled = False
+        try:
+            self.flush()
+        except OSError as e:
+            logger.error(f"Failed to write upstream snapshot {self.path}: {e}")
+
+    def flush(self):
+        """Merge recorded responses into the snapshot file"""
+        with self._file_lock:
+            # Take the recorded entries and let recording carry on during the write
+            with self._lock:
+                if not self._unflushed:
+                    return
+                recorded, self._recorded = self._recorded, {}
+                self._unflushed = 0
+            entries = {}
+            if self._map is None:
+                self.open()
+            if self._map is not None:
+                for position in range(self._count):
+                    key_digest, offset, length, status = self._entry(position)
+                    entries[key_digest] = (status, zlib.decompress(self._map[offset:offset + length]))
+                self._map.close()
+                self._map = None
+            entries.update(recorded)
+            write_snapshot(self.path, entries)
+            self.open()
+        logger.info(f"Wrote {len(entries)} upstream responses to {self.path}")
+
+
+snapshot = UpstreamSnapshot.from_config(get_config())
+
+
+@atexit.register
+def _flush_at_exit():
+    if snapshot.mode == 'record':
+        snapshot.flush()
+
+
+def configure(cfg):
+    """Rebuild the snapshot from a configuration class"""
+    global snapshot
+    if snapshot.mode == 'record':
+        snapshot.flush()
+    snapshot = UpstreamSnapshot.from_config(cfg)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect a recorded upstream snapshot')
+    parser.add_argument('path', nargs='?', default=get_config().UPSTREAM_SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    reader = UpstreamSnapshot(args.path, mode='replay')
+    size = os.path.getsize(args.path) if os.path.exists(args.path) else 0
+    statuses = {}
+    for position in range(len(reader)):
+        status = reader._entry(position)[3]
+        statuses[status] = statuses.get(status, 0) + 1
+    print(f"{args.path}: {len(reader)} responses, {size} bytes")
+    for status, count in sorted(statuses.items()):
+        print(f"  {status}: {count}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+Persistent index of WatchMode title ids.
+
+Maps Trakt/IMDb/TMDB ids and normalized titles to WatchMode ids so streaming
+lookups can skip the ``/v1/search`` round-trip. The index is filled lazily as
+searches resolve and in bulk from WatchMode's ``title_id_map.csv`` export.
+
+Usage:
+    python watchmode_index.py import title_id_map.csv
+"""
+
+import argparse
+import csv
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from cache import LRUCache
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+ID_KEYS = ('trakt', 'imdb', 'tmdb')
+
+
+def normalize_title(title):
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    title = unicodedata.normalize('NFKD', title or '')
+    title = ''.join(ch for ch in title if not unicodedata.combining(ch))
+    title = re.sub(r'[^a-z0-9]+', ' ', title.lower())
+    return title.strip()
+
+
+def index_keys(ids=None, title=None, year=None):
+    """Return index keys for a movie, most specific first"""
+    keys = []
+    for name in ID_KEYS:
+        value = (ids or {}).get(name)
+        if value:
+            keys.append(f"{name}:{value}")
+    normalized = normalize_title(title)
+    if normalized:
+        if year:
+            keys.append(f"title:{normalized}:{year}")
+        else:
+            keys.append(f"title:{normalized}")
+    return keys
+
+
+class WatchModeIndex:
+    """SQLite-backed key -> WatchMode id map with a bounded in-process front"""
+
+    def __init__(self, path, memory_entries=10000):
+        self.path = path
+        self._conn = None
+        self._memory = LRUCache(memory_entries)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(cfg.WATCHMODE_INDEX_PATH, cfg.WATCHMODE_INDEX_MEMORY_ENTRIES)
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS watchmode_ids ('
+                'key TEXT PRIMARY KEY, watchmode_id INTEGER NOT NULL, updated_at REAL NOT NULL)'
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def lookup(self, ids=None, title=None, year=None):
+        """Return the WatchMode id for a movie, or None if unknown"""
+        keys = index_keys(ids, title, year)
+        if not keys:
+            return None
+        for key in keys:
+            watchmode_id = self._memory.get(key)
+            if watchmode_id is not None:
+                return watchmode_id
+        try:
+            with self._lock:
+                placeholders = ','.join('?' for _ in keys)
+                rows = self._connection().execute(
+                    f'SELECT key, watchmode_id FROM watchmode_ids WHERE key IN ({placeholders})',
+                    keys
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"WatchMode index lookup failed: {e}")
+            return None
+        found = dict(rows)
+        for key in keys:
+            if key in found:
+                self._memory.set(key, found[key])
+                return found[key]
+        return None
+
+    def record(self, watchmode_id, ids=None, title=None, year=None):
+        """Remember ``watchmode_id`` under every key derivable for the movie"""
+        return self._store(
+            (key, watchmode_id) for key in index_keys(ids, title, year)
+        )
+
+    def _store(self, pairs):
+        now = time.time()
+        rows = [(key, int(watchmode_id), now) for key, watchmode_id in pairs]
+        if not rows:
+            return 0
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.executemany(
+                    'INSERT OR REPLACE INTO watchmode_ids (key, watchmode_id, updated_at) VALUES (?, ?, ?)',
+                    rows
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"WatchMode index write failed: {e}")
+            return 0
+        for key, watchmode_id, _ in rows:
+            self._memory.set(key, watchmode_id)
+        return len(rows)
+
+    def bulk_import(self, movies):
+        """Import dicts with ``watchmode_id`` plus ids/title/year keys"""
+        pairs = []
+        for movie in movies:
+            keys = index_keys(movie.get('ids'), movie.get('title'), movie.get('year'))
+            pairs.extend((key, movie['watchmode_id']) for key in keys)
+        return self._store(pairs)
+
+    def import_csv(self, path):
+        """Import WatchMode's title_id_map.csv export"""
+        movies = []
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row.get('TMDB Type') and row['TMDB Type'] != 'movie':
+                    continue
+                try:
+                    watchmode_id = int(row['Watchmode ID'])
+                except (KeyError, ValueError):
+                    continue
+                movies.append({
+                    'watchmode_id': watchmode_id,
+                    'ids': {'imdb': row.get('IMDB ID'), 'tmdb': row.get('TMDB ID')},
+                    'title': row.get('Title'),
+                    'year': row.get('Year')
+                })
+        return self.bulk_import(movies)
+
+
+watchmode_index = WatchModeIndex.from_config(get_config())
+
+
+def configure(cfg):
+    """Rebuild the index from a configuration class"""
+    global watchmode_index
+    watchmode_index = WatchModeIndex.from_config(cfg)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the WatchMode id index')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help='Import title_id_map.csv')
+    import_parser.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        count = watchmode_index.import_csv(args.path)
+        print(f"Imported {count} index keys into {watchmode_index.path}")
+
+
+if __name__ == '__main__':
+    main()
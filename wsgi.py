@@ -0,0 +1,16 @@
+"""
+WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py
+
+Builds the app once in the gunicorn master (``preload_app``): configuration,
+routes, compiled templates and the catalog snapshot are then shared with
+every worker copy-on-write. ``gunicorn.conf.py`` opens each worker's upstream
+connections and starts its catalog refresher after the fork.
+"""
+
+import os
+
+from app import create_app
+
+app = create_app(os.getenv('FLASK_CONFIG', 'production'), preload=True)